@@ -0,0 +1,515 @@
+"""!
+@file alloc_audit.py
+This file measures how much memory the shares, queues and tasks allocate,
+so that code which must not allocate can be checked.
+
+@details Code run by an interrupt can't allocate memory, and code run on
+         every pass of a fast task shouldn't, since each allocation brings the
+         next garbage collection closer. An @c AllocAudit measures the bytes
+         allocated by single calls to functions, and by each run of tasks
+         which it meters, and fails if any path marked as hot allocated:
+         @code
+         audit = alloc_audit.AllocAudit ()
+         audit.measure ('Queue.put', my_queue.put, 5, True)
+         audit.meter_task (motors_task)
+         ...                                  # Run the scheduler for a while
+         print (audit.report ())
+         audit.check ()                       # Raises if a hot path allocates
+         @endcode
+         On the board, allocation is measured with @c gc.mem_alloc(). On the
+         PC, under the simulation, it is measured with @c tracemalloc. Each
+         measurement has the bytes allocated by a call to a function which
+         does nothing, with the same arguments, taken away, so only the
+         bytes allocated inside the function are counted.
+
+         CPython allocates some things which the board doesn't: integers
+         above 256, which the board holds without allocating up to 2 ** 30,
+         and the @c range object of a @c for loop, which the board's compiler
+         does away with. The audits call functions with arguments below 257
+         so that they don't add any such integers, and where a function makes
+         such things itself, the bytes which CPython spends on them are
+         allowed at that call site only, with the reason given there. CPython
+         also takes small tuples and floats from free lists without
+         allocating, so those are only caught on the board. Lists, bound
+         methods, memoryviews, buffers and other objects are caught on both.
+
+         Running this file checks every share and queue method and the
+         fixed-point controller, and fails if any of the hot ones allocates:
+         @code
+         python -m sim alloc_audit.py          # On the PC, from src
+         import alloc_audit; alloc_audit.main ()    # On the board
+         @endcode
+
+@author Nishka Chawla
+@author Ronan Shaffer
+@date   18-Oct-2026
+@copyright (c) Released under GNU Public License
+"""
+
+import array
+import gc
+import micropython
+import utime
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    from sim import clock as sim_clock
+except ImportError:
+    sim_clock = None
+
+import cotask
+import task_share
+from closedloopcontrol import PIDController
+
+## The number of times each function is called after two calls to warm up.
+REPEATS = 20
+
+
+class Meter:
+    """!
+    This class measures the memory allocated between two points in the
+    program, with @c gc.mem_alloc() on the board or @c tracemalloc on the PC.
+    Under the simulation, what the simulated interrupts and timers allocate
+    is left out, since the board's interrupts can't allocate and its timers
+    are set up without allocating.
+    """
+
+    def __init__(self):
+        """!
+        Creates a meter, starting @c tracemalloc on the PC if needed and
+        hooking it into the simulated clock.
+        """
+        ## @c True on the board, where @c gc.mem_alloc() is available.
+        self.board = hasattr(gc, 'mem_alloc')
+
+        ## The memory in use when @c start() was called.
+        self._before = 0
+
+        ## The highest memory use outside the simulated hardware since
+        #  @c start(), as of the latest work of the simulated hardware, on
+        #  the PC.
+        self._peak = 0
+
+        ## The memory which the simulated hardware has allocated and kept
+        #  since @c start(), on the PC.
+        self._kept = 0
+
+        ## The memory in use when the latest work of the simulated hardware
+        #  began.
+        self._hw_before = 0
+
+        if not self.board:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            if sim_clock is not None:
+                sim_clock.CLOCK.hw_hooks = (self._hw_enter, self._hw_leave)
+
+    def start(self):
+        """!
+        This method starts measuring. It doesn't allocate memory on the board.
+        """
+        if self.board:
+            self._before = gc.mem_alloc()
+        else:
+            self._before = tracemalloc.get_traced_memory()[0]
+            self._peak = self._before
+            self._kept = 0
+            tracemalloc.reset_peak()
+
+    def stop(self):
+        """!
+        This method finishes measuring.
+        @returns    The bytes allocated since @c start(), at least 1 if a
+                    garbage collection happened, since that only happens when
+                    memory is allocated.
+        """
+        if self.board:
+            used = gc.mem_alloc() - self._before
+            return used if used >= 0 else 1
+        peak = tracemalloc.get_traced_memory()[1] - self._kept
+        return max(peak, self._peak) - self._before
+
+    def _hw_enter(self):
+        """!
+        This method is called by the simulated clock before it runs a
+        simulated interrupt or sets up a timer. It notes the highest memory
+        use so far, so that what the simulated hardware allocates can be
+        left out.
+        """
+        current, peak = tracemalloc.get_traced_memory()
+        self._peak = max(self._peak, peak - self._kept)
+        self._hw_before = current
+
+    def _hw_leave(self):
+        """!
+        This method is called by the simulated clock after it runs a
+        simulated interrupt or sets up a timer. It notes what was kept and
+        forgets the highest memory use in the meantime.
+        """
+        self._kept += tracemalloc.get_traced_memory()[0] - self._hw_before
+        tracemalloc.reset_peak()
+
+
+class AllocAudit:
+    """!
+    This class collects allocation measurements of functions and tasks and
+    reports them.
+    """
+
+    def __init__(self, meter=None):
+        """!
+        Creates an audit with no measurements.
+        @param meter    The @c Meter to use, or @c None to make one.
+        """
+        ## The meter which measures allocation.
+        self.meter = meter if meter is not None else Meter()
+
+        ## Measurements by name: [hot, calls, most bytes in one call, bytes
+        #  allowed].
+        self.results = {}
+
+        ## Names in the order in which they were first measured.
+        self._order = []
+
+        ## The bytes which metering a task allocates itself, measured when
+        #  the first task is metered.
+        self._task_base = None
+
+        ## The bytes which CPython allocates for the @c range of a @c for
+        #  loop, measured on the PC for use in @c host_allow; 0 on the board.
+        self.loop_bytes = 0
+
+        ## The bytes which CPython allocates for an integer above 256,
+        #  measured on the PC for use in @c host_allow; 0 on the board.
+        self.int_bytes = 0
+
+        ## The bytes which the simulation allocates to read its clock with
+        #  @c utime.ticks_us(), measured on the PC; 0 on the board.
+        self.ticks_bytes = 0
+
+        if not self.meter.board:
+            self.loop_bytes = self.measure('', _loop, 4, hot=False)
+            self.int_bytes = self.measure('', _box, 1000, hot=False)
+            self.ticks_bytes = self.measure('', utime.ticks_us, hot=False)
+            del self.results['']
+            self._order.remove('')
+
+    def _record(self, name, hot, used, allow, calls=1):
+        """!
+        This method adds a measurement to the results.
+        @param name     The name of the function or task.
+        @param hot      @c True if the path must not allocate.
+        @param used     The bytes allocated by one call.
+        @param allow    The bytes which the path may allocate on the PC.
+        @param calls    The number of calls measured.
+        """
+        entry = self.results.get(name)
+        if entry is None:
+            entry = [hot, 0, 0, 0 if self.meter.board else allow]
+            self.results[name] = entry
+            self._order.append(name)
+        entry[1] += calls
+        if used > entry[2]:
+            entry[2] = used
+
+    def measure(self, name, func, *args, hot=True, host_allow=0):
+        """!
+        This method calls a function several times and records the bytes
+        allocated by one call. Each call is measured alone, and a call with
+        the same arguments to a function which does nothing is measured
+        beside it and taken away, so the measurement includes neither this
+        method's own work nor the cost of making the call. The most bytes
+        of any call are kept on the board, and the fewest on the PC, where
+        @c tracemalloc itself adds noise.
+        @param name     The name under which to report the function.
+        @param func     The function, usually a bound method.
+        @param args     Up to three arguments for the function.
+        @param hot      @c True if the function must not allocate.
+        @param host_allow   The bytes which the function may allocate on the
+                        PC for things the board doesn't allocate, such as
+                        the @c range of a loop; ignored on the board.
+        @returns        The bytes allocated by one call.
+        """
+        meter = self.meter
+        num = len(args)
+        a0 = args[0] if num > 0 else None
+        a1 = args[1] if num > 1 else None
+        a2 = args[2] if num > 2 else None
+        gc.collect()
+        least = None
+        most = 0
+        for count in range(REPEATS + 2):
+            # Calls with the arguments spelled out don't allocate on the board
+            meter.start()
+            if num == 0:
+                _nothing()
+            elif num == 1:
+                _nothing(a0)
+            elif num == 2:
+                _nothing(a0, a1)
+            else:
+                _nothing(a0, a1, a2)
+            base = meter.stop()
+            meter.start()
+            if num == 0:
+                func()
+            elif num == 1:
+                func(a0)
+            elif num == 2:
+                func(a0, a1)
+            else:
+                func(a0, a1, a2)
+            used = meter.stop() - base
+            if count < 2:
+                continue
+            if used < 0:
+                used = 0
+            if least is None or used < least:
+                least = used
+            if used > most:
+                most = used
+        used = most if meter.board else least
+        self._record(name, hot, used, host_allow, REPEATS)
+        return used
+
+    def meter_task(self, task, hot=True, host_allow=0):
+        """!
+        This method measures the memory allocated by each run of a task while
+        the scheduler runs it, by wrapping the task's generator. The bytes
+        which the wrapping itself allocates are measured first, on a
+        generator which does nothing, and taken away from each run. The
+        first run, in which a task does its setup, isn't measured.
+        @param task     The @c cotask.Task to be measured.
+        @param hot      @c True if the task must not allocate.
+        @param host_allow   The bytes which each run may allocate on the PC
+                        for things the board doesn't allocate; ignored on the
+                        board.
+        """
+        if self._task_base is None:
+            self._task_base = 0
+            probe = AllocAudit(self.meter)
+            probe._task_base = 0
+            gen = probe._metered('', False, 0, _idle_gen())
+            for count in range(REPEATS + 2):
+                next(gen)
+            self._task_base = probe.results[''][2]
+        task._run_gen = self._metered(task.name, hot, host_allow,
+                                      task._run_gen)
+
+    def _metered(self, name, hot, host_allow, gen):
+        """!
+        This generator runs a task's generator, measuring each run.
+        @param name     The name of the task.
+        @param hot      @c True if the task must not allocate.
+        @param host_allow   The bytes each run may allocate on the PC.
+        @param gen      The task's generator.
+        """
+        meter = self.meter
+        base = self._task_base
+        yield next(gen)
+        while True:
+            meter.start()
+            state = next(gen)
+            used = meter.stop() - base
+            self._record(name, hot, used if used > 0 else 0, host_allow)
+            yield state
+
+    def failures(self):
+        """!
+        This method finds the hot paths which allocated memory.
+        @returns    A list of their names.
+        """
+        return [name for name in self._order
+                if self.results[name][0]
+                and self.results[name][2] > self.results[name][3]]
+
+    def check(self):
+        """!
+        This method fails if any hot path allocated memory.
+        @raises RuntimeError naming the paths which allocated
+        """
+        failed = self.failures()
+        if failed:
+            raise RuntimeError('Hot paths allocate memory: '
+                               + ', '.join(failed))
+
+    def report(self):
+        """!
+        This method makes a table of the measurements.
+        @returns    The table as a string.
+        """
+        rows = ['{:<28s}{:>6s}{:>8s}{:>7s}{:>7s}  {:s}'.format(
+            'PATH', 'HOT', 'CALLS', 'BYTES', 'ALLOW',
+            'BOARD' if self.meter.board else 'HOST')]
+        for name in self._order:
+            hot, calls, used, allow = self.results[name]
+            if used > allow:
+                verdict = 'FAIL' if hot else 'allocates'
+            else:
+                verdict = 'ok'
+            rows.append('{:<28s}{:>6s}{:>8d}{:>7d}{:>7d}  {:s}'.format(
+                name, 'yes' if hot else 'no', calls, used, allow, verdict))
+        return '\n'.join(rows)
+
+
+def audit_shares(audit):
+    """!
+    This function measures every method of each kind of share and queue,
+    called as a task would and as an interrupt would. Methods which are
+    meant for tasks and documented as allocating are measured but not
+    marked hot.
+    @param audit    The @c AllocAudit which collects the measurements.
+    """
+    buf = array.array('l', [1, 2, 3, 4])
+    hist = cotask.Histogram(100)
+    audit.measure('Histogram.add', hist.add, 1234)
+
+    for kind in (task_share.Queue, task_share.SPSCQueue):
+        queue = kind('l', 128, name='Audit')
+        label = kind.__name__ + '.'
+        audit.measure(label + 'put', queue.put, 100)
+        audit.measure(label + 'put ISR', queue.put, 100, True)
+        audit.measure(label + 'get', queue.get)
+        audit.measure(label + 'get ISR', queue.get, True)
+        audit.measure(label + 'any', queue.any)
+        audit.measure(label + 'num_in', queue.num_in)
+        audit.measure(label + 'full', queue.full)
+        # On the PC, the copy loops make an iterator or a range
+        audit.measure(label + 'put_many', queue.put_many, buf,
+                      host_allow=audit.loop_bytes)
+        audit.measure(label + 'get_into', queue.get_into, buf,
+                      host_allow=audit.loop_bytes)
+        audit.measure(label + 'get_many', queue.get_many, 2, hot=False)
+
+    share = task_share.Share('l', thread_protect=True, name='Audit')
+    audit.measure('Share.put', share.put, 100)
+    audit.measure('Share.put ISR', share.put, 100, True)
+    audit.measure('Share.get', share.get)
+    audit.measure('Share.get ISR', share.get, True)
+
+    record = task_share.Record('l', 4, name='Audit')
+    # The record's copy loops each make a range on the PC, one at a time
+    loop = audit.loop_bytes
+    audit.measure('Record.put', record.put, buf, host_allow=loop)
+    audit.measure('Record.put ISR', record.put, buf, True, host_allow=loop)
+    audit.measure('Record.begin', record.begin)
+    audit.measure('Record.__setitem__', record.__setitem__, 1, 100)
+    audit.measure('Record.commit', record.commit, host_allow=loop)
+    audit.measure('Record.get_into', record.get_into, buf, host_allow=loop)
+    audit.measure('Record.get', record.get, hot=False)
+
+
+def _nothing(a0=None, a1=None, a2=None):
+    """!
+    This function does nothing. Calls to it are measured beside calls to the
+    function being measured, to find the cost of the call itself.
+    @param a0       Ignored.
+    @param a1       Ignored.
+    @param a2       Ignored.
+    """
+    pass
+
+
+def _loop(num):
+    """!
+    This function runs an empty loop, to measure what CPython allocates for
+    the loop's @c range.
+    @param num      The number of times round the loop.
+    """
+    for idx in range(num):
+        pass
+
+
+def _box(value):
+    """!
+    This function makes one integer above 256, to measure what CPython
+    allocates for it.
+    @param value    An integer above 256.
+    @returns        One more than the value.
+    """
+    return value + 1
+
+
+def _idle_gen():
+    """!
+    This generator does nothing on each run. It is metered to find the bytes
+    which metering a task allocates itself.
+    """
+    while True:
+        yield 0
+
+
+class _Swing:
+    """!
+    This class runs a controller with the position jumping back and forth by
+    a large step on every call, so that every term of the controller works
+    near its limits.
+    """
+
+    def __init__(self, controller, setpoint, swing):
+        """!
+        Creates a swing.
+        @param controller   The @c PIDController to run.
+        @param setpoint     The setpoint in ticks.
+        @param swing        The size of each jump in ticks.
+        """
+        ## The controller.
+        self.controller = controller
+
+        ## The setpoint in ticks.
+        self.setpoint = setpoint
+
+        ## The size of each jump in ticks.
+        self.swing = swing
+
+        ## The position given to the controller on the last call.
+        self.msr = 0
+
+    def run_fixed(self):
+        """!
+        This method moves the position and runs the controller once.
+        @returns    The controller's actuation level.
+        """
+        self.msr = self.swing - self.msr
+        return self.controller.run_fixed(self.setpoint, self.msr)
+
+
+def audit_controllers(audit):
+    """!
+    This function measures @c PIDController.run_fixed(), which the interrupt
+    control loop runs, as set up at 1 kHz with and without derivative gain.
+    The position jumps by thousands of ticks between runs, far more than the
+    motor can move, so that the controller's clamps are exercised too.
+    @param audit    The @c AllocAudit which collects the measurements.
+    """
+    for name, Kd in (('PIDController.run_fixed', 0.0),
+                     ('PIDController.run_fixed Kd', 1.0)):
+        controller = PIDController(0.5, 2.0, Kd, 100, -100, tau=0.002)
+        controller.set_period(0.001)
+        swing = _Swing(controller, 16384, 20000)
+        # The swing's position and the fixed-point terms are above 256, so
+        # CPython boxes them; at most five are alive at once
+        audit.measure(name, swing.run_fixed,
+                      host_allow=5 * audit.int_bytes)
+
+
+def main():
+    """!
+    This function audits the shares and queues, prints the results and
+    fails if a hot path allocates.
+    """
+    audit = AllocAudit()
+    audit_shares(audit)
+    audit_controllers(audit)
+    print(audit.report())
+    micropython.mem_info()
+    audit.check()
+    print('No hot path allocates memory')
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,18 @@ This file contains a controller driver used for closed loop control.
 
 @details Objects of this class can be used to configure the controller driver
          to generate a step response for the motor.
+
+         The @c PIDController class adds integral and derivative action. It
+         uses the measured time between runs, clamps its integrator so that
+         it can't wind up while the output is saturated, and filters the
+         derivative. Its @c run_fixed() method does the same work in
+         fixed-point integer arithmetic for a loop with a known period, so
+         that it doesn't allocate floats on the board:
+         @code
+         controller = PIDController(0.1, 0.5, 0.002, 100, -100, tau=0.01)
+         controller.set_period(0.02)
+         duty = controller.run_fixed(setpoint, encoder.read())
+         @endcode
     
 @author Nishka Chawla
 @author Ronan Shaffer
@@ -11,6 +23,9 @@ This file contains a controller driver used for closed loop control.
 @copyright (c) Released under GNU Public License
 """
 
+import array
+import utime
+
 class ClosedLoop:
     """!
     This class implements a closed-loop controller class for an ME405 kit, containing
@@ -98,9 +113,11 @@ class ClosedLoop:
     def get_stepresponse(self, time_list, pos_list):
         """!
         This method prints step response data for the motor. 
+        @param time_list    The time of each sample.
+        @param pos_list     The motor position at each sample.
         """ 
-        ## Initialisation of the data array size
-        array_size = int((3000/10)+1)
+        ## Number of rows printed, which is however many samples were stored
+        array_size = min(len(time_list), len(pos_list))
         
         ## Index variable
         n = 0
@@ -110,6 +127,606 @@ class ClosedLoop:
 #            print(n)
 
 
+class PIDController:
+    """!
+    This class implements a PID controller with integrator anti-windup and a
+    first-order filter on the derivative. The derivative acts on the
+    measurement rather than on the error, so setpoint steps don't kick the
+    output.
+    """
+    ## Number of fraction bits in the fixed-point gains used by run_fixed().
+    FRAC_BITS = 10
+
+    ## The largest derivative term used by run_fixed(), in fixed point: 511
+    #  output units, far beyond any duty cycle. Its filter multiplies twice
+    #  this by up to 2 ** FRAC_BITS, which must stay below 2 ** 30, the
+    #  largest integer the board holds without allocating memory.
+    DERIV_LIMIT = (1 << 19) - 1
+
+    ## The largest proportional or integral step used by run_fixed(), in
+    #  fixed point, before the error is clamped.
+    STEP_LIMIT = 1 << 28
+
+    def __init__(self, Kp, Ki, Kd, sat_max, sat_min, tau=0.0):
+        """!
+        Creates a PID controller.
+        @param Kp           Proportional gain, in output per tick of error.
+        @param Ki           Integral gain, in output per tick-second of error.
+        @param Kd           Derivative gain, in output per tick per second.
+        @param sat_max      The maximum saturation limit on the PWM level.
+        @param sat_min      The minimum saturation limit on the PWM level.
+        @param tau          Time constant of the derivative filter in seconds;
+                            0 means no filtering.
+        """
+        ## Proportional gain
+        self.Kp = float(Kp)
+        
+        ## Integral gain
+        self.Ki = float(Ki)
+        
+        ## Derivative gain
+        self.Kd = float(Kd)
+        
+        ## Saturation High Limit
+        self.sat_max = int(sat_max)
+        
+        ## Saturation Low Limit
+        self.sat_min = int(sat_min)
+        
+        ## Time constant of the derivative filter in seconds
+        self.tau = float(tau)
+        
+        ## Reference value in ticks
+        self.setpoint = 0
+        
+        ## Error between the setpoint value and the measured value
+        self.error = 0
+        
+        ## Actuation signal from the most recent run
+        self.act = 0
+        
+        ## Nominal time between runs in seconds, or None if not set
+        self.period = None
+        
+        self._scale_gains()
+        self.reset()
+        
+    def reset(self):
+        """!
+        This method clears the integrator, derivative filter and timing, as
+        when the loop is started again.
+        """
+        ## Integrator state, in units of output
+        self._integral = 0.0
+        
+        ## Filtered derivative of the measurement, in ticks per second
+        self._deriv = 0.0
+        
+        ## Measurement from the previous run, or None before the first run
+        self._last_msr = None
+        
+        ## Time of the previous run from utime.ticks_us(), or None
+        self._last_time = None
+        
+        ## Integrator state for run_fixed(), in fixed-point output units with
+        #  twice the usual number of fraction bits
+        self._integral_q = 0
+        
+        ## Filtered derivative term for run_fixed(), in fixed-point output units
+        self._deriv_q = 0
+        
+    def set_Kp(self, Kp):
+        """!
+        This method sets the proportional gain value.
+        @param  Kp  Proportional gain value set by the user.
+        """ 
+        self.Kp = float(Kp)
+        self._scale_gains()
+        
+    def get_Kp(self):
+        """!
+        This method returns the set proportional gain value.
+        @returns    The set proportional gain value.
+        """ 
+        return self.Kp
+        
+    def set_gains(self, Kp, Ki, Kd):
+        """!
+        This method sets all three gains.
+        @param  Kp  Proportional gain.
+        @param  Ki  Integral gain.
+        @param  Kd  Derivative gain.
+        """
+        self.Kp = float(Kp)
+        self.Ki = float(Ki)
+        self.Kd = float(Kd)
+        self._scale_gains()
+        
+    def set_setpoint(self, setpoint):
+        """!
+        This method sets the motor setpoint value. 
+        @param  setpoint  Reference position in ticks.
+        """ 
+        self.setpoint = setpoint
+        
+    def set_period(self, period):
+        """!
+        This method sets the nominal time between runs. It is used by run()
+        on the first run, before a time has been measured, and by
+        run_fixed() always.
+        @param  period  Time between runs in seconds.
+        """
+        self.period = float(period)
+        self._scale_gains()
+        
+    def run(self, setpoint, msr, dt=None):
+        """!
+        This method performs PID control on the motor position.
+        @param  setpoint  Reference position in ticks.
+        @param  msr       The measured position of the motor.
+        @param  dt        Time since the previous run in seconds, or None to
+                          measure it with utime.ticks_us().
+        @returns          The actuation level of the controller.
+        """
+        self.setpoint = setpoint
+        self.error = setpoint - msr
+        
+        if dt is None:
+            now = utime.ticks_us()
+            if self._last_time is not None:
+                dt = utime.ticks_diff(now, self._last_time) / 1e6
+            else:
+                dt = self.period
+            self._last_time = now
+        
+        output = self.Kp * self.error
+        if dt is not None and dt > 0:
+            # Derivative of the measurement, passed through the filter
+            if self._last_msr is not None:
+                raw = (self._last_msr - msr) / dt
+                self._deriv += (raw - self._deriv) * dt / (self.tau + dt)
+            
+            # Integrate only while that doesn't push the output further
+            # into saturation, and keep the integrator within the limits
+            trial = output + self._integral + self.Kd * self._deriv
+            step = self.Ki * self.error * dt
+            if not ((trial >= self.sat_max and step > 0)
+                    or (trial <= self.sat_min and step < 0)):
+                self._integral += step
+                if self._integral > self.sat_max:
+                    self._integral = float(self.sat_max)
+                elif self._integral < self.sat_min:
+                    self._integral = float(self.sat_min)
+        self._last_msr = msr
+        
+        output += self._integral + self.Kd * self._deriv
+        if output > self.sat_max:
+            self.act = self.sat_max
+        elif output < self.sat_min:
+            self.act = self.sat_min
+        else:
+            self.act = int(output)
+        return self.act
+    
+    def run_fixed(self, setpoint, msr):
+        """!
+        This method performs PID control using only integer arithmetic, for
+        a loop which runs every set_period() seconds; set_period() must have
+        been called first, since the integral and derivative gains are
+        scaled by the period. Gains are scaled by
+        2 ** FRAC_BITS when the gains or period are set. Every intermediate
+        value stays below 2 ** 30, so the board doesn't allocate memory for
+        it: the change in position per run is clamped so that the derivative
+        term stays within DERIV_LIMIT, and the error is clamped so that the
+        proportional and integral steps stay within STEP_LIMIT. Both clamps
+        only act where the output would already saturate. The saturation
+        limits must be within -255 to 255.
+        @param  setpoint  Reference position in ticks.
+        @param  msr       The measured position of the motor.
+        @returns          The actuation level of the controller.
+        @raises ValueError if the period hasn't been set
+        """
+        if self.period is None:
+            raise ValueError('run_fixed() needs set_period() first')
+        error = setpoint - msr
+        self.setpoint = setpoint
+        self.error = error
+        shift = PIDController.FRAC_BITS
+        if error > self._err_max:
+            error = self._err_max
+        elif error < -self._err_max:
+            error = -self._err_max
+        
+        # Filtered derivative of the measurement, scaled by Kd / period
+        if self._last_msr is not None:
+            move = self._last_msr - msr
+            if move > self._move_max:
+                move = self._move_max
+            elif move < -self._move_max:
+                move = -self._move_max
+            raw = self._kd_q * move
+            self._deriv_q += ((raw - self._deriv_q) * self._alpha_q) >> shift
+        self._last_msr = msr
+        
+        # The integrator keeps twice as many fraction bits as the other
+        # terms, since the integral gain times the period is often small
+        output = self._kp_q * error
+        trial = output + (self._integral_q >> shift) + self._deriv_q
+        step = self._ki_q * error
+        if not ((trial >= self._max_q and step > 0)
+                or (trial <= self._min_q and step < 0)):
+            integral = self._integral_q + step
+            if integral > self._imax_q:
+                integral = self._imax_q
+            elif integral < self._imin_q:
+                integral = self._imin_q
+            self._integral_q = integral
+        
+        output = (output + (self._integral_q >> shift)
+                  + self._deriv_q) >> shift
+        if output > self.sat_max:
+            output = self.sat_max
+        elif output < self.sat_min:
+            output = self.sat_min
+        self.act = output
+        return output
+        
+    def _scale_gains(self):
+        """!
+        This method works out the fixed-point gains used by run_fixed() from
+        the gains, the filter time constant and the period. Until the period
+        is set, the gains which depend on it are worked out for a period of
+        one second, but run_fixed() refuses to use them.
+        """
+        one = 1 << PIDController.FRAC_BITS
+        period = self.period if self.period else 1.0
+        ## Proportional gain in fixed point
+        self._kp_q = int(round(self.Kp * one))
+        ## Integral gain times the period in fixed point, with twice the
+        #  usual number of fraction bits
+        self._ki_q = int(round(self.Ki * period * one * one))
+        ## Derivative gain over the period in fixed point
+        self._kd_q = int(round(self.Kd / period * one))
+        ## Derivative filter coefficient in fixed point
+        self._alpha_q = int(round(period / (self.tau + period) * one))
+        ## Saturation limits in fixed point
+        self._max_q = self.sat_max * one
+        self._min_q = self.sat_min * one
+        ## Integrator limits, with twice the usual number of fraction bits
+        self._imax_q = self._max_q * one
+        self._imin_q = self._min_q * one
+        ## Largest change in position per run which keeps the derivative
+        #  term within DERIV_LIMIT
+        self._move_max = PIDController.DERIV_LIMIT // max(abs(self._kd_q), 1)
+        ## Largest error which keeps the proportional and integral steps
+        #  within STEP_LIMIT
+        self._err_max = PIDController.STEP_LIMIT // max(abs(self._kp_q),
+                                                        abs(self._ki_q), 1)
+
+
+class MultiAxisController:
+    """!
+    This class implements proportional-integral control of several motors at
+    once. Gains, setpoints, saturation limits and controller state for all
+    the axes are kept in arrays, and one call to run() updates every axis,
+    so one task can run all the motors instead of one task and one
+    controller object per motor:
+    @code
+    axes = MultiAxisController(2, Kp=0.1, sat_max=100, sat_min=-100)
+    axes.set_setpoint(0, 16384)
+    axes.set_setpoint(1, 16384)
+    while True:
+        axes.step((encoder1, encoder2), (motor1, motor2))
+        yield 0
+    @endcode
+    On the PC, run_numpy() does the same work with NumPy operations on the
+    same arrays, which is much faster when simulating many axes. On the
+    board, run_fixed() does it with integers only, as
+    PIDController.run_fixed() does, so that a task which runs often doesn't
+    allocate memory for floats.
+    """
+    def __init__(self, num_axes, Kp=0.0, Ki=0.0, sat_max=100, sat_min=-100,
+                 period=None):
+        """!
+        Creates a controller for the given number of axes, all starting with
+        the same gains and limits.
+        @param num_axes     The number of axes (motors) to be controlled.
+        @param Kp           Proportional gain for every axis.
+        @param Ki           Integral gain for every axis, in output per
+                            tick-second of error.
+        @param sat_max      The maximum saturation limit on the PWM level.
+        @param sat_min      The minimum saturation limit on the PWM level.
+        @param period       Time between runs in seconds, used by the
+                            integrator when run() isn't given a time.
+        """
+        ## Number of axes
+        self.num_axes = num_axes
+        
+        ## Proportional gains
+        self.Kp = array.array('f', [Kp] * num_axes)
+        
+        ## Integral gains
+        self.Ki = array.array('f', [Ki] * num_axes)
+        
+        ## Reference positions in ticks
+        self.setpoint = array.array('l', [0] * num_axes)
+        
+        ## Saturation high limits
+        self.sat_max = array.array('l', [sat_max] * num_axes)
+        
+        ## Saturation low limits
+        self.sat_min = array.array('l', [sat_min] * num_axes)
+        
+        ## Measured positions from the most recent run
+        self.msr = array.array('l', [0] * num_axes)
+        
+        ## Errors from the most recent run
+        self.error = array.array('l', [0] * num_axes)
+        
+        ## Integrator states, in units of output
+        self.integral = array.array('f', [0.0] * num_axes)
+        
+        ## Actuation levels from the most recent run
+        self.act = array.array('l', [0] * num_axes)
+        
+        ## Time between runs in seconds, or None
+        self.period = period
+        
+        ## NumPy views of the arrays, made the first time run_numpy() is used
+        self._np = None
+        
+        ## Proportional gains in fixed point, for run_fixed()
+        self._kp_q = array.array('l', [0] * num_axes)
+        
+        ## Integral gains times the period in fixed point, with twice the
+        #  usual number of fraction bits, for run_fixed()
+        self._ki_q = array.array('l', [0] * num_axes)
+        
+        ## Largest errors which keep the proportional and integral steps of
+        #  run_fixed() within PIDController.STEP_LIMIT
+        self._err_max = array.array('l', [0] * num_axes)
+        
+        ## Integrator states for run_fixed(), in fixed-point output units
+        #  with twice the usual number of fraction bits
+        self._integral_q = array.array('l', [0] * num_axes)
+        
+        for axis in range(num_axes):
+            self._scale_gains(axis)
+        
+    def set_Kp(self, axis, Kp):
+        """!
+        This method sets the proportional gain for one axis.
+        @param  axis    The axis number, starting at 0.
+        @param  Kp      Proportional gain value set by the user.
+        """
+        self.Kp[axis] = float(Kp)
+        self._scale_gains(axis)
+        
+    def get_Kp(self, axis):
+        """!
+        This method returns the proportional gain for one axis.
+        @param  axis    The axis number, starting at 0.
+        @returns        The proportional gain value.
+        """
+        return self.Kp[axis]
+        
+    def set_Ki(self, axis, Ki):
+        """!
+        This method sets the integral gain for one axis.
+        @param  axis    The axis number, starting at 0.
+        @param  Ki      Integral gain value.
+        """
+        self.Ki[axis] = float(Ki)
+        self._scale_gains(axis)
+        
+    def set_setpoint(self, axis, setpoint):
+        """!
+        This method sets the setpoint for one axis.
+        @param  axis        The axis number, starting at 0.
+        @param  setpoint    Reference position in ticks.
+        """
+        self.setpoint[axis] = setpoint
+        
+    def set_limits(self, axis, sat_max, sat_min):
+        """!
+        This method sets the saturation limits for one axis.
+        @param  axis        The axis number, starting at 0.
+        @param  sat_max     The maximum saturation limit on the PWM level.
+        @param  sat_min     The minimum saturation limit on the PWM level.
+        """
+        self.sat_max[axis] = sat_max
+        self.sat_min[axis] = sat_min
+        
+    def reset(self):
+        """!
+        This method clears the integrators of all the axes.
+        """
+        for axis in range(self.num_axes):
+            self.integral[axis] = 0.0
+            self._integral_q[axis] = 0
+        
+    def run(self, msr, dt=None):
+        """!
+        This method performs control on every axis in one pass.
+        @param  msr     The measured positions of the axes, in order.
+        @param  dt      Time since the previous run in seconds, or None to
+                        use the period given to the constructor.
+        @returns        The array of actuation levels, which is reused by the
+                        next run.
+        """
+        if dt is None:
+            dt = self.period
+        Kp = self.Kp
+        Ki = self.Ki
+        setpoint = self.setpoint
+        sat_max = self.sat_max
+        sat_min = self.sat_min
+        integral = self.integral
+        error = self.error
+        act = self.act
+        for axis in range(self.num_axes):
+            err = setpoint[axis] - msr[axis]
+            self.msr[axis] = msr[axis]
+            error[axis] = err
+            hi = sat_max[axis]
+            lo = sat_min[axis]
+            out = Kp[axis] * err
+            if dt:
+                # Integrate unless that pushes a saturated output further
+                step = Ki[axis] * err * dt
+                trial = out + integral[axis]
+                if not ((trial >= hi and step > 0) or (trial <= lo and step < 0)):
+                    i_new = integral[axis] + step
+                    if i_new > hi:
+                        i_new = hi
+                    elif i_new < lo:
+                        i_new = lo
+                    integral[axis] = i_new
+            out += integral[axis]
+            if out > hi:
+                act[axis] = hi
+            elif out < lo:
+                act[axis] = lo
+            else:
+                act[axis] = int(out)
+        return act
+        
+    def run_numpy(self, msr, dt=None):
+        """!
+        This method does the same work as run() with NumPy, for use on the PC.
+        The NumPy arrays share memory with the controller's arrays, so the
+        two methods can be mixed and the gains can be set in the usual way.
+        @param  msr     The measured positions of the axes, in order.
+        @param  dt      Time since the previous run in seconds, or None to
+                        use the period given to the constructor.
+        @returns        A NumPy view of the actuation levels.
+        """
+        if self._np is None:
+            import numpy
+            self._np = (numpy,) + tuple(
+                numpy.frombuffer(arr, dtype=arr.typecode) for arr in
+                (self.Kp, self.Ki, self.setpoint, self.sat_max, self.sat_min,
+                 self.msr, self.error, self.integral, self.act))
+        np, Kp, Ki, setpoint, sat_max, sat_min, msr_np, error, integral, act \
+            = self._np
+        if dt is None:
+            dt = self.period
+        
+        msr_np[:] = msr
+        error[:] = setpoint - msr_np
+        out = Kp * error
+        if dt:
+            step = Ki * error * dt
+            trial = out + integral
+            hold = ((trial >= sat_max) & (step > 0)) | ((trial <= sat_min)
+                                                        & (step < 0))
+            integral[:] = np.clip(np.where(hold, integral, integral + step),
+                                  sat_min, sat_max)
+        act[:] = np.clip(out + integral, sat_min, sat_max).astype(act.dtype)
+        return act
+        
+    def run_fixed(self, msr):
+        """!
+        This method does the same work as run() using only integer
+        arithmetic, for a loop which runs every period given to the
+        constructor; with no period, it integrates nothing, as run() does.
+        The gains are scaled by 2 ** FRAC_BITS when they are set, and every
+        intermediate value stays below 2 ** 30, so the board doesn't
+        allocate memory for it: as in PIDController.run_fixed(), the error
+        is clamped so that the proportional and integral steps stay within
+        STEP_LIMIT, which only acts where the output would already saturate.
+        The saturation limits must be within -255 to 255.
+        @param  msr     The measured positions of the axes, in order.
+        @returns        The array of actuation levels, which is reused by the
+                        next run.
+        """
+        shift = PIDController.FRAC_BITS
+        integrate = self.period is not None
+        kp_q = self._kp_q
+        ki_q = self._ki_q
+        err_max = self._err_max
+        setpoint = self.setpoint
+        sat_max = self.sat_max
+        sat_min = self.sat_min
+        integral_q = self._integral_q
+        error = self.error
+        act = self.act
+        for axis in range(self.num_axes):
+            err = setpoint[axis] - msr[axis]
+            self.msr[axis] = msr[axis]
+            error[axis] = err
+            limit = err_max[axis]
+            if err > limit:
+                err = limit
+            elif err < -limit:
+                err = -limit
+            hi = sat_max[axis]
+            lo = sat_min[axis]
+            out = kp_q[axis] * err
+            if integrate:
+                # Integrate unless that pushes a saturated output further
+                step = ki_q[axis] * err
+                trial = out + (integral_q[axis] >> shift)
+                if not ((trial >= hi << shift and step > 0)
+                        or (trial <= lo << shift and step < 0)):
+                    i_new = integral_q[axis] + step
+                    if i_new > hi << (2 * shift):
+                        i_new = hi << (2 * shift)
+                    elif i_new < lo << (2 * shift):
+                        i_new = lo << (2 * shift)
+                    integral_q[axis] = i_new
+            out = (out + (integral_q[axis] >> shift)) >> shift
+            if out > hi:
+                act[axis] = hi
+            elif out < lo:
+                act[axis] = lo
+            else:
+                act[axis] = out
+        return act
+        
+    def _scale_gains(self, axis):
+        """!
+        This method works out the fixed-point gains used by run_fixed() for
+        one axis from its gains and the period.
+        @param  axis    The axis number, starting at 0.
+        """
+        one = 1 << PIDController.FRAC_BITS
+        self._kp_q[axis] = int(round(self.Kp[axis] * one))
+        if self.period:
+            self._ki_q[axis] = int(round(self.Ki[axis] * self.period
+                                         * one * one))
+        else:
+            self._ki_q[axis] = 0
+        self._err_max[axis] = PIDController.STEP_LIMIT // max(
+            abs(self._kp_q[axis]), abs(self._ki_q[axis]), 1)
+        
+    def step(self, encoders, motors, dt=None, fixed=False):
+        """!
+        This method updates and reads every encoder, runs the controller and
+        sets every motor's duty cycle, in one pass.
+        @param  encoders    The encoder drivers, one per axis.
+        @param  motors      The motor drivers, one per axis, or a
+                            @c MotorGroup, whose motors are then all
+                            changed together.
+        @param  dt          Time since the previous run in seconds, or None.
+                            It is ignored by run_fixed().
+        @param  fixed       True to run the controller with run_fixed(), so
+                            that the pass doesn't allocate memory.
+        @returns            The array of actuation levels.
+        """
+        msr = self.msr
+        for axis in range(self.num_axes):
+            encoders[axis].update()
+            msr[axis] = encoders[axis].read()
+        act = self.run_fixed(msr) if fixed else self.run(msr, dt)
+        if hasattr(motors, 'commit'):
+            motors.set_duty_cycles(act)
+        else:
+            for axis in range(self.num_axes):
+                motors[axis].set_duty_cycle(act[axis])
+        return act
+
+
 #if __name__ == '__main__':
 #        controller1 = ClosedLoop(50, 0, 0.1, 200, -200)
 #        controller2 = ClosedLoop(50, 0, 0.1, 200, -200)
@@ -17,10 +17,148 @@ chosen scheduling algorithm such as round-robin or highest-priority-first.
 """
 
 import gc                              # Memory allocation garbage collector
+import array                           # Fixed arrays for histogram bins
+import struct                          # Packs histograms for binary export
 import utime                           # Micropython version of time library
+import pyb                             # For wfi() and interrupt masking
 import micropython                     # This shuts up incorrect warnings
 
 
+## Overrun policy under which a timed task which fell behind by several
+#  periods runs once for each period it missed, back to back, until it has
+#  caught up. This is how timed tasks have always behaved.
+CATCH_UP = 0
+
+## Overrun policy under which a timed task which fell behind by several
+#  periods runs once and then skips the slots it missed, so that it keeps
+#  running at the times it would have run had it never fallen behind.
+SKIP = 1
+
+## Overrun policy under which a timed task which fell behind by several
+#  periods runs once and then runs one period after the time it was
+#  released, moving all its later run times to match.
+REALIGN = 2
+
+## Schedulability test which checks the response time of each timed task
+#  using the priorities the tasks were given.
+FIXED_PRIORITY = 0
+
+## Schedulability test which checks the response time of each timed task as
+#  if priorities were assigned by rate, the task with the shortest period
+#  getting the highest priority.
+RATE_MONOTONIC = 1
+
+## Schedulability test for earliest-deadline-first scheduling.
+EARLIEST_DEADLINE = 2
+
+## Admission action under which @c TaskList.append() prints a warning when
+#  a task would make the task list unschedulable, then adds it anyway.
+WARN = 1
+
+## Admission action under which @c TaskList.append() raises a @c ValueError
+#  rather than add a task which would make the task list unschedulable.
+REJECT = 2
+
+## The period in microseconds of the board's SysTick interrupt, which wakes
+#  @c pyb.wfi() at least this often. @c TaskList.idle() only sleeps while a
+#  whole tick remains before the next task is due, so that waking late
+#  doesn't make tasks late.
+IDLE_TICK_US = 1000
+
+## The least number of bytes allocated since the last planned garbage
+#  collection for @c TaskList.idle() to plan another one, on the board.
+GC_MIN_ALLOC = 2048
+
+## The number of bins in a task's run time and lateness histograms. The last
+#  bin also counts every value too large for the others.
+HIST_BINS = 50
+
+## The default width in microseconds of each run time histogram bin.
+HIST_BIN_US = 100
+
+## The @c struct format of each histogram's header in a binary dump: task
+#  name, histogram kind (0 for run time, 1 for lateness), number of bins, bin
+#  width in microseconds, number of values, largest value and number of
+#  missed deadlines. The bin counts follow as little-endian 32-bit integers.
+HIST_FORMAT = '<16sBHIIII'
+
+
+class Histogram:
+    """!
+    A histogram of times in fixed-width bins, used to profile tasks.
+
+    The bins are an array which is made once, so adding a value doesn't
+    allocate memory and can be done each time a task runs. Values past the
+    last bin are counted in the last bin, and the largest value is kept
+    exactly so that it isn't lost there. Percentiles are found from the bins,
+    so they are rounded up to the end of a bin.
+    """
+
+    def __init__ (self, bin_us, bins = HIST_BINS):
+        """!
+        Create an empty histogram.
+        @param bin_us The width of each bin in microseconds
+        @param bins The number of bins
+        """
+        ## The width of each bin in microseconds
+        self.bin_us = int (bin_us)
+
+        ## The number of values in each bin
+        self.counts = array.array ('I', [0] * bins)
+
+        ## The number of values added since the histogram was reset
+        self.count = 0
+
+        ## The largest value added since the histogram was reset
+        self.max = 0
+
+
+    @micropython.native
+    def add (self, value):
+        """!
+        Count one value in the histogram.
+        @param value The time to be counted, in microseconds
+        """
+        idx = value // self.bin_us
+        if idx >= len (self.counts):
+            idx = len (self.counts) - 1
+        elif idx < 0:
+            idx = 0
+        self.counts[idx] += 1
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+
+    def reset (self):
+        """!
+        Empty the histogram.
+        """
+        for idx in range (len (self.counts)):
+            self.counts[idx] = 0
+        self.count = 0
+        self.max = 0
+
+
+    def percentile (self, pct):
+        """!
+        Find the value below which a given percentage of the values fell.
+        The result is the end of the bin in which that value was counted, or
+        the largest value if it is smaller or if the value fell in the last
+        bin.
+        @param pct The percentage, such as 50 for the median or 99
+        @return The percentile in microseconds, or 0 if the histogram is empty
+        """
+        target = self.count * pct / 100
+        total = 0
+        last = len (self.counts) - 1
+        for idx in range (last):
+            total += self.counts[idx]
+            if total >= target and total > 0:
+                return min ((idx + 1) * self.bin_us, self.max)
+        return self.max
+
+
 class Task:
     """!
     Implements multitasking with scheduling and some performance logging.
@@ -58,7 +196,9 @@ class Task:
 
 
     def __init__ (self, run_fun, name = "NoName", priority = 0, 
-                  period = None, profile = False, trace = False):
+                  period = None, profile = False, trace = False,
+                  histogram = False, overrun = CATCH_UP, wcet = None,
+                  deadline = None):
         """!
         Initialize a task object so it may be run by the scheduler.
 
@@ -78,6 +218,22 @@ class Task:
         @param profile Set to @c True to enable run-time profiling 
         @param trace Set to @c True to generate a list of transitions between
                states. @b Note: This slows things down and allocates memory.
+        @param histogram Set to @c True to keep histograms of run time and
+               lateness with the default bins; @c enable_histograms() can be
+               called instead to choose the bins
+        @param overrun What a timed task does when it has fallen at least one
+               period behind: @c CATCH_UP (the default) runs it once for
+               every period missed, while @c SKIP and @c REALIGN run it once
+               and skip the missed slots
+        @param wcet The longest time in milliseconds which one run of the
+               task is expected to take, if known in advance. It is used by
+               the schedulability tests until profiling has measured longer
+               runs
+        @param deadline The time in milliseconds after a task is released by
+               which it should have finished running, used by
+               @c TaskList.edf_sched(). A timed task's deadline is by default
+               its period. An event driven task has no deadline unless one is
+               given, in which case it counts from when @c go() is called
         """
         ## The function which is run to implement this task's code. Since it 
         # is a generator, we "run" it here, which doesn't actually run it but
@@ -103,10 +259,42 @@ class Task:
             self.period = period
             self._next_run = None
 
+        ## The policy, @c CATCH_UP, @c SKIP or @c REALIGN, used when a timed
+        #  task falls one or more periods behind
+        self.overrun = overrun
+
+        ## The expected worst-case run time in microseconds given when the
+        #  task was created, or @c None
+        self.wcet = None if wcet == None else int (wcet * 1000)
+
+        ## The relative deadline in microseconds, or @c None for an event
+        #  driven task which has no deadline
+        if deadline != None:
+            self.deadline = int (deadline * 1000)
+        else:
+            self.deadline = self.period
+
+        ## The absolute deadline of the current run, in @c utime.ticks_us()
+        #  time, set when the task is released or made ready by @c go()
+        self._deadline = 0
+
+        ## The number of run slots which the task has skipped because it fell
+        #  behind, as allowed by the @c SKIP and @c REALIGN policies
+        self._skipped = 0
+
+        ## A histogram of the time taken by each run of the task, or @c None
+        #  if histograms aren't being kept
+        self.run_hist = None
+
+        ## A histogram of how late a timed task was released, or @c None
+        self.late_hist = None
+
         ## Flag which causes the task to be profiled, in which the execution
         #  time of the @c run() method is measured and basic statistics kept. 
         self._prof = profile
         self.reset_profile ()
+        if histogram:
+            self.enable_histograms ()
 
         ## The previous state in which the task last ran. It is used to watch
         # for and track state transitions.
@@ -122,6 +310,26 @@ class Task:
         #  scheduler
         self.go_flag = False
 
+        ## The time at which the task was last released by the timer, or
+        #  @c None once that release has been accounted for. The heap
+        #  scheduler uses it to measure lateness when the task really runs
+        #  rather than when it was found to be due.
+        self._due = None
+
+        ## Flag which is set while the task waits in the heap scheduler's
+        #  list of ready tasks, so that it isn't put there twice
+        self._queued = False
+
+        ## The number of times the heap scheduler released the task again
+        #  while it was still waiting to run, which a task using the
+        #  @c CATCH_UP policy makes up for with extra runs
+        self._backlog = 0
+
+        ## The task list to which this task belongs, or @c None. It is set
+        #  by @c TaskList.append() so that @c go() can tell the list that an
+        #  event-driven task needs attention.
+        self._list = None
+
 
     def schedule (self) -> bool:
         """!
@@ -133,56 +341,67 @@ class Task:
         @return @c True if the task ran or @c False if it did not
         """
         if self.ready ():
-
-            # Reset the go flag for the next run
-            self.go_flag = False
-
-            # If profiling, save the start time
-            if self._prof:
-                ## Time variable
-                stime = utime.ticks_us ()
-
-            ## Run the method belonging to the state which should be run next
-            curr_state = next (self._run_gen)
-
-            # If profiling or tracing, save timing data
-            if self._prof or self._trace:
-                ## Time variable
-                etime = utime.ticks_us ()
-
-            # If profiling, save timing data
-            if self._prof:
-                self._runs += 1
-                ## Time variable
-                runt = utime.ticks_diff (etime, stime)
-                if self._runs > 2:
-                    self._run_sum += runt
-                    if runt > self._slowest:
-                        self._slowest = runt
-
-            # If transition logic tracing is on, record a transition; if not,
-            # ignore the state. If out of memory, switch tracing off and 
-            # run the memory allocation garbage collector
-            if self._trace:
-                try:
-                    if curr_state != self._prev_state:
-                        self._tr_data.append (
-                            (utime.ticks_diff (etime, self._prev_time),
-                             curr_state))
-                except MemoryError:
-                    self._trace = False
-                    gc.collect ()
-                ## State variable
-                self._prev_state = curr_state
-                ## Time variable
-                self._prev_time = etime
-
+            self._dispatch ()
             return True
 
         else:
             return False
 
 
+    def _dispatch (self):
+        """!
+        Run the task's generator up to its next @c yield and keep the books.
+        This is used by @c schedule() and by @c TaskList.heap_sched() once
+        they have decided that this task is to run now.
+        """
+        # Reset the go flag for the next run
+        self.go_flag = False
+
+        # If profiling, save the start time
+        if self._prof or self.run_hist != None:
+            ## Time variable
+            stime = utime.ticks_us ()
+
+        ## Run the method belonging to the state which should be run next
+        curr_state = next (self._run_gen)
+
+        # If profiling or tracing, save timing data
+        if self._prof or self._trace or self.run_hist != None:
+            ## Time variable
+            etime = utime.ticks_us ()
+
+        # If profiling, save timing data
+        if self._prof or self.run_hist != None:
+            self._runs += 1
+            ## Time variable
+            runt = utime.ticks_diff (etime, stime)
+            if self._runs > 2:
+                self._run_sum += runt
+                if runt > self._slowest:
+                    self._slowest = runt
+
+            # The histogram counts every run, including the first ones
+            if self.run_hist != None:
+                self.run_hist.add (runt)
+
+        # If transition logic tracing is on, record a transition; if not,
+        # ignore the state. If out of memory, switch tracing off and 
+        # run the memory allocation garbage collector
+        if self._trace:
+            try:
+                if curr_state != self._prev_state:
+                    self._tr_data.append (
+                        (utime.ticks_diff (etime, self._prev_time),
+                         curr_state))
+            except MemoryError:
+                self._trace = False
+                gc.collect ()
+            ## State variable
+            self._prev_state = curr_state
+            ## Time variable
+            self._prev_time = etime
+
+
     @micropython.native
     def ready (self) -> bool:
         """!
@@ -198,20 +417,64 @@ class Task:
             ## Time variable
             late = utime.ticks_diff (utime.ticks_us (), self._next_run)
             if late > 0:
-                self.go_flag = True
-                self._next_run = utime.ticks_diff (self.period, 
-                                                   -self._next_run)
+                self._release (late)
 
                 # If keeping a latency profile, record the data
-                if self._prof:
-                    self._late_sum += late
-                    if late > self._latest:
-                        self._latest = late
+                if self._prof or self.late_hist != None:
+                    self._log_late (late)
 
         # If the task doesn't use a timer, we rely on go_flag to signal ready
         return self.go_flag
 
 
+    @micropython.native
+    def _release (self, late):
+        """!
+        Mark a timed task as ready to run and set its timer to go off at the
+        next run time. The time at which the task was due is kept in
+        @c _due so that lateness can be measured when the task actually runs.
+
+        A task which is less than a period late, or whose overrun policy is
+        @c CATCH_UP, is next due one period after this run was due. Otherwise
+        the number of whole periods missed is found with one division, and
+        the next run time is computed directly from it rather than by adding
+        one period at a time, so the cost doesn't grow with the overrun.
+        @param late How long ago the task was due, in microseconds
+        """
+        self.go_flag = True
+        self._due = self._next_run
+        period = self.period
+        if late < period or self.overrun == CATCH_UP:
+            self._next_run = utime.ticks_diff (period, -self._next_run)
+            return
+
+        # Skip the missed slots; the next slot is either the next one on the
+        # original schedule or one period after now
+        missed = late // period
+        self._skipped += missed
+        if self.overrun == SKIP:
+            step = (missed + 1) * period
+        else:
+            step = late + period
+        self._next_run = utime.ticks_diff (step, -self._next_run)
+
+
+    @micropython.native
+    def _log_late (self, late):
+        """!
+        Add one latency measurement to the task's profile. A task released
+        more than one period late has missed its deadline.
+        @param late How late the task was, in microseconds
+        """
+        self._late_sum += late
+        if late > self._latest:
+            self._latest = late
+        if late > self.period:
+            self._missed += 1
+        if self.late_hist != None:
+            self.late_hist.add (late)
+
+
     def reset_profile (self):
         """!
         This method resets the variables used for execution time profiling.
@@ -222,6 +485,71 @@ class Task:
         self._slowest = 0
         self._late_sum = 0
         self._latest = 0
+        self._missed = 0
+        self._skipped = 0
+        if self.run_hist != None:
+            self.run_hist.reset ()
+            self.late_hist.reset ()
+
+
+    def enable_histograms (self, run_bin_us = HIST_BIN_US, late_bin_us = None,
+                           bins = HIST_BINS):
+        """!
+        This method starts keeping histograms of the task's run time and,
+        for a timed task, of how late it is released. The bins are made
+        here, so that nothing needs to be allocated while the task runs.
+        @param run_bin_us The width of each run time bin in microseconds
+        @param late_bin_us The width of each lateness bin in microseconds. By
+               default, all but the last bin together span one period, so
+               the last bin counts the releases which missed their deadlines
+        @param bins The number of bins in each histogram
+        """
+        if late_bin_us == None:
+            if self.period != None:
+                late_bin_us = max (1, self.period // (bins - 1))
+            else:
+                late_bin_us = run_bin_us
+        self.run_hist = Histogram (run_bin_us, bins)
+        self.late_hist = Histogram (late_bin_us, bins)
+
+
+    def get_missed (self):
+        """!
+        This method returns the number of times the task missed a deadline,
+        being released more than one period after it was due. Misses are
+        counted while the task is profiled or keeps histograms.
+        @return The number of missed deadlines
+        """
+        return self._missed
+
+
+    def get_wcet (self, margin = 0.0):
+        """!
+        This method estimates the longest time which one run of the task
+        takes. It is the longest run measured while profiling (not counting
+        the first two runs, which may include start-up work) or kept in the
+        run time histogram, or the time given as @c wcet when the task was
+        created, whichever is longer.
+        @param margin The fraction by which the estimate is increased to
+               allow for runs longer than any seen so far
+        @return The estimate in microseconds, which is 0 if the task hasn't
+                been measured and no estimate was given
+        """
+        longest = self._slowest
+        if self.run_hist != None and self._runs <= 2:
+            longest = self.run_hist.max
+        if self.wcet != None and self.wcet > longest:
+            longest = self.wcet
+        return int (longest * (1.0 + margin))
+
+
+    def get_skipped (self):
+        """!
+        This method returns the number of run slots which the task skipped
+        after falling behind, under the @c SKIP or @c REALIGN policies.
+        @return The number of skipped slots
+        """
+        return self._skipped
 
 
     def get_trace (self):
@@ -252,8 +580,15 @@ class Task:
         Method to set a flag so that this task indicates that it's ready to run.
         This method may be called from an interrupt service routine or from
         another task which has data that this task needs to process soon.
+        It only sets flags and, for a task with a deadline, reads the time, so
+        it doesn't allocate memory.
         """
         self.go_flag = True
+        if self.deadline != None:
+            self._deadline = utime.ticks_diff (self.deadline,
+                                               -utime.ticks_us ())
+        if self._list != None:
+            self._list._go_pending = True
 
 
     def __repr__ (self):
@@ -277,6 +612,9 @@ class Task:
             if self.period != None:
                 rst += '{: 10.3f}{: 10.3f}'.format (avg_late, 
                                             self._latest / 1000.0)
+            else:
+                rst += '         -         -'
+            rst += '{: 8d}'.format (self._missed)
         return rst
 
 
@@ -295,6 +633,20 @@ class TaskList:
     look through the list to find the highest priority task which is ready to
     run at any given time. Tasks can also be scheduled in a simpler
     "round-robin" fashion.
+
+    For systems with many timed tasks, @c heap_sched() keeps the timed tasks
+    in a min-heap ordered by their next run times, so each pass only needs to
+    look at the task at the top of the heap and at tasks whose @c go() method
+    has been called, rather than checking the time for every task:
+    @code
+        while True:
+            cotask.task_list.heap_sched ()
+    @endcode
+    @c edf_sched() uses the same heap to find timed tasks which are due,
+    but runs the ready task whose deadline is nearest rather than the one
+    with the highest priority.
+
+    One scheduling method should be used consistently with a given list.
     """
 
     def __init__ (self):
@@ -308,14 +660,86 @@ class TaskList:
         #  that priority. 
         self.pri_list = []
 
+        ## All the tasks in the list, in the order in which they were added
+        self._tasks = []
+
+        ## A binary min-heap of the timed tasks, ordered by @c _next_run.
+        #  Task objects are kept in it directly and compared with
+        #  @c utime.ticks_diff() so that timer wraparound is handled.
+        self._heap = []
+
+        ## Tasks which have been found ready to run by @c heap_sched() but
+        #  have not run yet, in the order in which they became ready. Under
+        #  @c edf_sched(), only tasks without deadlines are kept here
+        self._ready = []
+
+        ## A binary min-heap of the ready tasks with deadlines, ordered by
+        #  @c _deadline, used by @c edf_sched()
+        self._edf = []
+
+        ## Flag set by @c Task.go() to tell @c heap_sched() that some task
+        #  may have been made ready by software or by an interrupt
+        self._go_pending = False
+
+        ## What @c append() does with a task which would make the list
+        #  unschedulable: @c None to skip the check, @c WARN or @c REJECT
+        self.admission = None
+
+        ## The schedulability test used by @c append(): @c FIXED_PRIORITY,
+        #  @c RATE_MONOTONIC or @c EARLIEST_DEADLINE
+        self.admission_test = FIXED_PRIORITY
+
+        ## The fraction by which measured run times are increased when they
+        #  are used as worst-case run times in schedulability tests
+        self.wcet_margin = 0.1
+
+        ## The total time in microseconds spent sleeping in @c idle()
+        self.idle_us = 0
+
+        ## The longest time in microseconds which a planned garbage
+        #  collection is expected to take, or 0 if @c idle() doesn't plan
+        #  collections. It is set by @c manage_gc()
+        self.gc_budget_us = 0
+
+        ## The number of garbage collections run by @c idle()
+        self.gc_runs = 0
+
+        ## The total time in microseconds spent in planned collections
+        self.gc_us = 0
+
+        ## The longest time in microseconds taken by a planned collection
+        self.gc_max_us = 0
+
+        ## The number of automatic collections noticed by @c idle(), which
+        #  may have interrupted a task. Only counted on the board
+        self.gc_auto = 0
+
+        ## The memory allocated just after the last collection which
+        #  @c idle() knows of, or @c None where @c gc.mem_alloc() is missing
+        self._gc_base = None
+
+        ## The memory allocated when @c idle() last looked
+        self._gc_last = 0
+
 
     def append (self, task):
         """!
         Append a task to the task list. The list will be sorted by task 
         priorities so that the scheduler can quickly find the highest priority
         task which is ready to run at any given time. 
+
+        If @c admission has been set, the task list is first checked with
+        the new task added, using the test chosen by @c admission_test. If
+        it fails, a warning is printed or a @c ValueError is raised.
         @param task The task to be appended to the list
         """
+        if self.admission != None and not self.schedulable (
+                self.admission_test, self._tasks + [task]):
+            msg = 'Task ' + task.name + ' makes the task list unschedulable'
+            if self.admission == REJECT:
+                raise ValueError (msg)
+            print ('Warning: ' + msg)
+
         ## See if there's a tasklist with the given priority in the main list
         new_pri = task.priority
         for pri in self.pri_list:
@@ -335,6 +759,170 @@ class TaskList:
         # Make sure the main list (of lists at each priority) is sorted
         self.pri_list.sort (key=lambda pri: pri[0], reverse=True)
 
+        # Keep track of the task for the heap scheduler. A task which was
+        # made ready before it was added is noticed by the next pass
+        self._tasks.append (task)
+        task._list = self
+        if task.go_flag:
+            self._go_pending = True
+        if task.period != None:
+            self._heap.append (task)
+            self._sift_up (len (self._heap) - 1)
+
+
+    def manage_gc (self, threshold = None):
+        """!
+        Let @c idle() run the garbage collector when no task is due.
+
+        Without this, MicroPython collects garbage whenever an allocation
+        finds the heap full, which is often in the middle of a task's run.
+        Once this method has been called, @c idle() runs @c gc.collect()
+        whenever the time until the next timed task is due is longer than
+        the time a collection takes, so collections happen between tasks
+        and the heap seldom fills during one. An automatic collection only
+        happens if the tasks allocate more between idle windows than the
+        heap has free; any which do happen are counted. This method
+        collects once to measure how long a collection takes:
+        @code
+            cotask.task_list.manage_gc ()
+            while True:
+                cotask.task_list.pri_sched ()
+                cotask.task_list.idle ()
+        @endcode
+        @param threshold The number of bytes allocated after which
+               MicroPython also collects automatically, or @c None to leave
+               that trigger off (-1) so it only collects when the heap is
+               full. A threshold only makes automatic collections more
+               frequent, so if one is given it must be well above what the
+               tasks allocate between two idle windows
+        """
+        start = utime.ticks_us ()
+        gc.collect ()
+        took = utime.ticks_diff (utime.ticks_us (), start)
+        self.gc_budget_us = int (took * (1 + self.wcet_margin)) + 1
+
+        if hasattr (gc, 'mem_alloc'):
+            self._gc_base = gc.mem_alloc ()
+            self._gc_last = self._gc_base
+            gc.threshold (threshold if threshold != None else -1)
+
+
+    def _collect (self):
+        """!
+        Run a planned garbage collection in an idle window and time it. On
+        the board, the collection is skipped if not much has been allocated
+        since the last one, and a fall in the memory allocated since
+        @c idle() last looked shows that an automatic collection ran.
+        """
+        if self._gc_base != None:
+            alloc = gc.mem_alloc ()
+            if alloc < self._gc_last:
+                self.gc_auto += 1
+                self._gc_base = alloc
+            self._gc_last = alloc
+            if alloc - self._gc_base < GC_MIN_ALLOC:
+                return
+
+        start = utime.ticks_us ()
+        gc.collect ()
+        took = utime.ticks_diff (utime.ticks_us (), start)
+        self.gc_runs += 1
+        self.gc_us += took
+        if took > self.gc_max_us:
+            self.gc_max_us = took
+            # Collections take longer as more memory is in use, so the
+            # windows chosen for them grow with the longest one seen
+            budget = int (took * (1 + self.wcet_margin)) + 1
+            if budget > self.gc_budget_us:
+                self.gc_budget_us = budget
+
+        if self._gc_base != None:
+            self._gc_base = gc.mem_alloc ()
+            self._gc_last = self._gc_base
+
+
+    def idle (self, wake = None):
+        """!
+        Sleep until the next timed task is due, unless some task is ready.
+
+        This method is meant to be called after each pass of a scheduler,
+        so that the processor sleeps instead of checking the time over and
+        over. It finds how long it is until the next timed task is due, then
+        waits for interrupts with @c pyb.wfi(), waking at least once per
+        SysTick. It returns early when an interrupt service routine calls
+        some task's @c go() method or, if @c wake is given, when it has
+        data, such as when a key is pressed on the USB serial port:
+        @code
+            vcp = pyb.USB_VCP ()
+            while not vcp.any ():
+                cotask.task_list.pri_sched ()
+                cotask.task_list.idle (vcp)
+        @endcode
+        Interrupts are disabled while checking whether to sleep and enabled
+        again after @c wfi() returns. An interrupt which arrives in between
+        still wakes the processor, so no wakeup is missed. The last part of
+        a wait which is shorter than one SysTick period is left to the
+        scheduler, as @c wfi() might not return until the tick after the
+        task was due.
+
+        If @c manage_gc() has been called and the time until the next timed
+        task is due is long enough, the garbage collector is run before
+        sleeping; see @c manage_gc().
+        @param wake An object with an @c any() method, such as a
+               @c pyb.USB_VCP, which returns @c True when the scheduler
+               should wake up, or @c None
+        @return The time spent sleeping in microseconds
+        """
+        # Don't sleep if the heap or EDF schedulers have tasks waiting
+        if self._ready or self._edf:
+            return 0
+
+        # Don't sleep if go() has made a task ready. The flag is cleared
+        # first, so an interrupt which calls go() during the check sets it
+        # again and stops the sleep below
+        self._go_pending = False
+        for task in self._tasks:
+            if task.go_flag:
+                self._go_pending = True
+                return 0
+
+        start = utime.ticks_us ()
+        wait = None
+        for task in self._tasks:
+            if task.period != None:
+                left = utime.ticks_diff (task._next_run, start)
+                if wait == None or left < wait:
+                    wait = left
+
+        # With no timed tasks, sleep until some interrupt calls go()
+        if wait == None:
+            stop = None
+        elif wait < IDLE_TICK_US:
+            return 0
+        else:
+            stop = utime.ticks_diff (wait, -start)
+
+        # Collect garbage first if it can be done before the next task is
+        # due. The collection's time isn't counted as idle time
+        if self.gc_budget_us and (wait == None or
+                                  wait >= self.gc_budget_us + IDLE_TICK_US):
+            self._collect ()
+            start = utime.ticks_us ()
+
+        while True:
+            irq_state = pyb.disable_irq ()
+            if (self._go_pending or (wake != None and wake.any ()) or
+                    (stop != None and utime.ticks_diff (stop,
+                        utime.ticks_us ()) < IDLE_TICK_US)):
+                pyb.enable_irq (irq_state)
+                break
+            pyb.wfi ()
+            pyb.enable_irq (irq_state)
+
+        slept = utime.ticks_diff (utime.ticks_us (), start)
+        self.idle_us += slept
+        return slept
+
 
     @micropython.native
     def rr_sched (self):
@@ -381,19 +969,569 @@ class TaskList:
                     return
 
 
+    @micropython.native
+    def heap_sched (self):
+        """!
+        Run tasks according to their priorities, finding timed tasks which
+        are due by looking only at the top of a heap.
+
+        This scheduler behaves like @c pri_sched(): each time it is called,
+        it runs the highest priority task which is ready to run, and tasks
+        of equal priority take turns. The difference is in how ready tasks
+        are found. The clock is read once per call, and only timed tasks
+        whose run times have passed are taken from the heap, so the cost
+        of a pass in which nothing is due doesn't grow with the number of
+        tasks. Tasks made ready by @c go() are picked up when that method
+        has been called since the previous pass.
+        """
+        self._release_due (False)
+        if self._go_pending:
+            self._find_go (False)
+        if self._ready:
+            self._run_ready (self._pop_ready (), False)
+
+
+    @micropython.native
+    def edf_sched (self):
+        """!
+        Run the ready task whose deadline is nearest.
+
+        Each time this scheduler is called, it runs the one ready task with
+        the earliest absolute deadline, whatever its priority. A timed task's
+        deadline is its relative deadline, which is its period unless it was
+        given a shorter one, after the time at which it was due; an event
+        driven task which was given a relative deadline gets its deadline
+        when @c go() is called. Ready tasks are kept in a heap ordered by
+        deadline, so choosing one takes a time which grows only with the
+        logarithm of the number of tasks, and timed tasks are found as in
+        @c heap_sched(). Event driven tasks without deadlines run, in order
+        of priority, only when no task with a deadline is ready.
+
+        A task which finishes a run after its deadline is counted as having
+        missed it; the count is shown in the @c MISSED column of the table
+        printed by @c __repr__().
+        """
+        self._release_due (True)
+        if self._go_pending:
+            self._find_go (True)
+        if self._edf:
+            self._run_ready (self._edf_pop (), True)
+        elif self._ready:
+            self._run_ready (self._pop_ready (), True)
+
+
+    @micropython.native
+    def _release_due (self, edf):
+        """!
+        Release each timed task whose run time has come, put it back in the
+        heap at its next run time and add it to the ready tasks.
+        @param edf @c True to queue released tasks by deadline for
+               @c edf_sched(), or @c False to queue them for @c heap_sched()
+        """
+        heap = self._heap
+        if not heap:
+            return
+        now = utime.ticks_us ()
+        while True:
+            task = heap[0]
+            late = utime.ticks_diff (now, task._next_run)
+            if late <= 0:
+                break
+
+            # A CATCH_UP task which is a period or more behind owes a run
+            # for every slot it missed. They are all added to its backlog
+            # at once and its next run time moved past now, so that it
+            # sinks in the heap and can't keep other due tasks, such as
+            # ones of higher priority, from being released
+            task._release (late)
+            if task.overrun == CATCH_UP and late >= task.period:
+                missed = late // task.period
+                task._backlog += missed
+                task._next_run = utime.ticks_diff (missed * task.period,
+                                                   -task._next_run)
+            self._sift_down (0)
+            if not task._queued:
+                task._queued = True
+                if edf:
+                    task._deadline = utime.ticks_diff (task.deadline,
+                                                       -task._due)
+                    self._edf_push (task)
+                else:
+                    self._ready.append (task)
+                continue
+
+            # The task is due again before it has run. Under CATCH_UP it
+            # owes an extra run, as it would under pri_sched(); otherwise
+            # this slot is skipped. Either way its lateness is logged now
+            if task.overrun == CATCH_UP:
+                task._backlog += 1
+            else:
+                task._skipped += 1
+            if task._prof or task.late_hist != None:
+                task._log_late (late)
+
+
+    def _find_go (self, edf):
+        """!
+        Find the tasks which @c go() has made ready and add them to the
+        ready tasks.
+        @param edf @c True to queue tasks which have deadlines by deadline
+               for @c edf_sched(), or @c False to queue every task for
+               @c heap_sched()
+        """
+        self._go_pending = False
+        for task in self._tasks:
+            if task.go_flag and not task._queued:
+                task._queued = True
+                if edf and task.deadline != None:
+                    self._edf_push (task)
+                else:
+                    self._ready.append (task)
+
+
+    @micropython.native
+    def _pop_ready (self):
+        """!
+        Take the highest priority task from the list of ready tasks; among
+        tasks of the same priority, the one which has been waiting longest
+        is taken.
+        @return The task
+        """
+        ready = self._ready
+        best = 0
+        best_pri = ready[0].priority
+        for idx in range (1, len (ready)):
+            if ready[idx].priority > best_pri:
+                best = idx
+                best_pri = ready[idx].priority
+        return ready.pop (best)
+
+
+    @micropython.native
+    def _run_ready (self, task, edf):
+        """!
+        Run a task which was taken from the ready tasks, record its lateness
+        and, under @c edf_sched(), whether it missed its deadline.
+        @param task The task to be run
+        @param edf @c True if the task is being run by @c edf_sched()
+        """
+        task._queued = False
+
+        # Timed tasks record lateness when they run, as with pri_sched().
+        # A task released more than a period late was already counted as
+        # missing its deadline there
+        late = 0
+        if task._due != None:
+            if task._prof or task.late_hist != None:
+                late = utime.ticks_diff (utime.ticks_us (), task._due)
+                if late > 0:
+                    task._log_late (late)
+            task._due = None
+
+        task._dispatch ()
+
+        if edf and task.deadline != None:
+            if (utime.ticks_diff (utime.ticks_us (), task._deadline) > 0
+                    and (task.period == None or late <= task.period)):
+                task._missed += 1
+
+        # A task which fell behind under CATCH_UP goes back in line at once,
+        # due one period after the run it just made
+        if task._backlog > 0:
+            task._backlog -= 1
+            task.go_flag = True
+            task._queued = True
+            if edf:
+                task._deadline = utime.ticks_diff (task.period,
+                                                   -task._deadline)
+                self._edf_push (task)
+            else:
+                self._ready.append (task)
+
+
+    @micropython.native
+    def _edf_push (self, task):
+        """!
+        Add a task to the heap of ready tasks ordered by deadline.
+        @param task The task, whose @c _deadline has been set
+        """
+        edf = self._edf
+        edf.append (task)
+        idx = len (edf) - 1
+        while idx > 0:
+            parent = (idx - 1) >> 1
+            if utime.ticks_diff (task._deadline, edf[parent]._deadline) >= 0:
+                break
+            edf[idx] = edf[parent]
+            idx = parent
+        edf[idx] = task
+
+
+    @micropython.native
+    def _edf_pop (self):
+        """!
+        Take the task with the earliest deadline from the heap of ready
+        tasks ordered by deadline.
+        @return The task
+        """
+        edf = self._edf
+        first = edf[0]
+        task = edf.pop ()
+        length = len (edf)
+        if length > 0:
+            idx = 0
+            while True:
+                child = 2 * idx + 1
+                if child >= length:
+                    break
+                if (child + 1 < length and utime.ticks_diff (
+                        edf[child + 1]._deadline, edf[child]._deadline) < 0):
+                    child += 1
+                if utime.ticks_diff (edf[child]._deadline,
+                                     task._deadline) >= 0:
+                    break
+                edf[idx] = edf[child]
+                idx = child
+            edf[idx] = task
+        return first
+
+
+    @micropython.native
+    def _sift_up (self, idx):
+        """!
+        Move the task at the given index in the heap up toward the top of
+        the heap until its parent runs no later than it does.
+        @param idx The index of the task to be moved
+        """
+        heap = self._heap
+        task = heap[idx]
+        while idx > 0:
+            parent = (idx - 1) >> 1
+            if utime.ticks_diff (task._next_run, heap[parent]._next_run) >= 0:
+                break
+            heap[idx] = heap[parent]
+            idx = parent
+        heap[idx] = task
+
+
+    @micropython.native
+    def _sift_down (self, idx):
+        """!
+        Move the task at the given index in the heap down away from the top
+        of the heap until neither of its children runs earlier than it does.
+        @param idx The index of the task to be moved
+        """
+        heap = self._heap
+        length = len (heap)
+        task = heap[idx]
+        while True:
+            child = 2 * idx + 1
+            if child >= length:
+                break
+            if (child + 1 < length and utime.ticks_diff (
+                    heap[child + 1]._next_run, heap[child]._next_run) < 0):
+                child += 1
+            if utime.ticks_diff (heap[child]._next_run, task._next_run) >= 0:
+                break
+            heap[idx] = heap[child]
+            idx = child
+        heap[idx] = task
+
+
+    def hist_report (self):
+        """!
+        Create a table of run time and lateness percentiles, in milliseconds,
+        and the numbers of missed deadlines and skipped run slots for the
+        tasks which keep histograms.
+        @return A string with one line for each such task
+        """
+        ret_str = 'TASK             RUNS   DUR P50   DUR P99   DUR MAX  ' \
+            'LATE P50  LATE P99  LATE MAX  MISSED SKIPPED\n'
+        for task in self._tasks:
+            if task.run_hist == None:
+                continue
+            ret_str += '{:<16s}{: 5d}'.format (task.name, task.run_hist.count)
+            for hist in (task.run_hist, task.late_hist):
+                for pct in (50, 99):
+                    ret_str += '{: 10.3f}'.format (hist.percentile (pct)
+                                                   / 1000.0)
+                ret_str += '{: 10.3f}'.format (hist.max / 1000.0)
+            ret_str += '{: 8d}{: 8d}\n'.format (task.get_missed (),
+                                                task.get_skipped ())
+        return ret_str
+
+
+    def dump_histograms (self, stream, binary = False):
+        """!
+        Write the histograms of the tasks which keep them to a stream such
+        as a file, @c pyb.USB_VCP or @c sys.stdout. As CSV, each histogram
+        is a line giving the task name, @c run or @c late, the bin width in
+        microseconds, the number of values, the largest value, the number of
+        missed deadlines and then the bin counts. As binary, each histogram
+        is a header packed with @c HIST_FORMAT followed by the bin counts;
+        @c load_histograms() reads it back.
+        @param stream An object with a @c write() method
+        @param binary @c True for binary, @c False for CSV
+        """
+        if not binary:
+            stream.write ('task,hist,bin_us,count,max_us,missed,bins\r\n')
+        for task in self._tasks:
+            if task.run_hist == None:
+                continue
+            for kind, hist in enumerate ((task.run_hist, task.late_hist)):
+                missed = task.get_missed () if kind else 0
+                if binary:
+                    stream.write (struct.pack (HIST_FORMAT,
+                        task.name.encode (), kind, len (hist.counts),
+                        hist.bin_us, hist.count, hist.max, missed))
+                    stream.write (hist.counts)
+                else:
+                    stream.write ('{:s},{:s},{:d},{:d},{:d},{:d},'.format (
+                        task.name, ('run', 'late')[kind], hist.bin_us,
+                        hist.count, hist.max, missed))
+                    stream.write (','.join ([str (n) for n in hist.counts]))
+                    stream.write ('\r\n')
+
+
+    def utilization (self, tasks = None):
+        """!
+        Find the fraction of the processor's time which the timed tasks
+        need, using each task's estimated worst-case run time.
+        @param tasks A list of tasks, or @c None for the tasks in this list
+        @return The utilization, which can't be more than 1 if the tasks are
+                to keep up
+        """
+        if tasks == None:
+            tasks = self._tasks
+        return sum ([task.get_wcet (self.wcet_margin) / task.period
+                     for task in tasks if task.period != None])
+
+
+    def _response_time (self, task, higher, blocking):
+        """!
+        Find the longest time from when a timed task is released until it
+        finishes running. Since tasks aren't preempted, the task can first
+        be held up by one run of a task which doesn't have a higher priority
+        and then by every release of the higher priority tasks until it
+        starts; the wait is found by repeating that sum until it settles.
+        @param task The task being checked
+        @param higher The timed tasks which may run before it
+        @param blocking The longest run of a task which may be running when
+               this task is released
+        @return The response time in microseconds, or @c None if it is
+                longer than the task's period
+        """
+        margin = self.wcet_margin
+        cost = task.get_wcet (margin)
+        wait = blocking + sum ([other.get_wcet (margin) for other in higher])
+        while True:
+            start = blocking
+            for other in higher:
+                start += (wait // other.period + 1) * other.get_wcet (margin)
+            if start + cost > task.period:
+                return None
+            if start == wait:
+                return wait + cost
+            wait = start
+
+
+    def response_times (self, test = FIXED_PRIORITY, tasks = None):
+        """!
+        Find the response time of each timed task under fixed-priority
+        scheduling, either with the tasks' own priorities, as used by
+        @c pri_sched(), or with rate-monotonic priorities. Tasks at the same
+        priority take turns, so each counts as higher priority than the
+        others. Tasks without a period can't be analyzed, so each is assumed
+        to run once in the way of every timed task.
+        @param test @c FIXED_PRIORITY or @c RATE_MONOTONIC
+        @param tasks A list of tasks, or @c None for the tasks in this list
+        @return A list of @c (task, response time) pairs for the timed
+                tasks; the time is in microseconds, or @c None if the task
+                may miss its deadline
+        """
+        if tasks == None:
+            tasks = self._tasks
+        if test == RATE_MONOTONIC:
+            rank = lambda task: -task.period
+        else:
+            rank = lambda task: task.priority
+        margin = self.wcet_margin
+        timed = [task for task in tasks if task.period != None]
+        events = [task.get_wcet (margin) for task in tasks
+                  if task.period == None]
+        times = []
+        for task in timed:
+            higher = [other for other in timed if other is not task
+                      and rank (other) >= rank (task)]
+            blocking = max ([0] + events + [other.get_wcet (margin)
+                             for other in timed if rank (other) < rank (task)])
+            times.append ((task, self._response_time (task, higher,
+                                                      blocking)))
+        return times
+
+
+    def schedulable (self, test = FIXED_PRIORITY, tasks = None):
+        """!
+        Check whether every timed task will finish each run within its
+        period. The fixed-priority tests check each task's response time.
+        The earliest-deadline test checks that utilization is at most 1 and
+        applies Jeffay's condition for tasks which aren't preempted, with
+        one run of the longest task without a period added to the demand.
+        @param test @c FIXED_PRIORITY, @c RATE_MONOTONIC or
+               @c EARLIEST_DEADLINE
+        @param tasks A list of tasks, or @c None for the tasks in this list
+        @return @c True if the tasks pass the test
+        """
+        if tasks == None:
+            tasks = self._tasks
+        if test != EARLIEST_DEADLINE:
+            for task, resp in self.response_times (test, tasks):
+                if resp == None:
+                    return False
+            return True
+
+        if self.utilization (tasks) > 1.0:
+            return False
+        margin = self.wcet_margin
+        timed = [task for task in tasks if task.period != None]
+        timed.sort (key = lambda task: task.period)
+        blocking = max ([0] + [task.get_wcet (margin) for task in tasks
+                               if task.period == None])
+        for idx in range (1, len (timed)):
+            period = timed[idx].period
+
+            # The demand only changes just after a multiple of a shorter
+            # period, so those are the only intervals which need checking
+            for other in timed[:idx]:
+                length = other.period + 1
+                while length < period:
+                    demand = blocking + timed[idx].get_wcet (margin)
+                    for shorter in timed[:idx]:
+                        demand += ((length - 1) // shorter.period
+                                   * shorter.get_wcet (margin))
+                    if length > timed[0].period and demand > length:
+                        return False
+                    length += other.period
+        return True
+
+
+    def suggest_priorities (self):
+        """!
+        Suggest priorities for the timed tasks under which they would all
+        meet their deadlines with @c pri_sched(). Audsley's method is used:
+        starting at the lowest priority, each level is given to a task which
+        can meet its deadline there with all the remaining tasks above it.
+        Where more than one task would fit at a level, the one with the
+        lowest priority now is chosen, so the suggestion stays close to the
+        priorities the programmer chose.
+        @return A list of @c (task, priority) pairs with priorities starting
+                at 1 for the lowest, or @c None if no priorities work
+        """
+        margin = self.wcet_margin
+        left = [task for task in self._tasks if task.period != None]
+        left.sort (key = lambda task: task.priority)
+        lower = [task.get_wcet (margin) for task in self._tasks
+                 if task.period == None]
+        order = []
+        while left:
+            for task in left:
+                higher = [other for other in left if other is not task]
+                if self._response_time (task, higher,
+                                        max ([0] + lower)) != None:
+                    break
+            else:
+                return None
+            left.remove (task)
+            lower.append (task.get_wcet (margin))
+            order.append ((task, len (order) + 1))
+        return order
+
+
+    def sched_report (self):
+        """!
+        Create a table showing each timed task's worst-case run time and
+        utilization, its response time with the priorities it has and with
+        rate-monotonic priorities, the results of each schedulability test
+        and suggested priorities. Times are in milliseconds; a response time
+        of @c - means the task may miss its deadline.
+        @return A string containing the report
+        """
+        ret_str = 'TASK             PRI    PERIOD      WCET    UTIL' \
+            '   FP RESP   RM RESP\n'
+        fixed = self.response_times (FIXED_PRIORITY)
+        rate = self.response_times (RATE_MONOTONIC)
+        for (task, resp), (same, rm_resp) in zip (fixed, rate):
+            ret_str += '{:<16s}{: 4d}{: 10.1f}{: 10.3f}{: 8.3f}'.format (
+                task.name, task.priority, task.period / 1000.0,
+                task.get_wcet (self.wcet_margin) / 1000.0,
+                task.get_wcet (self.wcet_margin) / task.period)
+            for time in (resp, rm_resp):
+                if time == None:
+                    ret_str += '         -'
+                else:
+                    ret_str += '{: 10.3f}'.format (time / 1000.0)
+            ret_str += '\n'
+        num = len (fixed)
+        bound = num * (2 ** (1 / num) - 1) if num else 1.0
+        ret_str += 'Utilization {:.3f}, rate-monotonic bound {:.3f}\n'.format (
+            self.utilization (), bound)
+        for name, test in (('Fixed priority', FIXED_PRIORITY),
+                           ('Rate monotonic', RATE_MONOTONIC),
+                           ('Earliest deadline', EARLIEST_DEADLINE)):
+            ret_str += '{:s}: {:s}\n'.format (name, 'schedulable' if
+                self.schedulable (test) else 'NOT schedulable')
+        order = self.suggest_priorities ()
+        if order == None:
+            ret_str += 'No priorities make the tasks schedulable\n'
+        else:
+            ret_str += 'Suggested priorities: ' + ', '.join (
+                [task.name + ' ' + str (pri) for task, pri in order]) + '\n'
+        return ret_str
+
+
     def __repr__ (self):
         """!
         Create some diagnostic text showing the tasks in the task list.
         """
         ret_str = 'TASK             PRI    PERIOD    RUNS   AVG DUR   MAX ' \
-            'DUR  AVG LATE  MAX LATE\n'
+            'DUR  AVG LATE  MAX LATE  MISSED\n'
         for pri in self.pri_list:
             for task in pri[2:]:
                 ret_str += str (task) + '\n'
 
+        if self.gc_budget_us:
+            ret_str += ('GC {:d} planned collections, {:.3f} ms total, '
+                        '{:.3f} ms max, {:.3f} ms budget, {:d} automatic\n'
+                        ).format (self.gc_runs, self.gc_us / 1000,
+                                  self.gc_max_us / 1000,
+                                  self.gc_budget_us / 1000, self.gc_auto)
         return ret_str
 
 
+def load_histograms (data):
+    """!
+    Read histograms written by @c TaskList.dump_histograms() in binary form,
+    such as on a PC which received them from the board.
+    @param data The bytes which were written
+    @return A list of tuples, one per histogram, each holding the task name,
+            the kind (0 for run time, 1 for lateness), the bin width in
+            microseconds, the number of values, the largest value, the number
+            of missed deadlines and a list of the bin counts
+    """
+    hists = []
+    pos = 0
+    size = struct.calcsize (HIST_FORMAT)
+    while pos + size <= len (data):
+        name, kind, bins, bin_us, count, most, missed = struct.unpack_from (
+            HIST_FORMAT, data, pos)
+        pos += size
+        counts = list (struct.unpack_from ('<{:d}I'.format (bins), data, pos))
+        pos += 4 * bins
+        hists.append ((name.rstrip (b'\0').decode (), kind, bin_us, count,
+                       most, missed, counts))
+    return hists
+
+
 ## This is @b the main task list which is created for scheduling when 
 #  @c cotask.py is imported into a program. 
 task_list = TaskList ()
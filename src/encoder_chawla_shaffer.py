@@ -4,20 +4,73 @@ This file contains code used to configure the encoders.
 
 @details Objects of this class can be used to configure the encoder driver
          to measure motor rotation in units of encoder ticks.
+
+         Normally the owning task calls @c update() each time it runs. In
+         capture mode, a second hardware timer interrupts at a fixed rate
+         and its callback samples the counter, keeping a short history of
+         (time, position) samples from which @c read_velocity() estimates
+         the speed:
+         @code
+         encoder = EncoderDriver(pinC6, pinC7, 8)
+         encoder.start_capture(6, 1000)              # Sample at 1 kHz
+         encoder.set_estimator(EncoderDriver.REGRESSION, 8)
+         speed = encoder.read_velocity()             # Ticks per second
+         @endcode
+         A task which runs often can use @c read_velocity_int() instead,
+         which gives a whole number of ticks per second without making
+         floats, so that it doesn't allocate memory.
     
 @author Nishka Chawla
 @author Ronan Shaffer
 @date   26-Jan-2022
 @copyright (c) Released under GNU Public License
 """
+import array
 import pyb
+import utime
 import time 
 
 
+def _per_second(ticks, us):
+    """!
+    This function works out a change in ticks over a time as ticks per
+    second, rounded toward zero as @c int() of the floating point quotient
+    would be, using only integers below 2 ** 30 so that the board doesn't
+    allocate memory. Times of a second or more lose some precision.
+    @param ticks    The change in position in ticks.
+    @param us       The time in microseconds, which must be positive.
+    @returns        The speed in ticks per second.
+    """
+    num = ticks if ticks >= 0 else -ticks
+    while us >= 1 << 20:
+        num >>= 1
+        us >>= 1
+    # Multiply the remainder by a thousand twice, which keeps it below
+    # 2 ** 30 while the time is below 2 ** 20
+    whole = num // us
+    rem = num - whole * us
+    milli = (rem * 1000) // us
+    rem = rem * 1000 - milli * us
+    speed = whole * 1000000 + milli * 1000 + (rem * 1000) // us
+    return speed if ticks >= 0 else -speed
+
+
 class EncoderDriver:
     """!
     This class implements an encoder driver for an ME405 kit. 
     """
+    ## Velocity estimator using the two most recent samples.
+    FINITE_DIFF = 0
+
+    ## Velocity estimator fitting a line to the most recent samples.
+    REGRESSION = 1
+
+    ## Velocity estimator timing the most recent changes in position, which
+    #  works better than the others when the motor turns slowly.
+    PERIOD = 2
+
+    ## The number of samples kept in capture mode; a power of two.
+    RING_SIZE = 16
     
     def __init__(self, pinA, pinB, tim_num):
         """!
@@ -45,25 +98,277 @@ class EncoderDriver:
         ## Encoder Channel 2 for a timer object.
         self.tch2 = self.tim.channel(2, pyb.Timer.ENC_AB, pin=pinB)
         
+        ## Ticks between two most recent encoder positions.
+        self.delta = 0
+        
+        ## Timer whose interrupts sample the counter in capture mode, or None.
+        self.cap_tim = None
+        
+        ## Sample times from utime.ticks_us(), kept in a ring.
+        self._cap_times = array.array('l', [0] * EncoderDriver.RING_SIZE)
+        
+        ## Sample positions in ticks, kept in a ring.
+        self._cap_pos = array.array('l', [0] * EncoderDriver.RING_SIZE)
+        
+        ## Index in the ring at which the next sample will be stored.
+        self._cap_idx = 0
+        
+        ## Number of samples taken, up to the ring size.
+        self._cap_count = 0
+        
+        ## Position when update() was last called in capture mode.
+        self._update_pos = 0
+        
+        ## The velocity estimator used by read_velocity().
+        self.estimator = EncoderDriver.FINITE_DIFF
+        
+        ## The number of samples used by the regression estimator.
+        self.window = 4
+        
+        ## The capture callback, bound once so the ISR doesn't allocate it.
+        self._capture_cb = self.capture
+        
+        ## The times and positions of the two most recent changes in
+        #  position, newest first, found by _find_changes().
+        self._changes = array.array('l', [0] * 4)
+        
     def update(self):
         """!
         This method updates encoder position and delta by tracking the current 
-        encoder position and correcting for overflow.
-        """       
+        encoder position and correcting for overflow. The counter is read
+        once, so no ticks are lost between reads. In capture mode the
+        position is kept up to date by the timer interrupt, so this method
+        only finds the change since it was last called.
+        """
+        if self.cap_tim is not None:
+            pos = self._current_pos
+            self.delta = pos - self._update_pos
+            self._update_pos = pos
+            return
+        
         ## The current tick count.
         self.update_count = self.tim.counter()
         
         ## Ticks between two most recent encoder positions.
         self.delta = self.update_count - self._ref_count
         
-        if self.delta > 0 and self.delta > self.period/2:
-            self.delta -= self.period
-        if self.delta < 0 and abs(self.delta) > self.period/2:
-            self.delta += self.period
+        # The counter wraps from period to 0, so it counts modulo period + 1
+        modulus = self.period + 1
+        if self.delta > modulus >> 1:
+            self.delta -= modulus
+        elif self.delta < -(modulus >> 1):
+            self.delta += modulus
             
-        self._ref_count = self.tim.counter()
+        self._ref_count = self.update_count
         
         self._current_pos += self.delta
+        
+    def start_capture(self, tim_num, freq):
+        """!
+        This method starts capture mode, in which a hardware timer interrupt
+        samples the encoder at a fixed rate. The timer must not be one which
+        is used for anything else.
+        @param tim_num      The number of the timer which sets the sample rate.
+        @param freq         The sample rate in Hz.
+        """
+        self.update()
+        self._update_pos = self._current_pos
+        self._cap_idx = 0
+        self._cap_count = 0
+        self.cap_tim = pyb.Timer(tim_num, freq=freq, callback=self._capture_cb)
+        
+    def stop_capture(self):
+        """!
+        This method stops capture mode and goes back to updating the position
+        only when update() is called.
+        """
+        if self.cap_tim is not None:
+            self.cap_tim.callback(None)
+            self.cap_tim = None
+        
+    def capture(self, tim=None):
+        """!
+        This method samples the counter once and adds the sample to the ring.
+        It is the timer interrupt callback in capture mode, and it can also
+        be called from another interrupt which samples several encoders. It
+        doesn't allocate memory.
+        @param tim          The timer which caused the interrupt; unused.
+        """
+        count = self.tim.counter()
+        delta = count - self._ref_count
+        modulus = self.period + 1
+        if delta > modulus >> 1:
+            delta -= modulus
+        elif delta < -(modulus >> 1):
+            delta += modulus
+        self._ref_count = count
+        self._current_pos += delta
+        
+        idx = self._cap_idx
+        self._cap_times[idx] = utime.ticks_us()
+        self._cap_pos[idx] = self._current_pos
+        self._cap_idx = (idx + 1) & (EncoderDriver.RING_SIZE - 1)
+        if self._cap_count < EncoderDriver.RING_SIZE:
+            self._cap_count += 1
+        
+    def set_estimator(self, estimator, window=4):
+        """!
+        This method chooses how read_velocity() estimates the speed.
+        @param estimator    FINITE_DIFF, REGRESSION or PERIOD.
+        @param window       The number of samples used by REGRESSION, from 2 to
+                            a few less than RING_SIZE.
+        """
+        if estimator not in (EncoderDriver.FINITE_DIFF,
+                             EncoderDriver.REGRESSION, EncoderDriver.PERIOD):
+            raise ValueError('Unknown velocity estimator')
+        if not 2 <= window <= EncoderDriver.RING_SIZE - 4:
+            raise ValueError('Regression window must be 2 to {:}'.format(
+                EncoderDriver.RING_SIZE - 4))
+        self.estimator = estimator
+        self.window = window
+        
+    def read_velocity(self):
+        """!
+        This method estimates the motor speed from the samples taken in
+        capture mode, using the chosen estimator.
+        @returns    The speed in ticks per second, or 0.0 until enough samples
+                    have been taken.
+        """
+        # Copy the index once; the interrupt may add samples while we work,
+        # but the ring is big enough that the ones we use won't be replaced
+        newest = (self._cap_idx - 1) & (EncoderDriver.RING_SIZE - 1)
+        count = self._cap_count
+        if count < 2:
+            return 0.0
+        if self.estimator == EncoderDriver.REGRESSION:
+            return self._velocity_regression(newest, min(count, self.window))
+        if self.estimator == EncoderDriver.PERIOD:
+            return self._velocity_period(newest, count)
+        return self._velocity_regression(newest, 2)
+        
+    def read_velocity_int(self):
+        """!
+        This method estimates the motor speed as read_velocity() does, as a
+        whole number of ticks per second rounded toward zero. The finite
+        difference and period estimators use only integers, so they don't
+        allocate memory; the regression estimator works out the speed as
+        read_velocity() does and rounds it, which makes floats.
+        @returns    The speed in ticks per second, or 0 until enough samples
+                    have been taken.
+        """
+        mask = EncoderDriver.RING_SIZE - 1
+        newest = (self._cap_idx - 1) & mask
+        count = self._cap_count
+        if count < 2:
+            return 0
+        if self.estimator == EncoderDriver.REGRESSION:
+            return int(self._velocity_regression(newest,
+                                                 min(count, self.window)))
+        if self.estimator == EncoderDriver.PERIOD:
+            return self._velocity_period_int(newest, count)
+        prev = (newest - 1) & mask
+        span = utime.ticks_diff(self._cap_times[newest], self._cap_times[prev])
+        if span <= 0:
+            return 0
+        return _per_second(self._cap_pos[newest] - self._cap_pos[prev], span)
+        
+    def _velocity_regression(self, newest, num):
+        """!
+        This method fits a straight line to the most recent samples and
+        returns its slope. With two samples this is a finite difference.
+        @param newest       The ring index of the newest sample.
+        @param num          The number of samples to use.
+        @returns            The speed in ticks per second.
+        """
+        mask = EncoderDriver.RING_SIZE - 1
+        t_new = self._cap_times[newest]
+        p_new = self._cap_pos[newest]
+        sum_t = 0
+        sum_p = 0
+        sum_tt = 0
+        sum_tp = 0
+        for back in range(num):
+            idx = (newest - back) & mask
+            t = utime.ticks_diff(self._cap_times[idx], t_new)
+            p = self._cap_pos[idx] - p_new
+            sum_t += t
+            sum_p += p
+            sum_tt += t * t
+            sum_tp += t * p
+        denom = num * sum_tt - sum_t * sum_t
+        if denom == 0:
+            return 0.0
+        return 1e6 * (num * sum_tp - sum_t * sum_p) / denom
+        
+    def _find_changes(self, newest, count):
+        """!
+        This method finds the two most recent changes in position in the
+        ring and puts the times and positions of the samples at which they
+        were seen into _changes: the newest time and position, then the
+        older ones.
+        @param newest       The ring index of the newest sample.
+        @param count        The number of samples in the ring.
+        @returns            True if two changes were found.
+        """
+        mask = EncoderDriver.RING_SIZE - 1
+        changes = self._changes
+        found = 0
+        idx = newest
+        for back in range(count - 1):
+            prev = (idx - 1) & mask
+            if self._cap_pos[prev] != self._cap_pos[idx]:
+                # The position changed between these samples; note when
+                changes[2 * found] = self._cap_times[idx]
+                changes[2 * found + 1] = self._cap_pos[idx]
+                found += 1
+                if found == 2:
+                    return True
+            idx = prev
+        return False
+        
+    def _velocity_period(self, newest, count):
+        """!
+        This method estimates the speed from the time between the two most
+        recent changes in position. If no change has been seen for longer
+        than that, the speed can be at most one tick over the time since the
+        last change, so the estimate falls toward zero as a stopped motor
+        would.
+        @param newest       The ring index of the newest sample.
+        @param count        The number of samples in the ring.
+        @returns            The speed in ticks per second.
+        """
+        if not self._find_changes(newest, count):
+            return 0.0
+        changes = self._changes
+        span = utime.ticks_diff(changes[0], changes[2])
+        since = utime.ticks_diff(self._cap_times[newest], changes[0])
+        speed = 1e6 * (changes[1] - changes[3]) / span
+        if since > span:
+            bound = 1e6 / since
+            if abs(speed) > bound:
+                speed = bound if speed > 0 else -bound
+        return speed
+        
+    def _velocity_period_int(self, newest, count):
+        """!
+        This method does the work of _velocity_period() with integers only.
+        @param newest       The ring index of the newest sample.
+        @param count        The number of samples in the ring.
+        @returns            The speed in whole ticks per second.
+        """
+        if not self._find_changes(newest, count):
+            return 0
+        changes = self._changes
+        span = utime.ticks_diff(changes[0], changes[2])
+        since = utime.ticks_diff(self._cap_times[newest], changes[0])
+        speed = _per_second(changes[1] - changes[3], span)
+        if since > span:
+            bound = 1000000 // since
+            if speed > bound:
+                speed = bound
+            elif speed < -bound:
+                speed = -bound
+        return speed
                                 
     def read(self):
         """!
@@ -77,6 +382,8 @@ class EncoderDriver:
         This method sets the encoder position to zero.
         """
         self._current_pos = int(0)
+        self._update_pos = 0
+        self._cap_count = 0
 
 
 
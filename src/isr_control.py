@@ -0,0 +1,245 @@
+"""!
+@file isr_control.py
+This file contains a control loop which runs in a hardware timer interrupt
+instead of in a cooperative task.
+
+@details A task run by @c cotask is only as punctual as the slowest other
+         task, since the scheduler can't start it until the task before it
+         yields. An @c ISRControlLoop runs every axis's encoder read,
+         controller and PWM write in the callback of a hardware timer, so it
+         runs within microseconds of the timer's tick whatever the tasks are
+         doing, and loops of 1 kHz and more are possible. Nothing in the
+         interrupt allocates memory: the controllers are @c PIDController
+         objects run with @c run_fixed(), and the loop's state is kept in
+         arrays made beforehand.
+
+         Tasks talk to the loop without disabling interrupts. They write
+         setpoints into the @c setpoints array, one word at a time, and read
+         telemetry records from the @c telemetry queue, a
+         @c task_share.SPSCQueue into which the interrupt puts one record
+         every @c decimate runs:
+         @code
+         controllers = (PIDController(0.1, 0, 0, 100, -100),
+                        PIDController(0.1, 0, 0, 100, -100))
+         loop = isr_control.ISRControlLoop((encoder1, encoder2), controllers,
+                                           motor_group, decimate = 25)
+         loop.setpoints[0] = 16384
+         loop.start(6, 1000)
+         @endcode
+         Each telemetry record holds the time of the run from
+         @c utime.ticks_us(), then the position and the actuation level of
+         each axis in turn. The interrupt also samples each encoder with
+         @c EncoderDriver.capture(), so the encoders' @c read_velocity() works
+         as in capture mode; the encoders must not also be in capture mode
+         or be updated by a task while the loop runs.
+
+@author Nishka Chawla
+@author Ronan Shaffer
+@date   18-Oct-2026
+@copyright (c) Released under GNU Public License
+"""
+
+import array
+import pyb
+import utime
+
+import cotask
+import task_share
+
+
+class ISRControlLoop:
+    """!
+    This class runs the position control of several axes from a hardware
+    timer interrupt.
+    """
+
+    def __init__(self, encoders, controllers, motors, decimate=1,
+                 queue_records=32, jitter_bin_us=2):
+        """!
+        Creates a control loop, which is started by @c start().
+        @param encoders         The encoder drivers, one per axis.
+        @param controllers      The @c PIDController objects, one per axis.
+        @param motors           A @c MotorGroup in @c SOFTWARE mode, whose
+                                motors are all changed together, or the motor
+                                drivers, one per axis. A group in @c UPDATE
+                                mode would set a timer callback on every run.
+        @param decimate         The number of runs per telemetry record.
+        @param queue_records    The least number of records the telemetry
+                                queue must hold.
+        @param jitter_bin_us    The width of the jitter histogram's bins in
+                                microseconds.
+        """
+        ## The number of axes.
+        self.num_axes = len(encoders)
+
+        ## The encoder drivers.
+        self.encoders = tuple(encoders)
+
+        ## The controllers.
+        self.controllers = tuple(controllers)
+
+        ## The motor drivers, or a @c MotorGroup.
+        self.motors = motors
+
+        ## The setpoints in ticks, written by tasks and read by the loop.
+        self.setpoints = array.array('l', [0] * self.num_axes)
+
+        ## The number of runs per telemetry record.
+        self.decimate = decimate
+
+        ## The number of values in one telemetry record.
+        self.record_size = 1 + 2 * self.num_axes
+
+        ## The number of values the telemetry queue can hold, which must be
+        #  a power of two.
+        self._queue_size = 1
+        while self._queue_size < queue_records * self.record_size:
+            self._queue_size <<= 1
+
+        ## Telemetry records passed from the interrupt to a task.
+        self.telemetry = task_share.SPSCQueue('l', self._queue_size,
+                                              name='ISR_Telemetry')
+
+        ## How far the time between runs strayed from the period, in
+        #  microseconds.
+        self.jitter = cotask.Histogram(jitter_bin_us)
+
+        ## The number of times the loop has run.
+        self.runs = 0
+
+        ## The longest time the loop has taken, in microseconds.
+        self.max_run_us = 0
+
+        ## The number of telemetry records dropped because the queue was full.
+        self.dropped = 0
+
+        ## The timer which runs the loop, or @c None when stopped.
+        self.tim = None
+
+        ## Microseconds between runs.
+        self._period_us = 0
+
+        ## The time of the previous run, or @c None before the first.
+        self._last = None
+
+        ## Runs left until the next telemetry record.
+        self._countdown = 0
+
+        ## @c True if @c motors is a @c MotorGroup.
+        self._group = hasattr(motors, 'commit')
+
+        ## The callback, bound once so the ISR doesn't allocate it.
+        self._run_cb = self._run
+
+    def start(self, tim_num, freq):
+        """!
+        This method starts running the loop from a timer. The timer must not
+        be one which is used for anything else.
+        @param tim_num  The number of the timer.
+        @param freq     The loop rate in Hz.
+        """
+        self.stop()
+        self._period_us = 1000000 // freq
+        for controller in self.controllers:
+            controller.set_period(1 / freq)
+            controller.reset()
+        for encoder in self.encoders:
+            encoder.capture()
+        self._last = None
+        self._countdown = 0
+        self.runs = 0
+        self.max_run_us = 0
+        self.jitter.reset()
+        self.tim = pyb.Timer(tim_num, freq=freq, callback=self._run_cb)
+
+    def stop(self):
+        """!
+        This method stops the loop and turns the motors off.
+        """
+        if self.tim is not None:
+            self.tim.callback(None)
+            self.tim = None
+            if self._group:
+                self.motors.set_duty_cycles(array.array('l',
+                                                        [0] * self.num_axes))
+            else:
+                for motor in self.motors:
+                    motor.set_duty_cycle(0)
+
+    def _run(self, tim):
+        """!
+        This method runs the loop once. It is the timer interrupt callback,
+        and it doesn't allocate memory.
+        @param tim      The timer which caused the interrupt; unused.
+        """
+        start = utime.ticks_us()
+        if self._last is not None:
+            late = utime.ticks_diff(start, self._last) - self._period_us
+            self.jitter.add(late if late > 0 else -late)
+        self._last = start
+
+        setpoints = self.setpoints
+        for axis in range(self.num_axes):
+            encoder = self.encoders[axis]
+            encoder.capture()
+            act = self.controllers[axis].run_fixed(setpoints[axis],
+                                                   encoder.read())
+            if self._group:
+                self.motors.stage(axis, act)
+            else:
+                self.motors[axis].set_duty_cycle(act)
+        if self._group:
+            self.motors.commit()
+
+        self._countdown -= 1
+        if self._countdown <= 0:
+            self._countdown = self.decimate
+            self._put_record(start)
+
+        self.runs += 1
+        took = utime.ticks_diff(utime.ticks_us(), start)
+        if took > self.max_run_us:
+            self.max_run_us = took
+
+    def _put_record(self, stamp):
+        """!
+        This method puts one telemetry record into the queue, or drops the
+        whole record if there isn't room for it. A task can't run between
+        the puts, so it only ever sees whole records.
+        @param stamp    The time of the run.
+        """
+        queue = self.telemetry
+        if self._queue_size - queue.num_in() < self.record_size:
+            self.dropped += 1
+            return
+        queue.put(stamp, in_ISR=True)
+        for axis in range(self.num_axes):
+            queue.put(self.encoders[axis].read(), in_ISR=True)
+            queue.put(self.controllers[axis].act, in_ISR=True)
+
+    def get_record(self, buf):
+        """!
+        This method takes the oldest telemetry record out of the queue. It
+        is called by the one task which reads telemetry.
+        @param buf      An array of at least @c record_size items into which
+                        the record is copied.
+        @returns        @c True if a record was copied, @c False if none was
+                        waiting.
+        """
+        queue = self.telemetry
+        if queue.num_in() < self.record_size:
+            return False
+        for index in range(self.record_size):
+            buf[index] = queue.get()
+        return True
+
+    def __repr__(self):
+        """!
+        This method shows how often the loop has run and how punctual it was.
+        """
+        return ('ISRControlLoop[{:d}] {:d} runs at {:d} us, jitter P50 {:d} '
+                'P99 {:d} max {:d} us, longest run {:d} us, {:d} records '
+                'dropped').format(
+                    self.num_axes, self.runs, self._period_us,
+                    self.jitter.percentile(50), self.jitter.percentile(99),
+                    self.jitter.max, self.max_run_us, self.dropped)
@@ -3,6 +3,7 @@
 This file contains code to plot step response of a ME405 motor.
 
 @details This file uses the serial module to communicate with the Nucleo to read encoder data to plot the step response.
+         The data arrives as binary telemetry frames, which are decoded by the telemetry module.
 
 @author Nishka Chawla
 @author Ronan Shaffer
@@ -13,10 +14,14 @@ This file contains code to plot step response of a ME405 motor.
 import serial
 from matplotlib import pyplot
 import time
+import telemetry
+import runfile
 ## Stores time values of step response
 time_list = []
 ## Stores position values of encoder during step response
 pos_list = []
+## Stores duty cycle values of the motor during step response
+duty_list = []
 
 # Open serial port for communication between PC and Nucleo
 with serial.Serial('COM11', 115200) as s_port:
@@ -27,47 +32,50 @@ with serial.Serial('COM11', 115200) as s_port:
     s_port.write(b'\x03') #ctrl-C
     s_port.write(b'\x04') #runs main -- ctrl-D
     time.sleep(0.5)
-    ## Proportional gain value
-    Kp = 0.4
-    s_port.write(b'0.1\r')
-    s_port.write(b'0.1\r')
+    ## Proportional gain value, sent to both motors' controllers
+    Kp = 0.1
+    ## Period of the motors task in main.py, in milliseconds
+    period = 40
+    s_port.write('{:g}\r'.format(Kp).encode())
+    s_port.write('{:g}\r'.format(Kp).encode())
+    ## Decoder which finds binary telemetry frames in the serial data
+    decoder = telemetry.FrameDecoder()
+    ## Timestamp of the first frame from motor 1, in microseconds
+    start = None
     ## Runs counter controls number of iterations of data reading
     runs = 0
     
     while runs <= 151:
-        ## Stores single line of data read from serial port
-        raw_data = s_port.readline()
+        ## Stores a block of bytes read from the serial port
+        raw_data = s_port.read(max(s_port.in_waiting, telemetry.FRAME_SIZE))
         
-        ## Converts data type and removes non-number characters
-        # print(raw_data)
-        data = str(raw_data)
-        data = data[2:-7]
-        # data = data[:-7]
-        ## Splits string of data into separate time and position values
-        l = data.split(',')
-        if len(l) == 2:
-            print(l)
-            try:
-                ## Convert time value to float
-                time = float(l[0])
-                ## Convert position value to float
-                pos = float(l[1])
-                
-            except:
-                pass
-            
-            else:
-                # Add current time and position values to list for ploting
-                if time < 2000:
-                    time_list.append(time)
-                    pos_list.append(pos)
+        for frame in decoder.feed(raw_data):
+            # Only motor 1's step response is plotted
+            if frame.task_id != 1:
+                continue
+            if start is None:
+                start = frame.timestamp
+            ## Time since the first frame in milliseconds
+            time = (frame.timestamp - start) / 1000
+            print(time, frame.position)
+            # Add current time and position values to list for ploting
+            if time < 2000:
+                time_list.append(time)
+                pos_list.append(frame.position)
+                duty_list.append(frame.duty)
             runs += 1
             
     print(len(time_list))
+    # Save the run so it can be compared with other runs later
+    with runfile.RunWriter('step_response.run') as writer:
+        writer.add_axis(1, period = period, Kp = Kp, sat_max = 100,
+                        sat_min = -100)
+        writer.append(1, time = [int(t * 1000) for t in time_list],
+                      position = pos_list, duty = duty_list, setpoint = 16384)
     pyplot.plot(time_list, pos_list, color = 'b')
     pyplot.xlabel('Time [ms]')
     pyplot.ylabel('Position [ticks]')
-    pyplot.title('Step Response: Kp = 0.1, Period = 40 ms')
+    pyplot.title('Step Response: Kp = {:g}, Period = {:d} ms'.format(Kp, period))
     pyplot.show()
 
 
@@ -2,8 +2,10 @@
 @file main.py
 This file contains a program that uses a task scheduler to run motors and encoders with a proportional controller.
 
-@details The main script calls the MotorDriver class, EncoderDriver class, and ClosedLoop controller class,
-imported as modules, to operate the motor and encoders.
+@details The main script calls the MotorDriver class, EncoderDriver class, and MultiAxisController class,
+imported as modules, to operate the motor and encoders. One task runs the controller for both motors.
+If CONTROL_ISR_FREQ is set, the controllers instead run in a timer interrupt from isr_control, and
+the task only passes setpoints to them and sends their telemetry.
 
 @author Nishka Chawla
 @author Ronan Shaffer
@@ -11,8 +13,8 @@ imported as modules, to operate the motor and encoders.
 @copyright (c) Released under GNU Public License
 """
 
-import gc
 import pyb
+import micropython
 import cotask
 import task_share
 import print_task
@@ -20,8 +22,20 @@ import utime
 import motor_chawla_shaffer
 import encoder_chawla_shaffer
 import closedloopcontrol
+import telemetry
+import isr_control
+import alloc_audit
 import array as array
 
+## Rate in Hz of the control loop run from a timer interrupt, or None to run
+#  the control loop in the motors task.
+CONTROL_ISR_FREQ = None
+
+## If True, the memory allocated by the shares, queues, tasks and control
+#  interrupt is measured, and the program fails at the end if a hot path
+#  allocated.
+AUDIT_ALLOC = False
+
 ## Input pin configuration
 inn = pyb.Pin.IN
 
@@ -91,65 +105,89 @@ encoder2 = encoder_chawla_shaffer.EncoderDriver(pinB6, pinB7, 4)
 encoder1.zero()
 # Zeroing encoder 2.
 encoder2.zero()
+
+# Memory for error messages from the encoder capture interrupts
+micropython.alloc_emergency_exception_buf(100)
+if CONTROL_ISR_FREQ is None:
+    # Sample encoder 1 at 1 kHz from Timer 6 for velocity estimates.
+    encoder1.start_capture(6, 1000)
+    # Sample encoder 2 at 1 kHz from Timer 7 for velocity estimates.
+    encoder2.start_capture(7, 1000)
 # Clears encoder 2 queue.
 enc2reading.clear()
 
-## Instantiation of controller 1 object.
-controller1 = closedloopcontrol.ClosedLoop(motor1setpoint.put(int(16384)), kp1.get(), int(100), int(-100))
-## Instantiation of controller 2 object.
-controller2 = closedloopcontrol.ClosedLoop(motor2setpoint.put(int(16384)), kp2.get(), int(100), int(-100))
+# Set the position setpoints of both motors.
+motor1setpoint.put(int(16384))
+motor2setpoint.put(int(16384))
+
+## Instantiation of the controller for both motors; axis 0 is Motor 1 and
+#  axis 1 is Motor 2.
+controller = closedloopcontrol.MultiAxisController(2, kp1.get(), 0.0, int(100), int(-100))
+
+## Encoders of the axes, in axis order.
+encoders = (encoder1, encoder2)
+## Motors of the axes, in axis order, whose duty cycles are all changed
+#  together at a PWM timer update, or straight away when the control loop
+#  already runs in a timer interrupt.
+motors = motor_chawla_shaffer.MotorGroup((motor1, motor2),
+    motor_chawla_shaffer.MotorGroup.UPDATE if CONTROL_ISR_FREQ is None
+    else motor_chawla_shaffer.MotorGroup.SOFTWARE)
+## Setpoint shares of the axes, in axis order.
+setpoints = (motor1setpoint, motor2setpoint)
 
-def motor1_func ():
+## Control loop run from Timer 6 when CONTROL_ISR_FREQ is set, with one
+#  fixed-point controller per axis and a telemetry record every 40 ms.
+isr_loop = None
+if CONTROL_ISR_FREQ is not None:
+    isr_loop = isr_control.ISRControlLoop(
+        encoders, (closedloopcontrol.PIDController(0.0, 0.0, 0.0, 100, -100),
+                   closedloopcontrol.PIDController(0.0, 0.0, 0.0, 100, -100)),
+        motors, decimate = CONTROL_ISR_FREQ * 40 // 1000)
+
+## Telemetry frame writer for Motor 1.
+telemetry1 = telemetry.TelemetryWriter(1)
+## Telemetry frame writer for Motor 2.
+telemetry2 = telemetry.TelemetryWriter(2)
+## Telemetry frame writers of the axes, in axis order.
+writers = (telemetry1, telemetry2)
+
+def motors_func ():
     """!
-    Task which runs Motor 1, Encoder 1, and Controller 1.
+    Task which runs both motors, encoders and the controller in one pass,
+    and sends a telemetry frame for each motor on each run.
     """
-    ## Variable used to record time.
-    diff = 0
-    ## Start time variable.
-    start_time = utime.ticks_ms()
     while True:
-        ## Next time variable.
-        next_time = utime.ticks_ms()
-        diff = utime.ticks_diff(next_time, start_time)
-        encoder1.update()
-        # Sets motor duty cycle to actuation level
-        motor1.set_duty_cycle(controller1.run(motor1setpoint.get(),encoder1.read()))
-        print_task.put(str(diff)+','+str(encoder1.read())+'\r\n')
+        ## Time of this run.
+        next_time = utime.ticks_us()
+        for axis in range(2):
+            controller.set_setpoint(axis, setpoints[axis].get())
+        # Sets motor duty cycles to the actuation levels, in integers only
+        controller.step(encoders, motors, fixed=True)
+        for axis in range(2):
+            print_task.put_bytes(writers[axis].pack(next_time,
+                controller.msr[axis], encoders[axis].read_velocity_int(),
+                controller.act[axis]))
 
         yield (0)
-        
-def motor2_func ():
+
+def isr_telemetry_func ():
     """!
-    Task which runs Motor 2, Encoder 2, and Controller 2.
+    Task which passes setpoints to the interrupt-driven control loop and
+    sends a telemetry frame for each motor from each record the loop makes.
     """
-    # Variable used to record time.
-    diff = 0
-    ## Start time variable.
-    start_time = utime.ticks_ms()
+    record = array.array('l', [0] * isr_loop.record_size)
     while True:
-        ## Next time variable.
-        next_time = utime.ticks_ms()
-        diff = utime.ticks_diff(next_time, start_time)
-        encoder2.update()
-        # Sets motor duty cycle to actuation level
-        motor2.set_duty_cycle(controller2.run(motor2setpoint.get(),encoder2.read()))
-        print_task.put(str(diff)+','+str(encoder2.read())+'\r\n')
-        
-        yield (0)
-        
-def print_func ():
-    """!
-    Task which prints a queue of Motor 1 encoder readings.
-    """  
-    ## Runs counter
-    runs = 0
-    while True:
-        print_task.run()
-        runs += 1
+        for axis in range(2):
+            isr_loop.setpoints[axis] = setpoints[axis].get()
+        while isr_loop.get_record(record):
+            for axis in range(2):
+                print_task.put_bytes(writers[axis].pack(record[0],
+                    record[1 + 2 * axis], encoders[axis].read_velocity_int(),
+                    record[2 + 2 * axis]))
 
         yield (0)
-
-# This code creates a share, a queue, and two tasks, then starts the tasks. The
+        
+# This code creates the motors task, then starts the tasks. The
 # tasks run until somebody presses ENTER, at which time the scheduler stops and
 # printouts show diagnostic information about the tasks, share, and queue.
 if __name__ == "__main__":
@@ -160,49 +198,97 @@ if __name__ == "__main__":
     # allocated for state transition tracing, and the application will run out
     # of memory after a while and quit. Therefore, use tracing only for 
     # debugging and set trace to False when it's not needed
-    ## Motor 1 Task
-    motor1_task = cotask.Task (motor1_func, name = 'motor1_task', priority = 2, 
-                         period = 40, profile = True, trace = False)
-    ## Motor 2 Task
-    motor2_task = cotask.Task (motor2_func, name = 'motor2_task', priority = 2, 
-                         period = 40, profile = True, trace = False)
-    ## Print Task
-    read_task = cotask.Task (print_func, name = 'read_task', priority = 3, 
-                         period = 20, profile = True, trace = False)
+    ## Motors Task
+    # If the motors task falls behind, it skips the missed periods rather
+    # than running several times in a row with stale encoder readings
+    # In interrupt mode, the task only handles setpoints and telemetry
+    motors_task = cotask.Task (motors_func if isr_loop is None
+                               else isr_telemetry_func,
+                         name = 'motors_task', priority = 2, 
+                         period = 40, profile = True, trace = False,
+                         histogram = True, overrun = cotask.SKIP)
+    # The print task, created by print_task, is subscribed to its queue, so
+    # it runs whenever the motors task sends telemetry; its slow period only
+    # retries bytes which a busy port didn't take
     
     ## Input for Kp 1
     KP1 = input('Please enter a Kp 1: ')
-    controller1.set_Kp(float(KP1))
+    controller.set_Kp(0, float(KP1))
+    if isr_loop is not None:
+        isr_loop.controllers[0].set_Kp(float(KP1))
     kp1.put(float(KP1))
     
     ## Input for Kp 2
     KP2 = input('Please enter a Kp 2: ')
-    controller2.set_Kp(float(KP2))
+    controller.set_Kp(1, float(KP2))
+    if isr_loop is not None:
+        isr_loop.controllers[1].set_Kp(float(KP2))
     kp2.put(float(KP2))
     
-    cotask.task_list.append(motor1_task)
-    cotask.task_list.append(motor2_task)
-    cotask.task_list.append(read_task)
+    cotask.task_list.append(motors_task)
+    
+    ## Allocation audit, made if AUDIT_ALLOC is set
+    audit = None
+    if AUDIT_ALLOC:
+        audit = alloc_audit.AllocAudit ()
+        alloc_audit.audit_shares (audit)
+        if isr_loop is not None:
+            # The controllers' fixed-point gains depend on the period, which
+            # start() sets again later
+            for isr_controller in isr_loop.controllers:
+                isr_controller.set_period (1 / CONTROL_ISR_FREQ)
+            # On the PC, the loops over the axes make ranges, the clock reads
+            # and the positions and fixed-point terms make boxed integers
+            audit.measure ('ISRControlLoop._run', isr_loop._run, None,
+                           host_allow = audit.loop_bytes + audit.ticks_bytes
+                           + audit.int_bytes)
+        # On the PC, the loops over the axes make ranges, and the clock
+        # reads, positions and fixed-point terms make boxed integers
+        audit.meter_task (motors_task,
+                          host_allow = audit.loop_bytes + audit.ticks_bytes
+                          + 5 * audit.int_bytes)
+        # On the PC, the print task's copy loop makes a range, and the clock
+        # read and the byte counts make boxed integers
+        audit.meter_task (print_task.print_task,
+                          host_allow = audit.loop_bytes + audit.ticks_bytes
+                          + audit.int_bytes)
     
     ## Start time variable
     start_time = utime.ticks_ms()
 
     # Run the memory garbage collector to ensure memory is as defragmented as
-    # possible before the real-time scheduler is started
-    gc.collect ()
+    # possible before the real-time scheduler is started. From then on the
+    # scheduler collects garbage in idle time, between tasks
+    cotask.task_list.manage_gc ()
 
     ## Run the scheduler with the chosen scheduling algorithm. Quit if any 
     # character is received through the serial port
     vcp = pyb.USB_VCP ()
     vcp.read ()
+    if isr_loop is not None:
+        isr_loop.start (6, CONTROL_ISR_FREQ)
     while not vcp.any ():
         cotask.task_list.pri_sched ()
+        cotask.task_list.idle (vcp)
 
     # Empty the comm port buffer of the character(s) just pressed
     vcp.read ()
+    if isr_loop is not None:
+        isr_loop.stop ()
 
     # Print a table of task data and a table of shared information data
     print ('\n' + str (cotask.task_list))
+    print (cotask.task_list.hist_report ())
+    print (cotask.task_list.sched_report ())
+    print ('Idle {:.1f}% of the time'.format (cotask.task_list.idle_us / 10
+        / utime.ticks_diff (utime.ticks_ms (), start_time)))
+    print (motors)
+    if isr_loop is not None:
+        print (isr_loop)
     print (task_share.show_all ())
+    print (print_task.show_stats ())
     # print (task1.get_trace ())
-    print ('\r\n')
\ No newline at end of file
+    print ('\r\n')
+    if audit is not None:
+        print (audit.report ())
+        audit.check ()
\ No newline at end of file
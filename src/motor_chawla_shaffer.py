@@ -4,6 +4,7 @@ This file contains code used to configure the L6206 motor.
 
 @details Objects of this class can be used to configure the DRV8847
          motor driver to set the motor duty cycle and perform motor control.
+         A @c MotorGroup changes the duty cycles of several motors together.
     
 @author Nishka Chawla
 @author Ronan Shaffer
@@ -13,6 +14,7 @@ This file contains code used to configure the L6206 motor.
 
 import pyb
 import time
+import utime
 
 class MotorDriver:
     """!
@@ -49,44 +51,250 @@ class MotorDriver:
         ## Instantiation of channel A of the motor. 
         self.channel_A = self.tim.channel(1, pyb.Timer.PWM, pin=self.in1pin)
         
-        ## Instantiation of channel A of the motor. 
+        ## Instantiation of channel B of the motor. 
         self.channel_B = self.tim.channel(2, pyb.Timer.PWM, pin=self.in2pin)
         
+        ## Compare values for duty cycles of 0 to 100 percent, worked out
+        #  once so that setting the duty cycle needs no arithmetic.
+        self._compare = [0] * 101
+        period = self.tim.period() + 1
+        for percent in range(101):
+            self._compare[percent] = period * percent // 100
+        
+        ## The duty cycle of the voltage sent to the motor. 
+        self.level = 0
+        
+        ## Compare value last written to channel A.
+        self._cmp_A = 0
+        
+        ## Compare value last written to channel B.
+        self._cmp_B = 0
+        
+        ## Compare value for channel A worked out by stage().
+        self._next_A = 0
+        
+        ## Compare value for channel B worked out by stage().
+        self._next_B = 0
+        
+        self.channel_A.pulse_width(0)
+        self.channel_B.pulse_width(0)
         
     def set_duty_cycle (self, level):
         """!
         This method sets the duty cycle to be sent to the motor to the given 
         level. Positive values cause torque in one direction, negative values
-        in the opposite direction.
+        in the opposite direction. Levels beyond 100 percent either way are
+        limited to 100 percent, and fractions of a percent are dropped. A
+        channel is only written when its compare value changes, so setting
+        the same level again costs very little.
         @param level    A signed integer holding the duty cycle of the voltage 
                         sent to the motor. 
-        '"""
-        ## The duty cycle of the voltage sent to the motor. 
+        """
+        self.stage(level)
+        self.apply()
+        
+    def stage (self, level):
+        """!
+        This method works out the compare values for a new duty cycle without
+        writing them to the timer; @c apply() writes them. A @c MotorGroup
+        uses this to change several motors together.
+        @param level    A signed integer holding the duty cycle of the voltage 
+                        sent to the motor. 
+        """
+        if level > 100:
+            level = 100
+        elif level < -100:
+            level = -100
         self.level = level
         
-        if self.level > 0:
-            
-            if self.level > 100:
-                
-                self.channel_A.pulse_width_percent(100)
-                self.channel_B.pulse_width_percent(0)
-            
-            self.channel_A.pulse_width_percent(self.level)
-            self.channel_B.pulse_width_percent(0)
-            
-        if self.level < 0:
-            
-            if self.level < -100:
-                
-                self.channel_A.pulse_width_percent(0)
-                self.channel_B.pulse_width_percent(100)
-            
-            self.channel_A.pulse_width_percent(0)
-            self.channel_B.pulse_width_percent(-self.level)
-            
-        if self.level == 0:
-            
-            self.channel_A.pulse_width_percent(0)
-            self.channel_B.pulse_width_percent(0)
-        
-#         print ('Setting duty cycle to ' + str (self.level))
+        if level >= 0:
+            self._next_A = self._compare[int(level)]
+            self._next_B = 0
+        else:
+            self._next_A = 0
+            self._next_B = self._compare[int(-level)]
+        
+    def apply (self):
+        """!
+        This method writes the compare values worked out by @c stage() to the
+        channels whose values have changed. It doesn't allocate memory, so it
+        may be called from an interrupt.
+        """
+        cmp_A = self._next_A
+        cmp_B = self._next_B
+        
+        # The channel being turned down is written first, so that both
+        # channels are never driven at once while the motor reverses
+        if cmp_B < self._cmp_B:
+            self.channel_B.pulse_width(cmp_B)
+            self._cmp_B = cmp_B
+        if cmp_A != self._cmp_A:
+            self.channel_A.pulse_width(cmp_A)
+            self._cmp_A = cmp_A
+        if cmp_B != self._cmp_B:
+            self.channel_B.pulse_width(cmp_B)
+            self._cmp_B = cmp_B
+
+
+class MotorGroup:
+    """!
+    This class changes the duty cycles of several motors together. New levels
+    are staged for every motor and then committed at once, so coordinated
+    axes see their new duty cycles at the same time rather than whenever the
+    scheduler happened to reach each motor:
+    @code
+    group = MotorGroup ((motor1, motor2), MotorGroup.UPDATE)
+    group.stage (0, level1)
+    group.stage (1, level2)
+    group.commit ()
+    @endcode
+    The motors' PWM timers are started in step, and since the timers load
+    new compare values at the end of each PWM period, motors written together
+    change on the same edge. In @c SOFTWARE mode, @c commit() writes every
+    motor straight away with interrupts disabled. In @c UPDATE mode, the
+    writes are made at the next update interrupt of the first motor's timer,
+    at the start of a PWM period, so all of them are done well before the
+    edge at which they take effect. The time between the first and last
+    write of each commit, and the time from @c commit() until the writes,
+    are measured so that the latency between axes can be checked.
+    """
+    
+    ## Commit mode which writes the motors from @c commit() itself.
+    SOFTWARE = 0
+    
+    ## Commit mode which writes the motors at the next timer update.
+    UPDATE = 1
+    
+    def __init__ (self, motors, mode = SOFTWARE):
+        """!
+        Creates a group of motors and lines up their PWM timers.
+        @param motors   The motor drivers in the group, in axis order.
+        @param mode     @c SOFTWARE or @c UPDATE, the way commits are made.
+        """
+        ## The motor drivers in the group.
+        self.motors = tuple(motors)
+        
+        ## The way commits are made, @c SOFTWARE or @c UPDATE.
+        self.mode = mode
+        
+        ## The number of commits whose writes have been made.
+        self.commits = 0
+        
+        ## Microseconds between the first and last write of the last commit.
+        self.skew_us = 0
+        
+        ## The largest skew of any commit.
+        self.max_skew_us = 0
+        
+        ## Microseconds from the last commit() until its writes began.
+        self.delay_us = 0
+        
+        ## The largest delay of any commit.
+        self.max_delay_us = 0
+        
+        ## True while a commit is waiting for the timer update.
+        self._pending = False
+        
+        ## The time at which commit() was last called.
+        self._commit_time = 0
+        
+        ## The timer whose update interrupt makes commits in @c UPDATE mode.
+        self._sync_tim = self.motors[0].tim
+        
+        ## The update callback, bound once so the ISR doesn't allocate it.
+        self._apply_cb = self._apply
+        
+        self.align()
+        
+    def align (self):
+        """!
+        This method restarts the motors' PWM timers together, so that their
+        periods begin at the same moment. Timers running at the same rate
+        then stay in step.
+        """
+        irq_state = pyb.disable_irq()
+        for motor in self.motors:
+            motor.tim.counter(0)
+        pyb.enable_irq(irq_state)
+        
+    def stage (self, index, level):
+        """!
+        This method sets the duty cycle which one motor will get at the next
+        commit. While a commit is waiting for the timer update, the motor's
+        two compare values are staged with interrupts disabled, so the update
+        can't write one new value and one old one and drive both half-bridges.
+        @param index    The motor's position in the group, starting at 0.
+        @param level    The duty cycle as for @c MotorDriver.set_duty_cycle().
+        """
+        if self._pending:
+            irq_state = pyb.disable_irq()
+            self.motors[index].stage(level)
+            pyb.enable_irq(irq_state)
+        else:
+            self.motors[index].stage(level)
+        
+    def set_duty_cycles (self, levels):
+        """!
+        This method stages a duty cycle for every motor and commits them.
+        While a commit is waiting for the timer update, every motor is staged
+        with interrupts disabled, so the update writes all old levels or all
+        new ones.
+        @param levels   The duty cycles, in the order of the motors.
+        """
+        motors = self.motors
+        pending = self._pending
+        if pending:
+            irq_state = pyb.disable_irq()
+        for index in range(len(motors)):
+            motors[index].stage(levels[index])
+        if pending:
+            pyb.enable_irq(irq_state)
+        self.commit()
+        
+    def commit (self):
+        """!
+        This method makes the staged duty cycles take effect together. In
+        @c UPDATE mode it returns at once and the motors are written at the
+        next timer update; staging again before then changes what is written,
+        each motor's new level being staged whole.
+        """
+        self._commit_time = utime.ticks_us()
+        if self.mode == MotorGroup.UPDATE:
+            if not self._pending:
+                self._pending = True
+                self._sync_tim.callback(self._apply_cb)
+        else:
+            irq_state = pyb.disable_irq()
+            self._apply()
+            pyb.enable_irq(irq_state)
+        
+    def _apply (self, tim = None):
+        """!
+        This method writes every motor's staged compare values and measures
+        the skew and delay. It is the update callback in @c UPDATE mode.
+        @param tim      The timer which caused the interrupt, or @c None.
+        """
+        start = utime.ticks_us()
+        for motor in self.motors:
+            motor.apply()
+        end = utime.ticks_us()
+        if tim is not None:
+            tim.callback(None)
+        self._pending = False
+        
+        self.skew_us = utime.ticks_diff(end, start)
+        if self.skew_us > self.max_skew_us:
+            self.max_skew_us = self.skew_us
+        self.delay_us = utime.ticks_diff(start, self._commit_time)
+        if self.delay_us > self.max_delay_us:
+            self.max_delay_us = self.delay_us
+        self.commits += 1
+        
+    def __repr__ (self):
+        """!
+        This method shows the number of commits and the latencies measured.
+        """
+        return ('MotorGroup[{:d}] {:d} commits, skew {:d} us (max {:d}), '
+                'delay {:d} us (max {:d})').format(
+                    len(self.motors), self.commits, self.skew_us,
+                    self.max_skew_us, self.delay_us, self.max_delay_us)
@@ -22,10 +22,24 @@
 #    shares.print_task.put_bytes (bytearray ('A bytearray'))
 #    @endcode
 #
+#  When @c DRAIN is @c True, the task instead sends a chunk of up to
+#  @c BYTE_BUDGET bytes each time it runs, copying them from the queue into
+#  a buffer made at startup and writing that buffer to the port in one call.
+#  It stops early once it has used @c TIME_BUDGET_US microseconds, so that
+#  a burst of printing can't hold off the control tasks for long. If the
+#  port takes only part of a chunk, the rest is kept and sent first the next
+#  time the task runs, so no bytes are lost or sent out of order. If the port
+#  takes nothing at all, the task doesn't ask to run again straight away but
+#  waits for new bytes to be put into the queue or for its next run every
+#  @c RETRY_MS milliseconds, so a busy port can't keep the scheduler spinning.
+#  The number of bytes sent and the rate at which they went out are shown by
+#  @c show_stats(). 
+#
 #  @copyright This program is copyrighted by JR Ridgely and released under the
 #  GNU Public License, version 3.0. 
 
 import pyb
+import utime
 import cotask
 import task_share
 
@@ -40,6 +54,25 @@ THREAD_PROTECT = True
 ## A flag which controls if the printing task is to be profiled
 PROFILE = True
 
+## A flag which selects the drain mode, in which each run of the print task
+#  writes a chunk of bytes rather than a single character
+DRAIN = True
+
+## The size of the buffer through which chunks of bytes are written
+CHUNK_SIZE = const (64)
+
+## The most bytes which the print task writes each time it runs
+BYTE_BUDGET = const (256)
+
+## The most time in microseconds which the print task spends writing each
+#  time it runs; it finishes the chunk which it is writing when time runs out
+TIME_BUDGET_US = const (500)
+
+## The time in milliseconds between runs of the print task when nothing wakes
+#  it, after which it tries again to send bytes which the port didn't take.
+#  It is long because each timed run cuts short the scheduler's idle sleep
+RETRY_MS = const (100)
+
 
 #@micropython.native
 def put (a_string):
@@ -48,50 +81,46 @@ def put (a_string):
     printing task whenever that task gets a chance. If the print queue is
     full, characters are lost; this is better than blocking to wait for
     space in the queue, as we'd block the printing task and space would
-    never open up. When a character has been put into the queue, the @c go()
-    method of the print task is called so that the run method will be called
-    as soon as the print task is run by the task scheduler. 
+    never open up. The whole string is put into the queue at once. The
+    print task subscribes to the queue, so putting characters into it
+    makes the task ready to run as soon as the task scheduler gets to it. 
     @param a_string A string to be put into the queue 
+    @return The number of characters which were put into the queue
     """
 
-    for a_ch in a_string:
-        if not print_queue.full ():
-            print_queue.put (ord (a_ch))
-            print_task.go ()
+    return print_queue.put_many (a_string.encode ())
 
 
 #@micropython.native
 def put_bytes (b_arr):
     """! 
-    Put bytes from a @c bytearray or @c bytes into the print queue. When 
-    characters have been put into the queue, the @c go() method of the print
-    task is called so that the run method will be called as soon as the print 
-    task is run by the task scheduler. 
+    Put bytes from a @c bytearray or @c bytes into the print queue, which
+    makes the print task ready to run. 
     @param b_arr The bytearray whose contents go into the queue 
+    @return The number of bytes which were put into the queue
     """
 
-    for byte in b_arr:
-        if not print_queue.full ():
-            print_queue.put (byte)
-            print_task.go ()
+    return print_queue.put_many (b_arr)
 
 
 def run ():
     """!
     Run function for the task which prints stuff. This function checks for
     any characters to be printed in the queue; if any characters are found 
-    then one character is printed, after which the print task yields so other 
-    tasks can run. This function must be called periodically; the normal way 
-    is to make it the run function of a low priority task in a cooperatively 
-    multitasked system so that the task scheduler calls this function when 
-    the higher priority tasks don't need to run. 
+    then one character is sent out the USB port as a raw byte, so binary
+    data such as telemetry frames gets through unchanged, after which the
+    print task yields so other tasks can run. This function must be called
+    periodically; the normal way is to make it the run function of a low
+    priority task in a cooperatively multitasked system so that the task
+    scheduler calls this function when the higher priority tasks don't need
+    to run. 
     """
 
     while True:
         # If there's a character in the queue, print it
         if print_queue.any ():
-            print (chr (print_queue.get ()), end = '')
-#             print("{:} ".format(chr(print_queue.get())))
+            _out_byte[0] = print_queue.get ()
+            _vcp.write (_out_byte)
 
 
         # If there's another character, tell this task to run again ASAP
@@ -101,6 +130,115 @@ def run ():
         yield (0)
 
 
+def drain ():
+    """!
+    Run function for the print task in drain mode. Each time it runs, this
+    function copies chunks of bytes from the queue into a buffer and writes
+    each chunk to the port with one call, until the queue is empty or the 
+    byte or time budget for this run has been used. If the port doesn't take
+    the whole chunk, the bytes it didn't take are moved to the front of the
+    buffer and written before anything else the next time. If bytes are
+    left, the task asks to be run again as soon as possible, unless the port
+    took none of them; then it waits for its next period or a new put, as
+    asking again straight away would only poll the busy port. Nothing is
+    allocated: the queue copies bytes into the chunk buffer one at a time,
+    and each chunk is written through one of the views made at startup. 
+    """
+    global bytes_sent, send_us, short_writes, _held
+
+    while True:
+        start = utime.ticks_us ()
+        budget = BYTE_BUDGET
+        stalled = False
+        while budget > 0:
+            got = _held
+            if got == 0:
+                got = print_queue.get_into (_chunk)
+                if got == 0:
+                    break
+            sent = _port.write (_chunk_views[got])
+            if sent == None:
+                sent = 0
+            budget -= sent
+            bytes_sent += sent
+            _held = got - sent
+            if _held > 0:
+                # The port is busy, so try the rest again next time
+                for idx in range (_held):
+                    _chunk[idx] = _chunk[sent + idx]
+                short_writes += 1
+                stalled = sent == 0
+                break
+            if utime.ticks_diff (utime.ticks_us (), start) >= TIME_BUDGET_US:
+                break
+
+        # Keep track of the time spent sending so the data rate can be found
+        if budget < BYTE_BUDGET:
+            send_us += utime.ticks_diff (utime.ticks_us (), start)
+
+        # If there's more to send, tell this task to run again ASAP, unless
+        # the port is taking nothing; then back off until the next period
+        if not stalled and (_held > 0 or print_queue.any ()):
+            print_task.go ()
+
+        yield (0)
+
+
+def set_port (port):
+    """!
+    Choose the port to which the print task writes, for example a
+    @c pyb.UART rather than the USB serial port which is used by default.
+    @param port An object with a @c write() method which accepts a buffer
+    """
+    global _port
+    _port = port
+
+
+def show_stats ():
+    """!
+    Create a string showing how much the print task has sent, how fast the
+    bytes went out while it was sending, and how full the queue has been.
+    @return A string holding the printing statistics
+    """
+    rate = bytes_sent * 1000000 / send_us if send_us > 0 else 0.0
+    return '{:<12s} {:d} bytes sent, {:.0f} bytes/s, {:d} short writes, ' \
+        'queue high water {:d}/{:d}'.format ('Printing', bytes_sent, rate,
+                                             short_writes,
+                                             print_queue._max_full, BUF_SIZE)
+
+
+## The USB serial port to which characters are written.
+_vcp = pyb.USB_VCP ()
+
+## The port to which chunks of bytes are written in drain mode.
+_port = _vcp
+
+## The buffer into which chunks of bytes are copied to be written.
+_chunk = bytearray (CHUNK_SIZE)
+
+## Views of the first 0 to @c CHUNK_SIZE bytes of the chunk buffer, made
+#  once so that writing a partly full chunk doesn't allocate memory.
+_chunk_views = [memoryview (_chunk)[0:size] for size in range (CHUNK_SIZE + 1)]
+
+## The number of bytes at the front of the chunk buffer which the port
+#  didn't take last time and which are to be written next.
+_held = 0
+
+## The number of bytes which have been written in drain mode.
+bytes_sent = 0
+
+## The total time in microseconds which the print task has spent sending.
+#  Each run's time is added separately, so the total doesn't wrap around as
+#  a difference of tick counts would.
+send_us = 0
+
+## The number of writes in which the port didn't take the whole chunk.
+short_writes = 0
+
+## A one-byte buffer through which each character is written, made once so
+#  that printing doesn't allocate memory.
+_out_byte = bytearray (1)
+
 ## This queue holds characters to be printed when the print task gets around
 #  to it.
 global print_queue
@@ -109,8 +247,12 @@ print_queue = task_share.Queue ('B', BUF_SIZE, name = "Print_Queue",
 
 ## This is the task which schedules printing. 
 global print_task
-print_task = cotask.Task (run, name = 'Printing', priority = 0, 
-                          profile = PROFILE)
+print_task = cotask.Task (drain if DRAIN else run, name = 'Printing', 
+                          priority = 0, period = RETRY_MS, profile = PROFILE,
+                          overrun = cotask.SKIP)
+
+# Putting anything into the queue makes the print task ready to run
+print_queue.subscribe (print_task)
 
 # This line tells the task scheduler to add this task to the system task list
 cotask.task_list.append (print_task)
@@ -0,0 +1,432 @@
+"""!
+@file runfile.py
+This file contains the PC-side file format in which recorded motor runs
+are saved, with a writer and a memory-mapped reader.
+
+@details A run file holds one run of one or more motor tasks. It starts
+         with a header which describes each task (its period, proportional
+         gain and saturation limits) and lists the columns recorded for it.
+         Each column is stored as one contiguous block of a single NumPy
+         type, aligned to @c ALIGN bytes:
+         | Offset        | Contents                                        |
+         |:--------------|:------------------------------------------------|
+         | 0             | File header, @c FILE_FORMAT                     |
+         | after that    | For each task, an @c AXIS_FORMAT descriptor followed by one @c COLUMN_FORMAT descriptor per column |
+         | @c data_start | Column blocks, each aligned to @c ALIGN bytes    |
+
+         The reader only parses the header when a file is opened; each
+         column is mapped into memory with @c np.memmap when it is first
+         used, so scanning the header of hundreds of long runs, or plotting
+         one column of each, never reads whole files:
+         @code
+         with runfile.RunWriter ('step.run') as writer:
+             writer.add_axis (1, period=40, Kp=0.1, sat_max=100, sat_min=-100)
+             writer.append (1, time=t, position=pos, duty=duty, setpoint=sp)
+
+         run = runfile.RunFile ('step.run')
+         pyplot.plot (run.column (1, 'time') / 1000, run.column (1, 'position'))
+         @endcode
+
+         Raw telemetry saved by @c stream_ingest.py can be converted with
+         @code
+         python runfile.py convert run1.bin run1.run --period 40 --kp 0.1 --kp 0.1
+         python runfile.py info run1.run
+         @endcode
+
+@author Nishka Chawla
+@author Ronan Shaffer
+@date   18-Oct-2026
+@copyright (c) Released under GNU Public License
+"""
+
+import argparse
+import struct
+
+import numpy as np
+
+## The bytes at the start of every run file.
+MAGIC = b'ME405RUN'
+
+## The version of the format written by @c RunWriter.
+VERSION = 1
+
+## The @c struct format of the file header: magic, version, number of tasks
+#  and the offset of the first column block.
+FILE_FORMAT = '<8sHHI'
+
+## The @c struct format of a task descriptor: task number, number of columns,
+#  period in milliseconds, proportional gain, saturation limits and number of
+#  samples.
+AXIS_FORMAT = '<BxHffiiQ'
+
+## The @c struct format of a column descriptor: name, NumPy type string and
+#  file offset of the column's block.
+COLUMN_FORMAT = '<12s4sQ'
+
+## The longest column name in bytes, as set by @c COLUMN_FORMAT.
+NAME_SIZE = 12
+
+## The alignment of each column block in bytes.
+ALIGN = 64
+
+## The standard columns and their types. Other columns may be written too.
+COLUMNS = (('time', '<i8'),                 # Microseconds since the run began
+           ('position', '<i4'),             # Encoder ticks
+           ('velocity', '<i4'),             # Encoder ticks per second
+           ('duty', 'i1'),                  # Motor duty cycle in percent
+           ('setpoint', '<i4'))             # Controller setpoint in ticks
+
+
+def _aligned(offset):
+    """!
+    This function rounds a file offset up to the next column block boundary.
+    @param offset   The offset in bytes.
+    @returns        The aligned offset.
+    """
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+class Axis:
+    """!
+    This class describes one task's part of a run: its settings, how many
+    samples were recorded and where each column is stored.
+    """
+
+    def __init__(self, task_id, period, Kp, sat_max, sat_min):
+        """!
+        Creates a task description with no samples.
+        @param task_id  The task number, as sent in its telemetry frames.
+        @param period   The task period in milliseconds.
+        @param Kp       The proportional gain.
+        @param sat_max  The upper saturation limit of the controller output.
+        @param sat_min  The lower saturation limit of the controller output.
+        """
+        ## The task number.
+        self.task_id = task_id
+
+        ## The task period in milliseconds.
+        self.period = period
+
+        ## The proportional gain.
+        self.Kp = Kp
+
+        ## The upper saturation limit of the controller output.
+        self.sat_max = sat_max
+
+        ## The lower saturation limit of the controller output.
+        self.sat_min = sat_min
+
+        ## The number of samples in each column.
+        self.num_samples = 0
+
+        ## The type and file offset of each column, by name.
+        self.columns = {}
+
+    def __repr__(self):
+        """!
+        This method shows the task's settings and columns.
+        @returns    A one-line string.
+        """
+        return 'Task {:d}: period {:g} ms, Kp {:g}, sat [{:d}, {:d}], ' \
+            '{:d} samples of {:s}'.format(self.task_id, self.period, self.Kp,
+                                          self.sat_min, self.sat_max,
+                                          self.num_samples,
+                                          ', '.join(self.columns))
+
+
+class RunWriter:
+    """!
+    This class writes a run file. Samples are appended in blocks as they
+    arrive and kept in memory until @c close(), when each task's columns
+    are written out as contiguous blocks.
+    """
+
+    def __init__(self, path):
+        """!
+        Creates a writer for a new run file.
+        @param path     The name of the file to be written.
+        """
+        ## The name of the file to be written.
+        self.path = path
+
+        ## The tasks in the run, in the order they were added.
+        self.axes = []
+
+        ## Blocks of samples appended to each column of each task.
+        self._blocks = {}
+
+    def __enter__(self):
+        """!
+        Lets the writer be used in a @c with statement.
+        @returns    The writer.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        """!
+        Writes the file at the end of a @c with statement. If the body of the
+        statement raised an exception, the samples are thrown away and no
+        file is written, so a run which was cut short can't be mistaken for
+        a whole one.
+        @param exc_type     The type of the exception raised, or @c None.
+        @param exc          The exception, or @c None.
+        @param traceback    The exception's traceback, or @c None.
+        """
+        if exc_type is None:
+            self.close()
+        else:
+            self._blocks = None
+
+    def add_axis(self, task_id, period, Kp, sat_max, sat_min):
+        """!
+        This method adds a task to the run.
+        @param task_id  The task number, as sent in its telemetry frames.
+        @param period   The task period in milliseconds.
+        @param Kp       The proportional gain.
+        @param sat_max  The upper saturation limit of the controller output.
+        @param sat_min  The lower saturation limit of the controller output.
+        @returns        The task's @c Axis.
+        """
+        if task_id in self._blocks:
+            raise ValueError('Task {:d} is already in the run'.format(task_id))
+        axis = Axis(task_id, period, Kp, int(sat_max), int(sat_min))
+        self.axes.append(axis)
+        self._blocks[task_id] = {}
+        return axis
+
+    def append(self, task_id, samples=None, **columns):
+        """!
+        This method adds a block of samples for one task. The columns can be
+        given as the fields of a structured array, such as the samples from
+        @c stream_ingest, or as keyword arguments, or both; a single number
+        given for a column is repeated for every sample.
+        @param task_id  The task number.
+        @param samples  A structured array of samples, or @c None.
+        @param columns  Arrays of values for each named column.
+        @raises ValueError if a column name is longer than @c NAME_SIZE bytes
+        """
+        if samples is not None:
+            for name in samples.dtype.names:
+                columns.setdefault(name, samples[name])
+        for name in columns:
+            if len(name.encode()) > NAME_SIZE:
+                raise ValueError('Column name {:s} is longer than {:d} bytes'
+                                 .format(name, NAME_SIZE))
+        length = max(np.size(values) for values in columns.values())
+        blocks = self._blocks[task_id]
+        if blocks and set(columns) != set(blocks):
+            raise ValueError('Task {:d} columns changed from {}'.format(
+                task_id, sorted(blocks)))
+        for name, values in columns.items():
+            values = np.asarray(values)
+            if values.ndim == 0:
+                values = np.full(length, values)
+            elif len(values) != length:
+                raise ValueError('Column {:s} has {:d} samples, not {:d}'
+                                 .format(name, len(values), length))
+            blocks.setdefault(name, []).append(values)
+
+    def close(self):
+        """!
+        This method writes the file. The writer can't be used afterward.
+        """
+        if self._blocks is None:
+            return
+        types = dict(COLUMNS)
+
+        # Join each column's blocks and work out where everything goes
+        header_size = struct.calcsize(FILE_FORMAT)
+        data = []
+        for axis in self.axes:
+            header_size += struct.calcsize(AXIS_FORMAT)
+            for name, blocks in self._blocks[axis.task_id].items():
+                values = np.concatenate(blocks)
+                values = values.astype(types.get(name, values.dtype.str),
+                                       copy=False)
+                data.append((axis, name, values))
+                axis.num_samples = len(values)
+                header_size += struct.calcsize(COLUMN_FORMAT)
+        offset = data_start = _aligned(header_size)
+        for axis, name, values in data:
+            axis.columns[name] = (values.dtype.str, offset)
+            offset = _aligned(offset + values.nbytes)
+
+        with open(self.path, 'wb') as file:
+            file.write(struct.pack(FILE_FORMAT, MAGIC, VERSION,
+                                   len(self.axes), data_start))
+            for axis in self.axes:
+                file.write(struct.pack(AXIS_FORMAT, axis.task_id,
+                                       len(axis.columns), axis.period,
+                                       axis.Kp, axis.sat_max, axis.sat_min,
+                                       axis.num_samples))
+                for name, (dtype, offset) in axis.columns.items():
+                    file.write(struct.pack(COLUMN_FORMAT, name.encode(),
+                                           dtype.encode(), offset))
+            for axis, name, values in data:
+                file.seek(axis.columns[name][1])
+                file.write(values.tobytes())
+        self._blocks = None
+
+
+class RunFile:
+    """!
+    This class reads a run file. Opening a file only reads its header; each
+    column is mapped into memory the first time it's asked for.
+    """
+
+    def __init__(self, path):
+        """!
+        Opens a run file and reads its header.
+        @param path     The name of the file.
+        """
+        ## The name of the file.
+        self.path = path
+
+        ## The tasks in the run, in the order they were written.
+        self.axes = []
+
+        ## Columns which have been mapped into memory so far.
+        self._maps = {}
+
+        with open(path, 'rb') as file:
+            magic, version, num_axes, data_start = struct.unpack(
+                FILE_FORMAT, file.read(struct.calcsize(FILE_FORMAT)))
+            if magic != MAGIC:
+                raise ValueError('{:s} is not a run file'.format(path))
+            if version > VERSION:
+                raise ValueError('{:s} is version {:d}; only up to {:d} can '
+                                 'be read'.format(path, version, VERSION))
+            header = file.read(data_start - file.tell())
+
+        pos = 0
+        for n in range(num_axes):
+            task_id, num_columns, period, Kp, sat_max, sat_min, num_samples = \
+                struct.unpack_from(AXIS_FORMAT, header, pos)
+            pos += struct.calcsize(AXIS_FORMAT)
+            axis = Axis(task_id, period, Kp, sat_max, sat_min)
+            axis.num_samples = num_samples
+            for c in range(num_columns):
+                name, dtype, offset = struct.unpack_from(COLUMN_FORMAT,
+                                                         header, pos)
+                pos += struct.calcsize(COLUMN_FORMAT)
+                axis.columns[name.rstrip(b'\0').decode()] = (
+                    dtype.rstrip(b'\0').decode(), offset)
+            self.axes.append(axis)
+
+    def __repr__(self):
+        """!
+        This method shows the file name and each task's description.
+        @returns    A string with one line per task.
+        """
+        return '\n'.join([self.path] + ['  ' + repr(axis)
+                                        for axis in self.axes])
+
+    def axis(self, task_id):
+        """!
+        This method finds the description of a task.
+        @param task_id  The task number.
+        @returns        The task's @c Axis.
+        """
+        for axis in self.axes:
+            if axis.task_id == task_id:
+                return axis
+        raise KeyError('Task {:d} is not in {:s}'.format(task_id, self.path))
+
+    def column(self, task_id, name):
+        """!
+        This method returns one column of a task's samples. The array is a
+        read-only view of the file, so only the parts which are used are
+        read from disk.
+        @param task_id  The task number.
+        @param name     The column name, such as @c 'position'.
+        @returns        A one-dimensional NumPy array.
+        """
+        key = (task_id, name)
+        values = self._maps.get(key)
+        if values is None:
+            axis = self.axis(task_id)
+            dtype, offset = axis.columns[name]
+            if axis.num_samples == 0:
+                values = np.empty(0, dtype)
+            else:
+                values = np.memmap(self.path, dtype, 'r', offset,
+                                   (axis.num_samples,))
+            self._maps[key] = values
+        return values
+
+    def samples(self, task_id):
+        """!
+        This method returns a dictionary of all of a task's columns.
+        @param task_id  The task number.
+        @returns        A dictionary which maps column names to arrays.
+        """
+        return {name: self.column(task_id, name)
+                for name in self.axis(task_id).columns}
+
+
+def convert(capture, path, periods, gains, sat_max=100, sat_min=-100,
+            setpoints=()):
+    """!
+    This function converts raw telemetry saved by @c stream_ingest.py into a
+    run file. Telemetry frames don't carry the setpoint, so each task's
+    setpoint is given and stored as a constant column.
+    @param capture      The name of the raw telemetry file.
+    @param path         The name of the run file to be written.
+    @param periods      Each task's period in milliseconds, in task order.
+    @param gains        Each task's proportional gain, in task order.
+    @param sat_max      The upper saturation limit of the controllers.
+    @param sat_min      The lower saturation limit of the controllers.
+    @param setpoints    Each task's setpoint, in task order.
+    @returns            The run file, opened for reading.
+    """
+    import stream_ingest
+
+    decoder = stream_ingest.BlockDecoder()
+    blocks = decoder.feed(np.fromfile(capture, np.uint8).tobytes())
+    for task_id, samples in decoder.flush().items():
+        blocks[task_id] = np.concatenate([blocks[task_id], samples]) \
+            if task_id in blocks else samples
+
+    with RunWriter(path) as writer:
+        for n, task_id in enumerate(sorted(blocks)):
+            samples = blocks[task_id]
+            pick = lambda values, default: \
+                values[min(n, len(values) - 1)] if values else default
+            writer.add_axis(task_id, pick(periods, 0.0), pick(gains, 0.0),
+                            sat_max, sat_min)
+            writer.append(task_id, samples,
+                          time=samples['time'] - samples['time'][0],
+                          setpoint=pick(setpoints, 0))
+    return RunFile(path)
+
+
+def main(argv=None):
+    """!
+    This function reads the command line and converts or describes files.
+    @param argv     The command line arguments, or @c None for @c sys.argv.
+    """
+    parser = argparse.ArgumentParser(description='Work with run files.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    info = commands.add_parser('info', help='describe run files')
+    info.add_argument('files', nargs='+')
+    conv = commands.add_parser('convert',
+                               help='convert raw telemetry to a run file')
+    conv.add_argument('capture')
+    conv.add_argument('path')
+    conv.add_argument('--period', type=float, action='append', default=[])
+    conv.add_argument('--kp', type=float, action='append', default=[])
+    conv.add_argument('--sat-max', type=int, default=100)
+    conv.add_argument('--sat-min', type=int, default=-100)
+    conv.add_argument('--setpoint', type=int, action='append', default=[])
+    args = parser.parse_args(argv)
+
+    if args.command == 'info':
+        for path in args.files:
+            print(RunFile(path))
+    else:
+        print(convert(args.capture, args.path, args.period, args.kp,
+                      args.sat_max, args.sat_min, args.setpoint))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""!
+@file __init__.py
+This package simulates the parts of MicroPython which the control code uses,
+so that the scheduler, shares, drivers and tasks run unchanged under CPython.
+
+@details Call @c install() before importing any of the board modules. It puts
+         the simulated @c pyb, @c utime and @c micropython modules in place
+         of the real ones and makes the MicroPython built-in @c const()
+         available:
+         @code
+         import sim
+         sim.install ()                       # As fast as possible
+         # sim.install (realtime = True)      # Locked to the wall clock
+
+         import cotask
+         import task_share
+         @endcode
+         A complete program such as @c main.py can be run from the command
+         line with <tt>python -m sim main.py</tt>; see @c __main__.py.
+
+@author Nishka Chawla
+@author Ronan Shaffer
+@date   18-Oct-2026
+@copyright (c) Released under GNU Public License
+"""
+
+import builtins
+import sys
+
+from sim import clock
+from sim import micropython
+from sim import pyb
+from sim import utime
+
+
+def install(realtime=False, speed=1.0, step_ns=10000):
+    """!
+    This function starts a fresh virtual clock and installs the simulated
+    modules so that later imports of @c pyb, @c utime and @c micropython
+    find them.
+    @param realtime     If @c True, simulated time follows the wall clock;
+                        if @c False, it runs as fast as possible.
+    @param speed        Simulated seconds per wall-clock second in real-time
+                        mode.
+    @param step_ns      How far time moves on each clock read in the
+                        free-running mode.
+    @returns            The new @c VirtualClock.
+    """
+    new_clock = clock.VirtualClock(realtime=realtime, speed=speed,
+                                   step_ns=step_ns)
+    clock.set_clock(new_clock)
+    pyb.Timer.instances.clear()
+    del pyb.USB_VCP._rx[:]
+
+    sys.modules['pyb'] = pyb
+    sys.modules['utime'] = utime
+    sys.modules['micropython'] = micropython
+    builtins.const = micropython.const
+    return new_clock
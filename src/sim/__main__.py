@@ -0,0 +1,112 @@
+"""!
+@file __main__.py
+This file runs a board program such as @c main.py on the host under the
+simulated MicroPython modules.
+
+@details The program is run as @c __main__ after @c sim.install(). Answers to
+         its @c input() prompts are given with @c --input, and a keypress is
+         sent to the simulated USB port after @c --duration simulated seconds
+         so that programs which run until a key is pressed stop by themselves.
+         For example, to profile @c main.py for ten simulated seconds:
+         @code
+         cd src
+         python -m sim --duration 10 --input 0.1 --input 0.1 --profile main.py
+         @endcode
+         With @c --plant, the motors are simulated by @c plant.MotorPlant,
+         so that the program runs in closed loop; each @c --plant gives the
+         numbers of a motor's PWM timer and its encoder's timer:
+         @code
+         python -m sim --duration 3 --plant 3:8 --plant 5:4 main.py
+         @endcode
+
+@author Nishka Chawla
+@author Ronan Shaffer
+@date   18-Oct-2026
+@copyright (c) Released under GNU Public License
+"""
+
+import argparse
+import builtins
+import os
+import runpy
+import sys
+import time
+
+import sim
+
+
+def main(argv=None):
+    """!
+    This function reads the command line and runs the chosen program.
+    @param argv     The command line arguments, or @c None to use @c sys.argv.
+    """
+    parser = argparse.ArgumentParser(prog='python -m sim',
+        description='Run a MicroPython board program on simulated hardware.')
+    parser.add_argument('script', help='the program to run, such as main.py')
+    parser.add_argument('--duration', type=float, default=10.0,
+                        help='simulated seconds before a key is "pressed"')
+    parser.add_argument('--realtime', action='store_true',
+                        help='lock simulated time to the wall clock')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='simulated seconds per second with --realtime')
+    parser.add_argument('--step-ns', type=int, default=10000,
+                        help='simulated time used by each clock read')
+    parser.add_argument('--input', action='append', default=[],
+                        help='an answer to one input() prompt, in order')
+    parser.add_argument('--profile', action='store_true',
+                        help='profile the program with cProfile')
+    parser.add_argument('--plant', action='append', default=[],
+                        metavar='MOTOR:ENCODER',
+                        help='simulate a motor driven by PWM timer MOTOR and '
+                             'read by encoder timer ENCODER')
+    parser.add_argument('--plant-step-us', type=int, default=200,
+                        help='time step of the motor model in microseconds')
+    args = parser.parse_args(argv)
+
+    clock = sim.install(realtime=args.realtime, speed=args.speed,
+                        step_ns=args.step_ns)
+    clock.add_event(int(args.duration * 1e9),
+                    lambda: sim.pyb.USB_VCP.feed(b'\r'))
+    if args.plant:
+        from sim import plant
+        pairs = [tuple(int(num) for num in pair.split(':'))
+                 for pair in args.plant]
+        motors = plant.MotorPlant(len(pairs))
+        motors.connect(pairs, args.plant_step_us)
+
+    answers = list(args.input)
+
+    def sim_input(prompt=''):
+        """!
+        Answers an @c input() prompt from the @c --input values.
+        @param prompt   The prompt, which is echoed.
+        @returns        The next answer.
+        """
+        answer = answers.pop(0) if answers else ''
+        print(prompt + answer)
+        return answer
+
+    builtins.input = sim_input
+    script = os.path.abspath(args.script)
+    sys.path.insert(0, os.path.dirname(script))
+
+    wall_start = time.perf_counter()
+    if args.profile:
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        profiler.runcall(runpy.run_path, script, run_name='__main__')
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats(
+            'tottime').print_stats(25)
+    else:
+        runpy.run_path(script, run_name='__main__')
+    wall = time.perf_counter() - wall_start
+
+    simulated = clock.now_ns() / 1e9
+    print('Simulated {:.3f} s in {:.3f} s of wall time ({:.1f}x)'.format(
+        simulated, wall, simulated / wall if wall > 0 else 0.0),
+        file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
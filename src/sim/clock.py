@@ -0,0 +1,266 @@
+"""!
+@file clock.py
+This file contains the virtual clock which drives the host-side simulation
+of the MicroPython board.
+
+@details All simulated time comes from one @c VirtualClock object. In the
+         default free-running mode, simulated time only moves when something
+         reads or waits on the clock, so the scheduler and tasks run as fast
+         as the host can execute them. In real-time mode, simulated time is
+         locked to the host's wall clock, optionally scaled by a speed factor.
+         Periodic and one-shot events registered with the clock stand in for
+         hardware interrupts; they are run whenever time moves past them,
+         unless interrupts have been disabled with @c pyb.disable_irq().
+
+@author Nishka Chawla
+@author Ronan Shaffer
+@date   18-Oct-2026
+@copyright (c) Released under GNU Public License
+"""
+
+import time
+
+
+class _Event:
+    """!
+    A periodic or one-shot event which the clock runs at a given time, much
+    as a hardware timer runs an interrupt service routine.
+    """
+
+    def __init__(self, when_ns, period_ns, func):
+        """!
+        Creates an event.
+        @param when_ns      The clock time in nanoseconds at which it first runs.
+        @param period_ns    The time between runs in nanoseconds, or @c None
+                            if the event only runs once.
+        @param func         A function taking no arguments which is called
+                            when the event is due.
+        """
+        ## The clock time in nanoseconds at which the event is next due.
+        self.when_ns = when_ns
+
+        ## The time between runs in nanoseconds, or @c None for one shot.
+        self.period_ns = period_ns
+
+        ## The function which is called when the event is due.
+        self.func = func
+
+
+class VirtualClock:
+    """!
+    This class implements the simulated time base used by the simulated
+    @c utime and @c pyb modules.
+    """
+
+    def __init__(self, realtime=False, speed=1.0, step_ns=10000):
+        """!
+        Creates a virtual clock starting at time zero.
+        @param realtime     If @c True, simulated time follows the wall clock;
+                            if @c False, it runs as fast as possible.
+        @param speed        In real-time mode, the number of simulated seconds
+                            which pass in each wall-clock second.
+        @param step_ns      In free-running mode, how far time moves each time
+                            the clock is read. This stands in for the time the
+                            board takes to run code between clock reads, and it
+                            keeps loops which poll the clock from spinning
+                            forever. The default of 10 us is roughly what a
+                            few lines of MicroPython take on the board.
+        """
+        ## @c True if simulated time is locked to the wall clock.
+        self.realtime = realtime
+
+        ## Simulated seconds per wall-clock second in real-time mode.
+        self.speed = float(speed)
+
+        ## How far time moves on each read in free-running mode.
+        self.step_ns = int(step_ns)
+
+        ## @c False while interrupts are disabled by @c pyb.disable_irq().
+        self.irq_enabled = True
+
+        ## The current simulated time in nanoseconds.
+        self._now_ns = 0
+
+        ## Periodic and one-shot events standing in for interrupts.
+        self._events = []
+
+        ## The time at which the earliest event is due, or @c None.
+        self._next_due = None
+
+        ## Flag which keeps events from running inside other events.
+        self._in_isr = False
+
+        ## A pair of functions called before and after the clock does work
+        #  which stands in for the hardware: running an event, which is a
+        #  simulated interrupt, or adding or removing one, which is setting
+        #  up a timer. An allocation meter uses them to leave out what that
+        #  work allocates, since on the board neither allocates. @c None if
+        #  there is no meter.
+        self.hw_hooks = None
+
+        ## How deep the clock is in work which stands in for the hardware.
+        self._hw_depth = 0
+
+        ## Wall-clock time which corresponds to simulated time zero.
+        self._wall_t0 = time.perf_counter_ns()
+
+    def now_ns(self):
+        """!
+        This method reads the clock, letting time move forward first.
+        @returns    The current simulated time in nanoseconds.
+        """
+        if self.realtime:
+            self._advance_to(self._wall_time())
+        elif not self._in_isr:
+            self._advance_to(self._now_ns + self.step_ns)
+        return self._now_ns
+
+    def now_us(self):
+        """!
+        This method reads the clock in microseconds.
+        @returns    The current simulated time in microseconds.
+        """
+        return self.now_ns() // 1000
+
+    def advance(self, delta_ns):
+        """!
+        This method waits for the given amount of simulated time, running any
+        events which become due on the way. In real-time mode this sleeps.
+        @param delta_ns     The time to wait in nanoseconds.
+        """
+        target = self._now_ns + int(delta_ns)
+        if self.realtime:
+            while self._now_ns < target:
+                remaining = (target - self._now_ns) / self.speed / 1e9
+                time.sleep(min(remaining, 0.01))
+                self._advance_to(min(self._wall_time(), target))
+        else:
+            self._advance_to(target)
+
+    def next_event_ns(self):
+        """!
+        This method finds the time at which the next event is due.
+        @returns    The time in nanoseconds, or @c None if no event is pending.
+        """
+        return self._next_due
+
+    def add_event(self, delay_ns, func, period_ns=None):
+        """!
+        This method registers a function to be run by the clock after a delay,
+        and then periodically if a period is given.
+        @param delay_ns     The delay before the first run in nanoseconds.
+        @param func         A function taking no arguments.
+        @param period_ns    The time between later runs, or @c None.
+        @returns            A handle which can be given to @c remove_event().
+        """
+        self._enter_hw()
+        event = _Event(self._now_ns + int(delay_ns), period_ns, func)
+        self._events.append(event)
+        self._find_next_due()
+        self._leave_hw()
+        return event
+
+    def remove_event(self, event):
+        """!
+        This method removes an event so that it won't be run again.
+        @param event        A handle returned by @c add_event().
+        """
+        self._enter_hw()
+        if event in self._events:
+            self._events.remove(event)
+            self._find_next_due()
+        self._leave_hw()
+
+    def run_pending(self):
+        """!
+        This method runs events which came due while interrupts were disabled.
+        It is called by @c pyb.enable_irq().
+        """
+        self._advance_to(self._now_ns)
+
+    def _wall_time(self):
+        """!
+        This method converts the wall-clock time into simulated time.
+        @returns    The simulated time in nanoseconds for this instant.
+        """
+        elapsed = time.perf_counter_ns() - self._wall_t0
+        return max(self._now_ns, int(elapsed * self.speed))
+
+    def _advance_to(self, target_ns):
+        """!
+        This method moves time forward to the given time, stopping at each
+        event which falls due on the way so that the event sees the time at
+        which it would have happened on the board.
+        @param target_ns    The simulated time to move to.
+        """
+        if self.irq_enabled and not self._in_isr:
+            while self._next_due is not None and self._next_due <= target_ns:
+                self._enter_hw()
+                event = min(self._events, key=lambda ev: ev.when_ns)
+                if event.when_ns > self._now_ns:
+                    self._now_ns = event.when_ns
+                if event.period_ns:
+                    event.when_ns += event.period_ns
+                else:
+                    self._events.remove(event)
+                self._find_next_due()
+                self._in_isr = True
+                try:
+                    event.func()
+                finally:
+                    self._in_isr = False
+                    self._leave_hw()
+                if not self.irq_enabled:
+                    break
+        if target_ns > self._now_ns:
+            self._now_ns = target_ns
+
+    def _enter_hw(self):
+        """!
+        This method marks the start of work which stands in for the
+        hardware, calling the first hook unless that work is inside other
+        such work.
+        """
+        self._hw_depth += 1
+        if self._hw_depth == 1 and self.hw_hooks is not None:
+            self.hw_hooks[0]()
+
+    def _leave_hw(self):
+        """!
+        This method marks the end of work which stands in for the hardware,
+        calling the second hook once the outermost such work is done.
+        """
+        self._hw_depth -= 1
+        if self._hw_depth == 0 and self.hw_hooks is not None:
+            self.hw_hooks[1]()
+
+    def _find_next_due(self):
+        """!
+        This method finds the earliest event time after the list of events
+        or their times have changed.
+        """
+        if self._events:
+            self._next_due = min(ev.when_ns for ev in self._events)
+        else:
+            self._next_due = None
+
+
+## The clock used by the simulated modules. It is replaced by @c sim.install().
+CLOCK = VirtualClock()
+
+
+def get_clock():
+    """!
+    This function returns the clock used by the simulated modules.
+    @returns    The current @c VirtualClock.
+    """
+    return CLOCK
+
+
+def set_clock(clock):
+    """!
+    This function replaces the clock used by the simulated modules.
+    @param clock    The new @c VirtualClock.
+    """
+    global CLOCK
+    CLOCK = clock
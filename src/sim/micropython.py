@@ -0,0 +1,91 @@
+"""!
+@file micropython.py
+This file contains a host-side stand-in for the MicroPython @c micropython
+module.
+
+@details The code emitter decorators do nothing under CPython, and the
+         memory functions report what little CPython can tell us.
+
+@author Nishka Chawla
+@author Ronan Shaffer
+@date   18-Oct-2026
+@copyright (c) Released under GNU Public License
+"""
+
+import gc
+
+
+def const(value):
+    """!
+    This function marks a constant for the MicroPython compiler; here it
+    just returns its argument.
+    @param value    The constant value.
+    @returns        The same value.
+    """
+    return value
+
+
+def native(func):
+    """!
+    This decorator asks MicroPython to compile a function to native code;
+    here it returns the function unchanged.
+    @param func     The function being decorated.
+    @returns        The same function.
+    """
+    return func
+
+
+def viper(func):
+    """!
+    This decorator asks MicroPython to compile a function with the viper
+    emitter; here it returns the function unchanged.
+    @param func     The function being decorated.
+    @returns        The same function.
+    """
+    return func
+
+
+def alloc_emergency_exception_buf(size):
+    """!
+    This function reserves memory for exceptions raised in interrupt
+    handlers on the board; here there is nothing to reserve.
+    @param size     The size of the buffer in bytes.
+    """
+    pass
+
+
+def schedule(func, arg):
+    """!
+    This function asks MicroPython to call a function soon, outside of the
+    interrupt handler which scheduled it; here it is called right away.
+    @param func     The function to be called.
+    @param arg      The argument passed to the function.
+    """
+    func(arg)
+
+
+def mem_info(verbose=False):
+    """!
+    This function prints a summary of memory use. Under CPython only the
+    garbage collector's object counts are available.
+    @param verbose  Ignored; kept for compatibility with the board.
+    """
+    print('GC counts: {:}, tracked objects: {:}'.format(gc.get_count(),
+                                                        len(gc.get_objects())))
+
+
+def heap_lock():
+    """!
+    This function stops the board from allocating memory; it does nothing
+    under CPython.
+    """
+    pass
+
+
+def heap_unlock():
+    """!
+    This function lets the board allocate memory again; it does nothing
+    under CPython.
+    @returns    Zero, the lock depth, as on the board.
+    """
+    return 0
@@ -0,0 +1,306 @@
+"""!
+@file plant.py
+This file contains a model of the kit's DC motor and flywheel, so that the
+control code can be run in closed loop on the host.
+
+@details The motor is modelled as a DC motor with a flywheel, driven through
+         the H-bridge from a fixed supply. The armature inductance is left
+         out, since its time constant is far shorter than the flywheel's, so
+         the torque is
+         @f[ \tau = \frac{K_t}{R} \left( \frac{d}{100} V_s - K_t \omega \right)
+                    - b \omega - \tau_c \mathrm{sgn}(\omega) @f]
+         where @f$d@f$ is the duty cycle in percent, @f$b@f$ the viscous
+         friction and @f$\tau_c@f$ the Coulomb friction, which also holds the
+         motor still when the drive torque is smaller than it. Between steps
+         the duty cycle is held, and the speed and angle are found exactly for
+         the linear part of the model, so a step can be much longer than a
+         PWM period without the model going unstable. The encoder output is
+         the angle rounded down to whole counts.
+
+         A @c MotorPlant holds any number of motors in NumPy arrays and steps
+         them all at once. It can be connected to the simulated timers, where
+         it reads each motor's duty cycle from the PWM channels which
+         @c MotorDriver.set_duty_cycle() writes and moves the counter of the
+         encoder timer which @c EncoderDriver reads:
+         @code
+         import sim
+         clock = sim.install ()
+         plant = sim.plant.MotorPlant (2)
+         plant.connect (((3, 8), (5, 4)))      # (motor timer, encoder timer)
+         @endcode
+         The same is done by <tt>python -m sim --plant 3:8 --plant 5:4
+         main.py</tt>. For studies of many controllers, @c simulate_steps()
+         runs whole step responses for a grid of gains, limits and periods
+         together, without the scheduler, using the controller's
+         @c run_numpy() method:
+         @code
+         Kp, period = numpy.meshgrid (numpy.linspace (0.01, 0.5, 50),
+                                      [0.01, 0.02, 0.04, 0.08])
+         t, pos, duty = plant.simulate_steps (Kp, period, duration = 2.0)
+         @endcode
+
+@author Nishka Chawla
+@author Ronan Shaffer
+@date   18-Oct-2026
+@copyright (c) Released under GNU Public License
+"""
+
+import math
+import sys
+
+import numpy as np
+
+from sim import clock as _clock
+from sim import pyb
+from sim import utime
+
+
+## The supply voltage across the H-bridge, in volts.
+SUPPLY = 12.0
+
+## The armature resistance, in ohms.
+RESISTANCE = 2.6
+
+## The torque constant, in N-m/A, which is also the back-EMF constant in
+#  V-s/rad.
+K_T = 0.025
+
+## The inertia of the rotor and flywheel, in kg-m^2.
+INERTIA = 2.0e-5
+
+## The viscous friction, in N-m-s/rad.
+VISCOUS = 1.0e-5
+
+## The Coulomb friction, in N-m.
+COULOMB = 2.0e-3
+
+## The encoder counts in one turn of the motor shaft, counting every edge of
+#  both channels as the timer does in encoder mode.
+COUNTS_PER_REV = 1024
+
+
+class MotorPlant:
+    """!
+    This class models a set of DC motors with flywheels and quantized
+    encoders. The parameters may be single values shared by every motor or
+    arrays with one value per motor.
+    """
+
+    def __init__(self, num=1, supply=SUPPLY, resistance=RESISTANCE, k_t=K_T,
+                 inertia=INERTIA, viscous=VISCOUS, coulomb=COULOMB,
+                 counts_per_rev=COUNTS_PER_REV):
+        """!
+        Creates a set of motors, all at rest at zero counts.
+        @param num              The number of motors.
+        @param supply           The supply voltage in volts.
+        @param resistance       The armature resistance in ohms.
+        @param k_t              The torque and back-EMF constant in N-m/A.
+        @param inertia          The rotor and flywheel inertia in kg-m^2.
+        @param viscous          The viscous friction in N-m-s/rad.
+        @param coulomb          The Coulomb friction in N-m.
+        @param counts_per_rev   The encoder counts per turn.
+        """
+        ## The number of motors.
+        self.num = num
+
+        ## The stall torque at full duty cycle, per percent of duty.
+        self._drive = np.broadcast_to(
+            np.asarray(k_t, float) * supply / resistance / 100, (num,))
+
+        ## The total damping from friction and back-EMF, in N-m-s/rad.
+        self._damping = np.broadcast_to(
+            viscous + np.asarray(k_t, float) ** 2 / resistance, (num,))
+
+        ## The inertia of each motor.
+        self._inertia = np.broadcast_to(np.asarray(inertia, float), (num,))
+
+        ## The Coulomb friction of each motor.
+        self._coulomb = np.broadcast_to(np.asarray(coulomb, float), (num,))
+
+        ## Encoder counts per radian.
+        self._counts_per_rad = np.broadcast_to(
+            np.asarray(counts_per_rev, float) / (2 * math.pi), (num,))
+
+        ## The time step and the factors used for it, kept for the next step.
+        self._factors = (None, None, None)
+
+        ## The speed of each motor in rad/s.
+        self.omega = np.zeros(num)
+
+        ## The angle of each motor in radians.
+        self.theta = np.zeros(num)
+
+        ## The encoder count of each motor.
+        self.count = np.zeros(num, np.int64)
+
+        ## The duty cycle of each motor in percent, held between steps.
+        self.duty = np.zeros(num)
+
+        self._event = None
+        self._pairs = ()
+
+    def reset(self):
+        """!
+        This method stops every motor and sets it back to zero counts.
+        """
+        self.omega[:] = 0.0
+        self.theta[:] = 0.0
+        self.count[:] = 0
+        self.duty[:] = 0.0
+
+    def step(self, dt, duty=None):
+        """!
+        This method moves every motor forward in time with its duty cycle
+        held.
+        @param dt       The time step in seconds.
+        @param duty     The duty cycles in percent, from -100 to 100, or
+                        @c None to keep the previous ones.
+        @returns        An array of the change in each encoder count.
+        """
+        if duty is not None:
+            np.clip(duty, -100, 100, out=self.duty)
+        if self._factors[0] != dt:
+            tau = self._inertia / self._damping
+            decay = np.exp(-dt / tau)
+            self._factors = (dt, decay, tau * (1.0 - decay))
+        _, decay, gain = self._factors
+
+        omega = self.omega
+        drive = self._drive * self.duty
+        coulomb = self._coulomb
+        # A moving motor feels the full friction; a still one only as much as
+        # it takes to hold it still
+        friction = np.where(omega != 0.0, np.copysign(coulomb, omega),
+                            np.clip(drive, -coulomb, coulomb))
+        final = (drive - friction) / self._damping
+        new_omega = final + (omega - final) * decay
+        self.theta += final * dt + (omega - final) * gain
+        # Friction can stop a motor but can't turn it backwards
+        new_omega[new_omega * omega < 0.0] = 0.0
+        self.omega = new_omega
+
+        count = np.floor(self.theta * self._counts_per_rad).astype(np.int64)
+        delta = count - self.count
+        self.count = count
+        return delta
+
+    def connect(self, pairs, dt_us=200):
+        """!
+        This method runs the motors from the simulated timers. Every time
+        step, each motor's duty cycle is read from channels 1 and 2 of its
+        motor timer, as set by @c MotorDriver, and the change in its encoder
+        count is added to the counter of its encoder timer, which
+        @c EncoderDriver reads. The timers are looked up by number at every
+        step, so the drivers may be made after the plant is connected.
+        @param pairs    A (motor timer, encoder timer) pair of timer numbers
+                        for each motor.
+        @param dt_us    The time step in microseconds.
+        """
+        self.disconnect()
+        self._pairs = tuple(pairs)
+        if len(self._pairs) != self.num:
+            raise ValueError('Need {:d} timer pairs, got {:d}'.format(
+                self.num, len(self._pairs)))
+        dt = dt_us / 1e6
+        self._event = _clock.CLOCK.add_event(
+            dt_us * 1000, lambda: self._sim_step(dt), dt_us * 1000)
+
+    def disconnect(self):
+        """!
+        This method stops running the motors from the simulated timers.
+        """
+        if self._event is not None:
+            _clock.CLOCK.remove_event(self._event)
+            self._event = None
+
+    def _sim_step(self, dt):
+        """!
+        This method is run by the virtual clock for each time step while the
+        plant is connected.
+        @param dt       The time step in seconds.
+        """
+        duty = self.duty
+        timers = pyb.Timer.instances
+        for motor, (mot_tim, _) in enumerate(self._pairs):
+            tim = timers.get(mot_tim)
+            level = 0.0
+            if tim is not None:
+                chan = tim.channel(1)
+                if chan is not None:
+                    level += chan.duty()
+                chan = tim.channel(2)
+                if chan is not None:
+                    level -= chan.duty()
+            duty[motor] = 100.0 * level
+        delta = self.step(dt, duty)
+        for motor, (_, enc_tim) in enumerate(self._pairs):
+            tim = timers.get(enc_tim)
+            if tim is not None and delta[motor]:
+                tim.advance_count(delta[motor])
+
+
+def simulate_steps(Kp, period, sat_max=100, sat_min=-100, setpoint=16384,
+                   Ki=0.0, duration=2.0, dt=1e-4, sample=1e-3, **params):
+    """!
+    This function simulates step responses of the position controller for
+    many sets of gains, limits and periods at once. Each run starts at rest
+    at zero counts with its setpoint already set. The controller runs
+    first at time zero and then once each period, as the motor task does,
+    using @c MultiAxisController.run_numpy() for all the runs which share a
+    period; the motors are stepped together between runs.
+    @param Kp           The proportional gains.
+    @param period       The controller periods in seconds.
+    @param sat_max      The maximum saturation limits on the duty cycle.
+    @param sat_min      The minimum saturation limits on the duty cycle.
+    @param setpoint     The setpoints in encoder counts.
+    @param Ki           The integral gains.
+    @param duration     The length of each run in seconds.
+    @param dt           The time step of the motor model in seconds. The
+                        periods are rounded to whole steps.
+    @param sample       The time between recorded samples in seconds.
+    @param params       Motor parameters, as taken by @c MotorPlant.
+    @returns            A tuple of the sample times in seconds, an array of
+                        encoder positions with one row per run, and an array
+                        of duty cycles in the same shape. The runs are in the
+                        order of the flattened, broadcast arguments.
+    """
+    # closedloopcontrol imports utime, which here is the simulated one
+    sys.modules.setdefault('utime', utime)
+    from closedloopcontrol import MultiAxisController
+
+    Kp, Ki, period, sat_max, sat_min, setpoint = (
+        arg.ravel() for arg in np.broadcast_arrays(
+            Kp, Ki, period, sat_max, sat_min, setpoint))
+    num = Kp.size
+    plant = MotorPlant(num, **params)
+
+    period_steps = np.maximum(np.rint(period / dt).astype(np.int64), 1)
+    groups = []
+    for steps in np.unique(period_steps):
+        runs = np.nonzero(period_steps == steps)[0]
+        controller = MultiAxisController(len(runs), period=steps * dt)
+        for axis, run in enumerate(runs):
+            controller.set_Kp(axis, Kp[run])
+            controller.set_Ki(axis, Ki[run])
+            controller.set_limits(axis, int(sat_max[run]), int(sat_min[run]))
+            controller.set_setpoint(axis, int(setpoint[run]))
+        groups.append((int(steps), runs, controller))
+
+    total = int(round(duration / dt))
+    every = max(int(round(sample / dt)), 1)
+    num_samples = (total + every - 1) // every
+    position = np.zeros((num, num_samples), np.int32)
+    duty = np.zeros((num, num_samples), np.int8)
+    level = np.zeros(num)
+
+    for k in range(total):
+        for steps, runs, controller in groups:
+            if k % steps == 0:
+                level[runs] = controller.run_numpy(plant.count[runs])
+        if k % every == 0:
+            position[:, k // every] = plant.count
+            duty[:, k // every] = level
+        plant.step(dt, level)
+
+    times = np.arange(num_samples) * (every * dt)
+    return times, position, duty
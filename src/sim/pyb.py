@@ -0,0 +1,617 @@
+"""!
+@file pyb.py
+This file contains a host-side stand-in for the MicroPython @c pyb module.
+
+@details Only the parts of @c pyb used by this project are simulated: pins,
+         timers with encoder counters and PWM channels, interrupt masking,
+         the USB virtual serial port and a few delay functions. Timers with
+         callbacks run them from the virtual clock as if they were interrupts.
+         Encoder counters don't move by themselves; a plant model or test
+         moves them with @c Timer.advance_count().
+
+@author Nishka Chawla
+@author Ronan Shaffer
+@date   18-Oct-2026
+@copyright (c) Released under GNU Public License
+"""
+
+import sys
+from sim import clock as _clock
+
+
+def disable_irq():
+    """!
+    This function disables interrupts, so simulated timer callbacks wait
+    until interrupts are enabled again.
+    @returns    The previous interrupt state, to be given to @c enable_irq().
+    """
+    state = _clock.CLOCK.irq_enabled
+    _clock.CLOCK.irq_enabled = False
+    return state
+
+
+def enable_irq(state=True):
+    """!
+    This function restores the interrupt state and runs any callbacks which
+    came due while interrupts were disabled.
+    @param state    The state returned by @c disable_irq().
+    """
+    _clock.CLOCK.irq_enabled = state
+    if state:
+        _clock.CLOCK.run_pending()
+
+
+def millis():
+    """!
+    This function returns the number of milliseconds since the simulation
+    started.
+    @returns    The simulated time in milliseconds.
+    """
+    return _clock.CLOCK.now_ns() // 1000000
+
+
+def micros():
+    """!
+    This function returns the number of microseconds since the simulation
+    started.
+    @returns    The simulated time in microseconds.
+    """
+    return _clock.CLOCK.now_ns() // 1000
+
+
+def elapsed_millis(start):
+    """!
+    This function returns the milliseconds elapsed since a @c millis() value.
+    @param start    An earlier value from @c millis().
+    @returns        The elapsed time in milliseconds.
+    """
+    return millis() - start
+
+
+def elapsed_micros(start):
+    """!
+    This function returns the microseconds elapsed since a @c micros() value.
+    @param start    An earlier value from @c micros().
+    @returns        The elapsed time in microseconds.
+    """
+    return micros() - start
+
+
+def delay(ms):
+    """!
+    This function waits for the given number of simulated milliseconds.
+    @param ms   The time to wait.
+    """
+    _clock.CLOCK.advance(int(ms) * 1000000)
+
+
+def udelay(us):
+    """!
+    This function waits for the given number of simulated microseconds.
+    @param us   The time to wait.
+    """
+    _clock.CLOCK.advance(int(us) * 1000)
+
+
+def wfi():
+    """!
+    This function waits for an interrupt. Simulated time moves to the next
+    pending event, or by one millisecond if no event is pending, which is
+    the period of the board's SysTick interrupt.
+    """
+    clock = _clock.CLOCK
+    due = clock.next_event_ns()
+    now = clock.now_ns()
+    if due is None or due - now > 1000000:
+        due = now + 1000000
+    clock.advance(max(due - now, 0))
+
+
+# =============================================================================
+
+class _PinNames:
+    """!
+    This class stands in for @c pyb.Pin.cpu and @c pyb.Pin.board; any pin
+    name looked up in it is returned as a string.
+    """
+
+    def __getattr__(self, name):
+        """!
+        Returns the name of the pin being looked up.
+        @param name     The pin name, such as @c A10.
+        @returns        The pin name.
+        """
+        return name
+
+
+class Pin:
+    """!
+    This class implements a simulated GPIO pin which remembers its mode and
+    level.
+    """
+    ## Pin mode constants, as on the board
+    IN = 0
+    OUT_PP = 1
+    OUT_OD = 17
+    AF_PP = 2
+    AF_OD = 18
+    ANALOG = 3
+    ALT = 2
+    ALT_OPEN_DRAIN = 18
+    OUT = 1
+    OPEN_DRAIN = 17
+
+    ## Pull resistor constants, as on the board
+    PULL_NONE = 0
+    PULL_UP = 1
+    PULL_DOWN = 2
+
+    ## Pin names by CPU port and pin
+    cpu = _PinNames()
+
+    ## Pin names by board connector label
+    board = _PinNames()
+
+    def __init__(self, pin_id, mode=IN, pull=PULL_NONE, af=-1, value=None):
+        """!
+        Creates a simulated pin.
+        @param pin_id   The pin name, such as @c Pin.cpu.A10.
+        @param mode     The pin mode.
+        @param pull     The pull resistor setting.
+        @param af       The alternate function number, if any.
+        @param value    The initial output level, if given.
+        """
+        ## The name of the pin.
+        self._name = str(pin_id)
+
+        ## The level of the pin, 0 or 1.
+        self._value = 0
+
+        self.init(mode, pull, af, value)
+
+    def init(self, mode=IN, pull=PULL_NONE, af=-1, value=None):
+        """!
+        This method sets the pin's mode.
+        @param mode     The pin mode.
+        @param pull     The pull resistor setting.
+        @param af       The alternate function number, if any.
+        @param value    The initial output level, if given.
+        """
+        self._mode = mode
+        self._pull = pull
+        self._af = af
+        if value is not None:
+            self._value = 1 if value else 0
+
+    def value(self, value=None):
+        """!
+        This method reads or sets the pin level.
+        @param value    The level to set, or @c None to read it.
+        @returns        The pin level when reading.
+        """
+        if value is None:
+            return self._value
+        self._value = 1 if value else 0
+
+    def high(self):
+        """!
+        This method sets the pin high.
+        """
+        self._value = 1
+
+    def low(self):
+        """!
+        This method sets the pin low.
+        """
+        self._value = 0
+
+    on = high
+    off = low
+
+    def name(self):
+        """!
+        This method returns the pin's name.
+        @returns    The pin name.
+        """
+        return self._name
+
+    def mode(self):
+        """!
+        This method returns the pin's mode.
+        @returns    The pin mode.
+        """
+        return self._mode
+
+    def __repr__(self):
+        """!
+        This method shows the pin's name and level.
+        """
+        return 'Pin({:s}) = {:d}'.format(self._name, self._value)
+
+
+# =============================================================================
+
+class TimerChannel:
+    """!
+    This class implements a simulated timer channel. PWM channels keep their
+    compare value, and count how many times it has been written so that the
+    cost of motor updates can be measured.
+    """
+
+    def __init__(self, timer, channel, mode, pin=None, callback=None):
+        """!
+        Creates a timer channel; it is normally made by @c Timer.channel().
+        @param timer    The timer to which the channel belongs.
+        @param channel  The channel number.
+        @param mode     The channel mode, such as @c Timer.PWM.
+        @param pin      The pin connected to the channel.
+        @param callback A function called with the timer on compare events.
+        """
+        ## The timer to which the channel belongs.
+        self.timer = timer
+
+        ## The channel number.
+        self.channel = channel
+
+        ## The channel mode.
+        self.mode = mode
+
+        ## The pin connected to the channel.
+        self.pin = pin
+
+        ## The compare (pulse width) value in timer counts.
+        self._compare = 0
+
+        ## The number of times the compare value has been written.
+        self.writes = 0
+
+        self._callback = callback
+
+    def pulse_width(self, value=None):
+        """!
+        This method reads or sets the pulse width in timer counts.
+        @param value    The pulse width to set, or @c None to read it.
+        @returns        The pulse width when reading.
+        """
+        if value is None:
+            return self._compare
+        self._compare = max(0, min(int(value), self.timer._period + 1))
+        self.writes += 1
+
+    compare = pulse_width
+
+    def pulse_width_percent(self, value=None):
+        """!
+        This method reads or sets the pulse width as a percent of the period.
+        @param value    The duty cycle in percent, or @c None to read it.
+        @returns        The duty cycle in percent when reading.
+        """
+        period = self.timer._period + 1
+        if value is None:
+            return 100 * self._compare / period
+        self.pulse_width(round(period * min(max(value, 0), 100) / 100))
+
+    def capture(self, value=None):
+        """!
+        This method reads or sets the captured counter value.
+        @param value    The value to set, or @c None to read it.
+        @returns        The captured value when reading.
+        """
+        return self.pulse_width(value)
+
+    def callback(self, func):
+        """!
+        This method sets the function called on this channel's events.
+        @param func     The function, or @c None.
+        """
+        self._callback = func
+
+    def duty(self):
+        """!
+        This method returns the channel's duty cycle as a fraction. It is
+        only available in simulation.
+        @returns    The duty cycle from 0.0 to 1.0.
+        """
+        return self._compare / (self.timer._period + 1)
+
+
+class Timer:
+    """!
+    This class implements a simulated hardware timer. Timers made with the
+    same number share one counter, as on the board.
+    """
+    ## Counter modes
+    UP = 0
+    DOWN = 16
+    CENTER = 32
+
+    ## Channel modes
+    PWM = 0
+    PWM_INVERTED = 1
+    OC_TIMING = 2
+    OC_ACTIVE = 3
+    OC_INACTIVE = 4
+    OC_TOGGLE = 5
+    OC_FORCED_ACTIVE = 6
+    OC_FORCED_INACTIVE = 7
+    IC = 8
+    ENC_A = 9
+    ENC_B = 10
+    ENC_AB = 11
+
+    ## Channel polarities
+    HIGH = 0
+    LOW = 2
+    RISING = 0
+    FALLING = 2
+    BOTH = 10
+
+    ## The clock frequency feeding the timers, in Hz.
+    SOURCE_FREQ = 80000000
+
+    ## The most recently made timer object for each timer number. The plant
+    #  model uses this to find the timers which the drivers are using.
+    instances = {}
+
+    def __init__(self, tim_id, **kwargs):
+        """!
+        Creates a simulated timer, initializing it if keywords are given.
+        @param tim_id   The timer number.
+        @param kwargs   Keywords as for @c init().
+        """
+        ## The timer number.
+        self.tim_id = tim_id
+
+        old = Timer.instances.get(tim_id)
+        self._count = old._count if old else 0
+        self._prescaler = 0
+        self._period = 0xFFFF
+        self._channels = {}
+        self._callback = None
+        self._event = None
+        # Bound once, so that setting a callback doesn't make a new method
+        self._wrap_cb = self._wrapped
+        Timer.instances[tim_id] = self
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, freq=None, prescaler=None, period=None, mode=UP, div=1,
+             callback=None, deadtime=0):
+        """!
+        This method sets up the timer's rate, either from a frequency or from
+        a prescaler and period.
+        @param freq         The rate at which the counter wraps, in Hz.
+        @param prescaler    The clock prescaler.
+        @param period       The counter's maximum value.
+        @param mode         The counter mode.
+        @param div          The clock division; ignored.
+        @param callback     A function called with the timer on each wrap.
+        @param deadtime     The PWM dead time; ignored.
+        """
+        if freq is not None:
+            ticks = max(int(Timer.SOURCE_FREQ / freq), 1)
+            self._prescaler = (ticks - 1) // 0x10000
+            self._period = ticks // (self._prescaler + 1) - 1
+        else:
+            if prescaler is not None:
+                self._prescaler = prescaler
+            if period is not None:
+                self._period = period
+        self._mode = mode
+        self.callback(callback)
+
+    def deinit(self):
+        """!
+        This method stops the timer and its callback.
+        """
+        self.callback(None)
+        self._channels = {}
+
+    def counter(self, value=None):
+        """!
+        This method reads or sets the counter.
+        @param value    The value to set, or @c None to read it.
+        @returns        The counter value when reading.
+        """
+        if value is None:
+            return self._count
+        self._count = int(value) % (self._period + 1)
+
+    def advance_count(self, delta):
+        """!
+        This method moves the counter by a signed number of counts, wrapping
+        as the hardware does. It is only available in simulation, where it is
+        used to feed encoder counts into encoder-mode timers.
+        @param delta    The number of counts to add.
+        """
+        self._count = (self._count + int(delta)) % (self._period + 1)
+
+    def freq(self, value=None):
+        """!
+        This method reads or sets the rate at which the counter wraps.
+        @param value    The frequency to set in Hz, or @c None to read it.
+        @returns        The frequency when reading.
+        """
+        if value is None:
+            return Timer.SOURCE_FREQ / ((self._prescaler + 1)
+                                        * (self._period + 1))
+        self.init(freq=value, callback=self._callback)
+
+    def period(self, value=None):
+        """!
+        This method reads or sets the counter's maximum value.
+        @param value    The period to set, or @c None to read it.
+        @returns        The period when reading.
+        """
+        if value is None:
+            return self._period
+        self._period = int(value)
+        self.callback(self._callback)
+
+    def prescaler(self, value=None):
+        """!
+        This method reads or sets the prescaler.
+        @param value    The prescaler to set, or @c None to read it.
+        @returns        The prescaler when reading.
+        """
+        if value is None:
+            return self._prescaler
+        self._prescaler = int(value)
+        self.callback(self._callback)
+
+    def source_freq(self):
+        """!
+        This method returns the frequency of the timer's clock source.
+        @returns    The source frequency in Hz.
+        """
+        return Timer.SOURCE_FREQ
+
+    def callback(self, func):
+        """!
+        This method sets the function which the virtual clock calls each time
+        the counter wraps, as a timer interrupt would.
+        @param func     A function taking the timer, or @c None.
+        """
+        clock = _clock.CLOCK
+        if self._event is not None:
+            clock.remove_event(self._event)
+            self._event = None
+        self._callback = func
+        if func is not None:
+            period_ns = int(1e9 / self.freq())
+            self._event = clock.add_event(period_ns, self._wrap_cb,
+                                          period_ns)
+
+    def _wrapped(self):
+        """!
+        This method runs the timer's callback when the counter wraps.
+        """
+        self._callback(self)
+
+    def channel(self, channel, mode=None, pin=None, pulse_width=None,
+                pulse_width_percent=None, callback=None, polarity=None,
+                compare=None):
+        """!
+        This method sets up or returns one of the timer's channels.
+        @param channel  The channel number.
+        @param mode     The channel mode, or @c None to return the channel.
+        @param pin      The pin connected to the channel.
+        @param pulse_width          The initial pulse width in counts.
+        @param pulse_width_percent  The initial pulse width in percent.
+        @param callback The function called on channel events.
+        @param polarity The channel polarity; ignored.
+        @param compare  The initial compare value in counts.
+        @returns        The channel object.
+        """
+        if mode is None:
+            return self._channels.get(channel)
+        chan = TimerChannel(self, channel, mode, pin, callback)
+        self._channels[channel] = chan
+        if pulse_width is not None:
+            chan.pulse_width(pulse_width)
+        elif compare is not None:
+            chan.pulse_width(compare)
+        elif pulse_width_percent is not None:
+            chan.pulse_width_percent(pulse_width_percent)
+        chan.writes = 0
+        return chan
+
+    def __repr__(self):
+        """!
+        This method shows the timer's number, rate and counter.
+        """
+        return 'Timer({:d}, freq={:.1f}, counter={:d})'.format(
+            self.tim_id, self.freq(), self._count)
+
+
+# =============================================================================
+
+class USB_VCP:
+    """!
+    This class implements the USB virtual serial port. Output goes to the
+    host's standard output; input is supplied by the simulation through
+    @c feed(). All objects share the one port, as on the board.
+    """
+    ## Bytes waiting to be read by the program on the simulated board.
+    _rx = bytearray()
+
+    ## Where written bytes go; a binary stream such as @c sys.stdout.buffer.
+    tx_stream = None
+
+    def __init__(self, id=0):
+        """!
+        Creates an object for the USB virtual serial port.
+        @param id   The port number, always 0.
+        """
+        pass
+
+    @classmethod
+    def feed(cls, data):
+        """!
+        This method supplies bytes as if typed by the user on the host. It is
+        only available in simulation.
+        @param data     A @c bytes object or string to be received.
+        """
+        if isinstance(data, str):
+            data = data.encode()
+        cls._rx.extend(data)
+
+    def any(self):
+        """!
+        This method checks whether any received bytes are waiting.
+        @returns    @c True if there are bytes to read.
+        """
+        return len(USB_VCP._rx) > 0
+
+    def read(self, nbytes=None):
+        """!
+        This method reads received bytes.
+        @param nbytes   The most bytes to read, or @c None for all of them.
+        @returns        The bytes read, or @c None if none were waiting.
+        """
+        rx = USB_VCP._rx
+        if not rx:
+            return None
+        if nbytes is None:
+            nbytes = len(rx)
+        data = bytes(rx[:nbytes])
+        del rx[:nbytes]
+        return data
+
+    def readline(self):
+        """!
+        This method reads received bytes up to and including a newline.
+        @returns    The bytes read, or @c None if none were waiting.
+        """
+        rx = USB_VCP._rx
+        end = rx.find(b'\n')
+        return self.read(None if end < 0 else end + 1)
+
+    def write(self, buf):
+        """!
+        This method sends bytes to the host.
+        @param buf  A buffer such as @c bytes, @c bytearray or @c memoryview.
+        @returns    The number of bytes written.
+        """
+        stream = USB_VCP.tx_stream
+        if stream is None:
+            # Keep the order of this output and text from print()
+            sys.stdout.flush()
+            stream = sys.stdout.buffer
+        stream.write(buf)
+        return len(buf)
+
+    def isconnected(self):
+        """!
+        This method checks whether the port is connected to a host.
+        @returns    Always @c True.
+        """
+        return True
+
+    def setinterrupt(self, chr):
+        """!
+        This method sets the character which interrupts a running program;
+        it has no effect in simulation.
+        @param chr  The interrupt character, or -1 to disable it.
+        """
+        pass
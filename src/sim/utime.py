@@ -0,0 +1,101 @@
+"""!
+@file utime.py
+This file contains a host-side stand-in for the MicroPython @c utime module.
+
+@details Tick counters come from the simulation's virtual clock and wrap
+         around in the same way as on the board, so code which forgets to
+         use @c ticks_diff() fails here as it would there.
+
+@author Nishka Chawla
+@author Ronan Shaffer
+@date   18-Oct-2026
+@copyright (c) Released under GNU Public License
+"""
+
+from sim import clock as _clock
+
+## The largest tick count before the counters wrap around to zero.
+TICKS_MAX = (1 << 30) - 1
+
+## Half of the tick period, used to interpret tick differences as signed.
+TICKS_HALF = 1 << 29
+
+
+def ticks_us():
+    """!
+    This function returns the microsecond tick counter.
+    @returns    The simulated time in microseconds, modulo the tick period.
+    """
+    return (_clock.CLOCK.now_ns() // 1000) & TICKS_MAX
+
+
+def ticks_ms():
+    """!
+    This function returns the millisecond tick counter.
+    @returns    The simulated time in milliseconds, modulo the tick period.
+    """
+    return (_clock.CLOCK.now_ns() // 1000000) & TICKS_MAX
+
+
+def ticks_cpu():
+    """!
+    This function returns the highest resolution tick counter available,
+    which here counts simulated nanoseconds.
+    @returns    The simulated time in nanoseconds, modulo the tick period.
+    """
+    return _clock.CLOCK.now_ns() & TICKS_MAX
+
+
+def ticks_diff(ticks1, ticks2):
+    """!
+    This function finds the signed difference between two tick counts,
+    allowing for wraparound.
+    @param ticks1   The later tick count.
+    @param ticks2   The earlier tick count.
+    @returns        @c ticks1 minus @c ticks2 as a signed number.
+    """
+    return ((ticks1 - ticks2 + TICKS_HALF) & TICKS_MAX) - TICKS_HALF
+
+
+def ticks_add(ticks, delta):
+    """!
+    This function offsets a tick count by a signed amount, allowing for
+    wraparound.
+    @param ticks    A tick count.
+    @param delta    The amount to add, which may be negative.
+    @returns        The new tick count.
+    """
+    return (ticks + delta) & TICKS_MAX
+
+
+def sleep(seconds):
+    """!
+    This function waits for the given number of simulated seconds.
+    @param seconds  The time to wait, as an @c int or @c float.
+    """
+    _clock.CLOCK.advance(int(seconds * 1000000000))
+
+
+def sleep_ms(ms):
+    """!
+    This function waits for the given number of simulated milliseconds.
+    @param ms   The time to wait.
+    """
+    _clock.CLOCK.advance(int(ms) * 1000000)
+
+
+def sleep_us(us):
+    """!
+    This function waits for the given number of simulated microseconds.
+    @param us   The time to wait.
+    """
+    _clock.CLOCK.advance(int(us) * 1000)
+
+
+def time():
+    """!
+    This function returns the number of whole simulated seconds since the
+    simulation started.
+    @returns    The simulated time in seconds.
+    """
+    return _clock.CLOCK.now_ns() // 1000000000
@@ -0,0 +1,523 @@
+"""!
+@file stream_ingest.py
+This file contains a PC program which captures binary telemetry from the
+Nucleo continuously and plots it while it arrives.
+
+@details A background thread reads the serial port in large blocks and
+         decodes whole runs of telemetry frames at once with NumPy, storing
+         each task's samples in a ring buffer which was allocated at
+         startup. The plot is redrawn from copies of the ring buffers at a
+         fixed frame rate, so drawing never holds up capture. Any object with
+         a @c read() method can stand in for the serial port, such as a
+         @c ReplayPort which plays back a recorded capture file, or a
+         @c serial.Serial opened on one end of a pseudo-terminal.
+
+         Examples:
+         @code
+         python stream_ingest.py --port COM11 --start --kp 0.1 --kp 0.1
+         python stream_ingest.py --port /dev/ttyACM0 --record run1.bin
+         python stream_ingest.py --replay run1.bin --rate 100000 --no-plot
+         @endcode
+
+@author Nishka Chawla
+@author Ronan Shaffer
+@date   18-Oct-2026
+@copyright (c) Released under GNU Public License
+"""
+
+import argparse
+import threading
+import time
+
+import numpy as np
+
+import telemetry
+
+## NumPy layout of one telemetry frame, matching @c telemetry.FRAME_FORMAT.
+FRAME_DTYPE = np.dtype([('sync', '<u2'), ('task_id', 'u1'),
+                        ('timestamp', '<u4'), ('position', '<i4'),
+                        ('velocity', '<i4'), ('duty', 'i1'), ('seq', '<u2')])
+
+## NumPy layout of one sample stored in a ring buffer.
+SAMPLE_DTYPE = np.dtype([('time', '<i8'), ('position', '<i4'),
+                         ('velocity', '<i4'), ('duty', 'i1')])
+
+
+class BlockDecoder:
+    """!
+    This class decodes telemetry frames from a byte stream a block at a
+    time. Runs of frames which follow each other without gaps are decoded
+    with one NumPy operation; the decoder only looks at single bytes when
+    it has to find the next sync word after a damaged frame.
+    """
+
+    def __init__(self):
+        """!
+        Creates a decoder with nothing buffered.
+        """
+        ## Bytes received which haven't been decoded yet.
+        self._pending = b''
+
+        ## The number of bytes skipped while looking for a sync word.
+        self.skipped_bytes = 0
+
+        ## The number of frames which the sequence numbers show were lost.
+        self.lost_frames = 0
+
+        ## The number of frames decoded.
+        self.frames = 0
+
+        ## The last raw timestamp, unwrap offset and sequence number seen
+        #  from each task.
+        self._last = {}
+
+    def feed(self, data):
+        """!
+        This method decodes the frames completed by a block of bytes. As in
+        @c telemetry.FrameDecoder, a frame is only accepted once the sync
+        word of the frame after it has arrived, so the newest frame waits
+        for the next block or for @c flush().
+        @param data     Bytes from the serial port, in any amount.
+        @returns        A dictionary which maps each task number to a
+                        @c SAMPLE_DTYPE array of its new samples.
+        """
+        return self._decode(self._pending + bytes(data), False)
+
+    def flush(self):
+        """!
+        This method decodes the frames left at the end of the stream, which
+        aren't followed by another frame's sync word.
+        @returns        A dictionary as returned by @c feed().
+        """
+        return self._decode(self._pending, True)
+
+    def _decode(self, buf, final):
+        """!
+        This method decodes the frames in a buffer and keeps the bytes after
+        the last frame for next time.
+        @param buf      The bytes to be decoded.
+        @param final    @c True if no more bytes will follow.
+        @returns        A dictionary as returned by @c feed().
+        """
+        size = telemetry.FRAME_SIZE
+        sync = telemetry.SYNC_BYTES
+        runs = []
+        pos = 0
+        while len(buf) - pos >= size + (0 if final else 2):
+            if buf[pos:pos + 2] != sync:
+                found = buf.find(sync, pos + 1)
+                if found < 0:
+                    found = len(buf) - 1
+                self.skipped_bytes += found - pos
+                pos = found
+                continue
+
+            # Decode every frame from here on whose successor's sync word
+            # has arrived, then keep those before the first one which doesn't
+            # start with a sync word or isn't followed by one
+            count = (len(buf) - pos - (0 if final else 2)) // size
+            frames = np.frombuffer(buf, FRAME_DTYPE, count, pos)
+            ok = frames['sync'] == telemetry.SYNC
+            after = pos + count * size
+            next_ok = buf[after:after + 2] == sync or (final
+                                                      and after >= len(buf))
+            ok[:-1] &= ok[1:]
+            ok[-1] &= next_ok
+            bad = np.flatnonzero(~ok)
+            good = bad[0] if len(bad) else count
+            runs.append(frames[:good])
+            pos += good * size
+            if good < count:
+                self.skipped_bytes += 1
+                pos += 1
+        if final:
+            self.skipped_bytes += len(buf) - pos
+            pos = len(buf)
+        self._pending = buf[pos:]
+
+        runs = [run for run in runs if len(run)]
+        if not runs:
+            return {}
+        frames = np.concatenate(runs) if len(runs) > 1 else runs[0]
+        self.frames += len(frames)
+        return {int(task_id): self._samples(frames[frames['task_id']
+                                                   == task_id], int(task_id))
+                for task_id in np.unique(frames['task_id'])}
+
+    def _samples(self, frames, task_id):
+        """!
+        This method unwraps the timestamps of one task's frames and counts
+        the frames which its sequence numbers show were lost.
+        @param frames   The task's frames, in the order received.
+        @param task_id  The task number.
+        @returns        A @c SAMPLE_DTYPE array of the samples.
+        """
+        stamps = frames['timestamp'].astype(np.int64)
+        seqs = frames['seq'].astype(np.int64)
+        last_stamp, offset, last_seq = self._last.get(task_id,
+                                                      (stamps[0], 0, None))
+
+        # Each time the stamp goes backward, the board's ticks wrapped
+        steps = np.diff(stamps, prepend=last_stamp)
+        wraps = np.cumsum(steps < 0) * telemetry.TICKS_PERIOD
+        times = stamps + offset + wraps
+
+        if last_seq is not None:
+            gaps = (np.diff(seqs, prepend=last_seq) - 1) & 0xFFFF
+        else:
+            gaps = (np.diff(seqs) - 1) & 0xFFFF
+        self.lost_frames += int(gaps.sum())
+        self._last[task_id] = (stamps[-1], offset + int(wraps[-1]),
+                               int(seqs[-1]))
+
+        samples = np.empty(len(frames), SAMPLE_DTYPE)
+        samples['time'] = times
+        samples['position'] = frames['position']
+        samples['velocity'] = frames['velocity']
+        samples['duty'] = frames['duty']
+        return samples
+
+
+class TelemetryRing:
+    """!
+    This class holds the most recent samples from one task in a ring buffer
+    which is allocated once. Samples are written by the capture thread and
+    copied out by the plotting thread, so both sides use a lock.
+    """
+
+    def __init__(self, capacity):
+        """!
+        Creates an empty ring buffer.
+        @param capacity     The number of samples which the ring holds.
+        """
+        ## The number of samples which the ring holds.
+        self.capacity = capacity
+
+        ## The samples, oldest overwritten first.
+        self._data = np.zeros(capacity, SAMPLE_DTYPE)
+
+        ## The total number of samples ever written.
+        self.written = 0
+
+        self._lock = threading.Lock()
+
+    def write(self, samples):
+        """!
+        This method adds samples to the ring, overwriting the oldest ones,
+        with at most two slice copies.
+        @param samples      A @c SAMPLE_DTYPE array.
+        """
+        if len(samples) > self.capacity:
+            skipped = len(samples) - self.capacity
+            samples = samples[skipped:]
+        else:
+            skipped = 0
+        with self._lock:
+            start = (self.written + skipped) % self.capacity
+            first = min(len(samples), self.capacity - start)
+            self._data[start:start + first] = samples[:first]
+            self._data[:len(samples) - first] = samples[first:]
+            self.written += skipped + len(samples)
+
+    def snapshot(self, last=None):
+        """!
+        This method copies out the samples in the ring, oldest first.
+        @param last     The most samples to copy, or @c None for all.
+        @returns        A @c SAMPLE_DTYPE array.
+        """
+        with self._lock:
+            count = min(self.written, self.capacity)
+            if last is not None:
+                count = min(count, last)
+            end = self.written % self.capacity
+            index = np.arange(end - count, end) % self.capacity
+            return self._data[index]
+
+
+class ReplayPort:
+    """!
+    This class plays back recorded bytes as if they were arriving at a
+    serial port, optionally at a limited rate. It lets the ingest code be
+    tested without a board.
+    """
+
+    def __init__(self, source, rate=None):
+        """!
+        Creates a replay port.
+        @param source   A capture file name or a @c bytes object.
+        @param rate     The rate at which bytes arrive in bytes per second, or
+                        @c None to make all of them available at once.
+        """
+        if isinstance(source, (bytes, bytearray)):
+            self._data = bytes(source)
+        else:
+            with open(source, 'rb') as file:
+                self._data = file.read()
+        self._pos = 0
+        self._rate = rate
+        self._t0 = time.perf_counter()
+
+    @property
+    def in_waiting(self):
+        """!
+        The number of bytes which have arrived but haven't been read.
+        """
+        if self._rate is None:
+            arrived = len(self._data)
+        else:
+            arrived = int((time.perf_counter() - self._t0) * self._rate)
+        return max(min(arrived, len(self._data)) - self._pos, 0)
+
+    def read(self, size=1):
+        """!
+        This method reads bytes which have arrived, waiting briefly for more
+        if none have.
+        @param size     The most bytes to read.
+        @returns        The bytes read, which are empty at the end of the data.
+        """
+        if self._pos >= len(self._data):
+            return b''
+        if self.in_waiting == 0:
+            time.sleep(0.001)
+        size = min(size, max(self.in_waiting, 0))
+        data = self._data[self._pos:self._pos + size]
+        self._pos += len(data)
+        return data
+
+    def at_end(self):
+        """!
+        This method checks whether all the data has been read.
+        @returns    @c True at the end of the data.
+        """
+        return self._pos >= len(self._data)
+
+    def close(self):
+        """!
+        This method does nothing; it is here so a replay port can be used
+        wherever a serial port is.
+        """
+        pass
+
+
+class StreamIngest:
+    """!
+    This class reads telemetry from a port on a background thread and stores
+    the samples in a ring buffer for each task.
+    """
+
+    def __init__(self, port, capacity=200000, chunk_size=65536, record=None):
+        """!
+        Creates an ingest object; call @c start() to begin capturing.
+        @param port         A serial port or other object with @c read().
+        @param capacity     The number of samples kept for each task.
+        @param chunk_size   The most bytes read from the port at once.
+        @param record       A binary file to which every byte read is saved,
+                            or @c None.
+        """
+        ## The port from which telemetry is read.
+        self.port = port
+
+        ## The number of samples kept for each task.
+        self.capacity = capacity
+
+        ## The most bytes read from the port at once.
+        self.chunk_size = chunk_size
+
+        ## The decoder which turns bytes into samples.
+        self.decoder = BlockDecoder()
+
+        ## The ring buffer of samples for each task number.
+        self.rings = {}
+
+        ## The number of bytes read.
+        self.bytes_read = 0
+
+        self._record = record
+        self._running = False
+        self._thread = None
+        self._t_start = None
+
+    def start(self):
+        """!
+        This method starts the capture thread.
+        """
+        self._running = True
+        self._t_start = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """!
+        This method stops the capture thread and waits for it to finish.
+        """
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+
+    def running(self):
+        """!
+        This method checks whether the capture thread is still reading.
+        @returns    @c True while capturing.
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def ring(self, task_id):
+        """!
+        This method returns the ring buffer for a task, creating it the first
+        time that task is seen.
+        @param task_id  The task number.
+        @returns        The task's @c TelemetryRing.
+        """
+        ring = self.rings.get(task_id)
+        if ring is None:
+            ring = self.rings[task_id] = TelemetryRing(self.capacity)
+        return ring
+
+    def _run(self):
+        """!
+        This method is the capture thread. It reads whatever has arrived, up
+        to a chunk at a time, and stores the decoded samples.
+        """
+        port = self.port
+        while self._running:
+            waiting = getattr(port, 'in_waiting', self.chunk_size)
+            data = port.read(min(max(waiting, 1), self.chunk_size))
+            if not data:
+                if getattr(port, 'at_end', lambda: False)():
+                    self._store(self.decoder.flush())
+                    break
+                continue
+            self.bytes_read += len(data)
+            if self._record is not None:
+                self._record.write(data)
+            self._store(self.decoder.feed(data))
+        self._running = False
+
+    def _store(self, blocks):
+        """!
+        This method adds decoded samples to the tasks' ring buffers.
+        @param blocks   A dictionary from @c BlockDecoder.feed().
+        """
+        for task_id, samples in blocks.items():
+            self.ring(task_id).write(samples)
+
+    def stats(self):
+        """!
+        This method summarizes how capture is going.
+        @returns    A one-line string of byte, frame and loss counts.
+        """
+        elapsed = time.perf_counter() - self._t_start if self._t_start else 0
+        rate = self.bytes_read / elapsed if elapsed > 0 else 0.0
+        return '{:d} bytes ({:.0f} bytes/s), {:d} frames, {:d} lost, ' \
+            '{:d} bytes skipped'.format(self.bytes_read, rate,
+                                        self.decoder.frames,
+                                        self.decoder.lost_frames,
+                                        self.decoder.skipped_bytes)
+
+
+def live_plot(ingest, fps=20, window=5.0):
+    """!
+    This function plots the position of each task's motor against time,
+    redrawing at a fixed frame rate until the plot window is closed.
+    @param ingest   The @c StreamIngest which is capturing.
+    @param fps      The number of redraws per second.
+    @param window   The length of time shown, in seconds.
+    """
+    from matplotlib import pyplot
+    from matplotlib.animation import FuncAnimation
+
+    fig, axes = pyplot.subplots()
+    axes.set_xlabel('Time [s]')
+    axes.set_ylabel('Position [ticks]')
+    lines = {}
+
+    def redraw(frame_num):
+        """!
+        Redraws the plot from copies of the ring buffers.
+        @param frame_num    The animation frame number; unused.
+        """
+        for task_id, ring in list(ingest.rings.items()):
+            samples = ring.snapshot()
+            if len(samples) == 0:
+                continue
+            t = samples['time'] / 1e6
+            keep = t >= t[-1] - window
+            if task_id not in lines:
+                lines[task_id], = axes.plot([], [],
+                                            label='Task {:d}'.format(task_id))
+                axes.legend(loc='upper left')
+            lines[task_id].set_data(t[keep], samples['position'][keep])
+        axes.relim()
+        axes.autoscale_view()
+        axes.set_title(ingest.stats())
+        return list(lines.values())
+
+    animation = FuncAnimation(fig, redraw, interval=1000 / fps,
+                              cache_frame_data=False)
+    pyplot.show()
+    return animation
+
+
+def main(argv=None):
+    """!
+    This function reads the command line, then captures and plots.
+    @param argv     The command line arguments, or @c None for @c sys.argv.
+    """
+    parser = argparse.ArgumentParser(
+        description='Capture and plot binary telemetry from the Nucleo.')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--port', help='serial port, such as COM11')
+    source.add_argument('--replay', help='capture file to play back')
+    parser.add_argument('--baud', type=int, default=1000000)
+    parser.add_argument('--rate', type=float, default=None,
+                        help='replay rate in bytes per second')
+    parser.add_argument('--record', help='file in which to save raw bytes')
+    parser.add_argument('--start', action='store_true',
+                        help='restart main.py on the board first')
+    parser.add_argument('--kp', action='append', default=[],
+                        help='gain sent to each Kp prompt after --start')
+    parser.add_argument('--capacity', type=int, default=200000)
+    parser.add_argument('--fps', type=float, default=20.0)
+    parser.add_argument('--window', type=float, default=5.0)
+    parser.add_argument('--duration', type=float, default=None,
+                        help='seconds to capture without plotting')
+    parser.add_argument('--no-plot', action='store_true')
+    args = parser.parse_args(argv)
+
+    if args.replay:
+        port = ReplayPort(args.replay, args.rate)
+    else:
+        import serial
+        port = serial.Serial(args.port, args.baud, timeout=0.05)
+        if args.start:
+            port.write(b'\x03')                 # Ctrl-C stops the program
+            port.write(b'\x04')                 # Ctrl-D restarts main.py
+            time.sleep(0.5)
+            for kp in args.kp:
+                port.write(kp.encode() + b'\r')
+
+    record = open(args.record, 'wb') if args.record else None
+    ingest = StreamIngest(port, capacity=args.capacity, record=record)
+    ingest.start()
+    try:
+        if args.no_plot or args.duration is not None:
+            t_end = None if args.duration is None \
+                else time.perf_counter() + args.duration
+            while ingest.running() and (t_end is None
+                                        or time.perf_counter() < t_end):
+                time.sleep(0.5)
+                print(ingest.stats())
+        else:
+            live_plot(ingest, args.fps, args.window)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ingest.stop()
+        port.close()
+        if record is not None:
+            record.close()
+    print(ingest.stats())
+
+
+if __name__ == '__main__':
+    main()
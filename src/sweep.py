@@ -0,0 +1,313 @@
+"""!
+@file sweep.py
+This file finds good controller settings by simulating step responses over a
+grid of proportional gains, saturation limits and task periods.
+
+@details Each point of the grid is simulated on the host against the motor
+         model in @c sim.plant, and its step response is measured for rise
+         time (10% to 90%), overshoot, settling time (into a band around the
+         setpoint, 2% by default) and steady-state error. The points are
+         shared out among a @c multiprocessing pool, so a sweep uses every
+         core of the PC. The results are written to a CSV table and the best
+         points are printed:
+         @code
+         python sweep.py --kp 0.02:0.5:25 --sat 50 100 --period 10 20 30 40
+         @endcode
+         Two engines are available. The default @c stack engine runs the
+         same code as the board for each point: a @c cotask task running
+         @c ClosedLoop with the @c EncoderDriver and @c MotorDriver on the
+         simulated timers. The @c batch engine runs many points together with
+         @c sim.plant.simulate_steps(), which is much faster but leaves out
+         the scheduler and drivers. Both engines step the motor model with
+         the same time step, @c PLANT_STEP_US by default, and then give the
+         same results; with different steps they can differ by hundreds of
+         milliseconds of settling time, since the model's friction stops
+         the motor only at the end of a step.
+
+@author Nishka Chawla
+@author Ronan Shaffer
+@date   18-Oct-2026
+@copyright (c) Released under GNU Public License
+"""
+
+import argparse
+import csv
+import itertools
+import math
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+import sim
+from sim import plant
+
+## The names of the step-response measurements, in table order.
+METRICS = ('rise_ms', 'overshoot_pct', 'settling_ms', 'ss_error')
+
+## The names of the columns in the results table.
+COLUMNS = ('Kp', 'sat', 'period_ms') + METRICS
+
+## The time step of the motor model in microseconds, used by both engines.
+PLANT_STEP_US = 200
+
+
+def step_metrics(times, position, setpoint, band=0.02):
+    """!
+    This function measures step responses which start at zero.
+    @param times        The sample times in seconds, from the step.
+    @param position     The encoder positions, with one row per response.
+    @param setpoint     The setpoint of each response.
+    @param band         The settling band as a fraction of the setpoint.
+    @returns            A tuple of arrays of rise time and settling time in
+                        milliseconds, overshoot in percent of the setpoint and
+                        steady-state error in counts, one value per response.
+                        Times are NaN if the response never gets there.
+    """
+    times = np.asarray(times, float)
+    pos = np.atleast_2d(np.asarray(position, float))
+    target = np.broadcast_to(np.asarray(setpoint, float),
+                             (pos.shape[0],))[:, None]
+    frac = pos / target
+
+    def first(mask):
+        found = np.where(mask.any(axis=1), times[mask.argmax(axis=1)], np.nan)
+        return found * 1000
+
+    rise = first(frac >= 0.9) - first(frac >= 0.1)
+    overshoot = np.maximum(frac.max(axis=1) - 1.0, 0.0) * 100
+
+    outside = np.abs(pos - target) > band * np.abs(target)
+    last = pos.shape[1] - 1 - outside[:, ::-1].argmax(axis=1)
+    settled = times[np.minimum(last + 1, pos.shape[1] - 1)] * 1000
+    settling = np.where(~outside.any(axis=1), times[0] * 1000,
+                        np.where(outside[:, -1], np.nan, settled))
+
+    error = target[:, 0] - pos[:, -1]
+    return rise, overshoot, settling, error
+
+
+def run_stack(Kp, sat, period_ms, setpoint=16384, duration=2.0, sample_ms=1,
+              plant_step_us=PLANT_STEP_US):
+    """!
+    This function simulates one step response with the board's code: a
+    @c cotask task runs @c ClosedLoop on the encoder and motor drivers, and
+    the motor model runs the simulated timers.
+    @param Kp           The proportional gain.
+    @param sat          The saturation limit on the duty cycle, used in both
+                        directions.
+    @param period_ms    The task period in milliseconds.
+    @param setpoint     The setpoint in encoder counts.
+    @param duration     The length of the response in seconds.
+    @param sample_ms    The time between samples in milliseconds.
+    @param plant_step_us The time step of the motor model in microseconds.
+    @returns            A tuple of the sample times in seconds, from the
+                        task's first run, and the sampled positions.
+    """
+    clock = sim.install()
+    import cotask
+    import pyb
+    from closedloopcontrol import ClosedLoop
+    from encoder_chawla_shaffer import EncoderDriver
+    from motor_chawla_shaffer import MotorDriver
+
+    motors = plant.MotorPlant(1)
+    motors.connect(((3, 8),), plant_step_us)
+    cpu = pyb.Pin.cpu
+    out = pyb.Pin.OUT_PP
+    motor = MotorDriver(pyb.Pin(cpu.A10, out), pyb.Pin(cpu.B4, out),
+                        pyb.Pin(cpu.B5, out), 3)
+    encoder = EncoderDriver(pyb.Pin(cpu.C6, pyb.Pin.IN),
+                            pyb.Pin(cpu.C7, pyb.Pin.IN), 8)
+    controller = ClosedLoop(setpoint, Kp, sat, -sat)
+
+    num_samples = int(round(duration * 1000 / sample_ms))
+    position = np.zeros(num_samples, np.int32)
+    taken = [0]
+
+    def sample():
+        if taken[0] < num_samples:
+            position[taken[0]] = motors.count[0]
+            taken[0] += 1
+
+    def control():
+        # Sampling starts with the step, at the task's first run
+        clock.add_event(0, sample, int(sample_ms * 1000000))
+        while True:
+            encoder.update()
+            motor.set_duty_cycle(controller.run(setpoint, encoder.read()))
+            yield 0
+
+    tasks = cotask.TaskList()
+    tasks.append(cotask.Task(control, name='Control', priority=1,
+                             period=period_ms))
+    while taken[0] < num_samples:
+        tasks.pri_sched()
+        tasks.idle()
+    motors.disconnect()
+    return np.arange(num_samples) * (sample_ms / 1000), position
+
+
+def _stack_point(job):
+    """!
+    This function simulates and measures one point in a worker process.
+    @param job      A tuple of the point (Kp, sat, period_ms), the keyword
+                    arguments for @c run_stack() and the settling band.
+    @returns        A row of the results table.
+    """
+    point, kwargs, band = job
+    times, position = run_stack(*point, **kwargs)
+    metrics = step_metrics(times, position, kwargs['setpoint'], band)
+    return point + tuple(float(value[0]) for value in metrics)
+
+
+def _batch_points(job):
+    """!
+    This function simulates and measures a chunk of points together in a
+    worker process.
+    @param job      A tuple of the list of points, the keyword arguments for
+                    @c simulate_steps() and the settling band.
+    @returns        A list of rows of the results table.
+    """
+    points, kwargs, band = job
+    kwargs = dict(kwargs)
+    dt = kwargs.pop('plant_step_us') / 1e6
+    Kp, sat, period_ms = (np.array(column, float) for column in zip(*points))
+    times, position, _ = plant.simulate_steps(Kp, period_ms / 1000, sat, -sat,
+                                              dt=dt, **kwargs)
+    metrics = step_metrics(times, position, kwargs['setpoint'], band)
+    return [point + tuple(float(value[n]) for value in metrics)
+            for n, point in enumerate(points)]
+
+
+def sweep(kps, sats, periods, engine='stack', processes=None, setpoint=16384,
+          duration=2.0, band=0.02, plant_step_us=PLANT_STEP_US):
+    """!
+    This function simulates and measures every combination of the given
+    gains, limits and periods, in parallel.
+    @param kps          The proportional gains.
+    @param sats         The saturation limits.
+    @param periods      The task periods in milliseconds.
+    @param engine       @c 'stack' to run the board's code for each point, or
+                        @c 'batch' to run @c simulate_steps().
+    @param processes    The number of worker processes, or @c None for one
+                        per core.
+    @param setpoint     The setpoint in encoder counts.
+    @param duration     The length of each response in seconds.
+    @param band         The settling band as a fraction of the setpoint.
+    @param plant_step_us The time step of the motor model in microseconds.
+    @returns            A list of rows with the values named in @c COLUMNS.
+    """
+    points = [tuple(float(value) for value in point)
+              for point in itertools.product(kps, sats, periods)]
+    kwargs = {'setpoint': setpoint, 'duration': duration,
+              'plant_step_us': plant_step_us}
+    processes = processes or os.cpu_count() or 1
+    with multiprocessing.Pool(processes) as pool:
+        if engine == 'stack':
+            return pool.map(_stack_point,
+                            [(point, kwargs, band) for point in points],
+                            chunksize=1)
+        # A few chunks per process keeps the work even without losing the
+        # speed of stepping many runs together
+        size = max(1, math.ceil(len(points) / (4 * processes)))
+        jobs = [(points[n:n + size], kwargs, band)
+                for n in range(0, len(points), size)]
+        return [row for rows in pool.map(_batch_points, jobs)
+                for row in rows]
+
+
+def write_table(rows, path):
+    """!
+    This function writes the results of a sweep to a CSV file.
+    @param rows     Rows as returned by @c sweep().
+    @param path     The name of the file.
+    """
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(COLUMNS)
+        for row in rows:
+            writer.writerow(['{:g}'.format(value) for value in row])
+
+
+def best(rows, count=10):
+    """!
+    This function sorts the results of a sweep with the best point first:
+    the quickest to settle, then the smallest overshoot. Points which never
+    settle come last.
+    @param rows     Rows as returned by @c sweep().
+    @param count    The number of rows to return.
+    @returns        A list of the best rows.
+    """
+    def key(row):
+        settling = row[COLUMNS.index('settling_ms')]
+        return (math.isnan(settling), settling,
+                row[COLUMNS.index('overshoot_pct')])
+    return sorted(rows, key=key)[:count]
+
+
+def _values(text):
+    """!
+    This function reads a list of values for one axis of the grid from the
+    command line, given either as numbers or as @c start:stop:count.
+    @param text     The command line word.
+    @returns        A list of values.
+    """
+    if ':' in text:
+        start, stop, count = text.split(':')
+        return list(np.linspace(float(start), float(stop), int(count)))
+    return [float(text)]
+
+
+def main(argv=None):
+    """!
+    This function reads the command line, runs the sweep and reports it.
+    @param argv     The command line arguments, or @c None to use @c sys.argv.
+    """
+    parser = argparse.ArgumentParser(
+        description='Sweep step responses over gain, saturation and period.')
+    parser.add_argument('--kp', nargs='+', default=['0.02:0.5:25'],
+                        help='gains, as values or start:stop:count')
+    parser.add_argument('--sat', nargs='+', default=['100'],
+                        help='saturation limits in percent duty')
+    parser.add_argument('--period', nargs='+', default=['10', '20', '30', '40'],
+                        help='task periods in milliseconds')
+    parser.add_argument('--engine', choices=('stack', 'batch'),
+                        default='stack', help='how each point is simulated')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='worker processes (default: one per core)')
+    parser.add_argument('--setpoint', type=int, default=16384,
+                        help='step size in encoder counts')
+    parser.add_argument('--duration', type=float, default=2.0,
+                        help='length of each response in seconds')
+    parser.add_argument('--band', type=float, default=0.02,
+                        help='settling band as a fraction of the setpoint')
+    parser.add_argument('--plant-step-us', type=int, default=PLANT_STEP_US,
+                        help='time step of the motor model in microseconds')
+    parser.add_argument('--out', default='sweep.csv',
+                        help='CSV file for the results table')
+    parser.add_argument('--show', type=int, default=10,
+                        help='number of best points to print')
+    args = parser.parse_args(argv)
+
+    grids = [[value for word in words for value in _values(word)]
+             for words in (args.kp, args.sat, args.period)]
+    start = time.perf_counter()
+    rows = sweep(*grids, engine=args.engine, processes=args.processes,
+                 setpoint=args.setpoint, duration=args.duration,
+                 band=args.band, plant_step_us=args.plant_step_us)
+    wall = time.perf_counter() - start
+    write_table(rows, args.out)
+
+    print('{:d} points in {:.1f} s, written to {:s}'.format(
+        len(rows), wall, args.out))
+    print('{:>8s}{:>6s}{:>8s}{:>9s}{:>11s}{:>10s}{:>10s}'.format(
+        'KP', 'SAT', 'PERIOD', 'RISE', 'OVERSHOOT', 'SETTLING', 'SS ERR'))
+    for row in best(rows, args.show):
+        print('{:8.3f}{:6.0f}{:8.1f}{:9.1f}{:10.1f}%{:10.1f}{:10.0f}'.format(
+            *row))
+
+
+if __name__ == '__main__':
+    main()
@@ -47,7 +47,7 @@ class BaseShare:
     
     One should never create an object from this class; it doesn't do anything
     useful. It exists to implement things which are common between its child
-    classes @c Queue and @c Share. 
+    classes @c Queue, @c SPSCQueue and @c Share. 
     """
 
     def __init__ (self, type_code, thread_protect = True, name = None):
@@ -59,10 +59,58 @@ class BaseShare:
         self._type_code = type_code
         self._thread_protect = thread_protect
 
+        ## The tasks which are made ready to run when data is put in
+        self._subscribers = ()
+
         # Add this queue to the global share and queue list
         share_list.append (self)
 
 
+    def subscribe (self, task):
+        """!
+        Have a task made ready to run whenever data is put into this queue
+        or share, so that the task doesn't need to check for data on a
+        timer. The task is usually created without a period, and it should
+        read everything which is waiting each time it runs:
+        @code
+        |   def consumer ():
+        |       while True:
+        |           while my_queue.any ():
+        |               use (my_queue.get ())
+        |           yield 0
+        |
+        |   consumer_task = cotask.Task (consumer, name = 'Consumer')
+        |   my_queue.subscribe (consumer_task)
+        @endcode
+        @param task The @c cotask.Task which is to be run when data arrives
+        """
+        if task not in self._subscribers:
+            self._subscribers = self._subscribers + (task,)
+
+
+    def unsubscribe (self, task):
+        """!
+        Stop making a task ready to run when data is put into this queue or
+        share.
+        @param task A task which was given to @c subscribe()
+        """
+        self._subscribers = tuple ([sub for sub in self._subscribers
+                                    if sub is not task])
+
+
+    @micropython.native
+    def _notify (self):
+        """!
+        Make the subscribed tasks ready to run after data has been put in.
+        A task which is already waiting to run isn't told again, so many
+        puts before the task gets to run only wake it once. Nothing is
+        allocated, so this can be done from an interrupt service routine.
+        """
+        for task in self._subscribers:
+            if not task.go_flag:
+                task.go ()
+
+
 # ============================================================================
 
 class Queue (BaseShare):
@@ -134,6 +182,10 @@ class Queue (BaseShare):
         # Allocate memory in which the queue's data will be stored
         try:
             self._buffer = array.array (type_code, range (size))
+        except OverflowError:
+            # CPython, as used by the simulator, won't wrap values which are
+            # too big for the type as MicroPython does
+            self._buffer = array.array (type_code, [0] * size)
         except MemoryError:
             self._buffer = None
             raise
@@ -141,6 +193,9 @@ class Queue (BaseShare):
             self._buffer = None
             raise
 
+        ## The size of one item in bytes
+        self._item_size = len (bytes (array.array (type_code, [0])))
+
         # Initialize pointers to be used for reading and writing data
         self.clear ()
 
@@ -168,14 +223,19 @@ class Queue (BaseShare):
         |               my_queue.put (create_something_to_put ())
         |           yield 0
         @endcode
+        An ISR must never wait, so a call from an ISR tries to put the item
+        and drops it if the queue is full.
         @param item The item to be placed into the queue
         @param in_ISR Set this to @c True if calling from within an ISR
+        @return @c True if the item was put into the queue, @c False if it
+                was dropped
         """
         # If we're in an ISR and the queue is full and we're not allowed to
         # overwrite data, we have to give up and exit
         if self.full ():
             if in_ISR:
-                return
+                self._num_dropped += 1
+                return False
 
             # Wait (if needed) until there's room in the buffer for the data
             if not self._overwrite:
@@ -186,14 +246,18 @@ class Queue (BaseShare):
         if self._thread_protect and not in_ISR:
             _irq_state = pyb.disable_irq ()
 
-        # Write the data and advance the counts and pointers
+        # Write the data and advance the counts and pointers. If the queue
+        # was full, the oldest item has just been overwritten, so the read
+        # pointer moves past it
         self._buffer[self._wr_idx] = item
         self._wr_idx += 1
         if self._wr_idx >= self._size:
             self._wr_idx = 0
-        self._num_items += 1
         if self._num_items >= self._size:        # Can't be fuller than full
-            self._num_items = self._size
+            self._num_dropped += 1
+            self._rd_idx = self._wr_idx
+        else:
+            self._num_items += 1
         if self._num_items > self._max_full:     # Record maximum fillage
             self._max_full = self._num_items
 
@@ -201,6 +265,11 @@ class Queue (BaseShare):
         if self._thread_protect and not in_ISR:
             pyb.enable_irq (_irq_state)
 
+        # Wake up the tasks which are waiting for data
+        if self._subscribers:
+            self._notify ()
+        return True
+
 
     @micropython.native
     def get (self, in_ISR = False):
@@ -221,9 +290,15 @@ class Queue (BaseShare):
         |           # More loop stuff
         |           yield 0
         @endcode
+        A call from an ISR doesn't wait; it returns @c None if the queue is
+        empty.
         @param in_ISR Set this to @c True if calling from within an ISR
+        @return The item read from the queue, or @c None if called from an
+                ISR while the queue is empty
         """
         # Wait until there's something in the queue to be returned
+        if in_ISR and self.empty ():
+            return None
         while self.empty ():
             pass
 
@@ -249,6 +324,142 @@ class Queue (BaseShare):
         return (to_return)
 
 
+    @micropython.native
+    def put_many (self, items, in_ISR = False):
+        """!
+        Put a block of items into the queue at once.
+
+        Unlike @c put(), this method never waits. If there isn't room for all
+        the items, as many as fit are put into the queue and the rest are
+        dropped, unless the @c overwrite constructor parameter was set to
+        @c True, in which case the oldest data is overwritten. Interrupts are
+        disabled once for the whole block. The items are copied one at a time
+        by index rather than with slice copies, which would need views, so
+        nothing is allocated and a task can send a record packed into a
+        buffer which it made once at startup. Items may come from any
+        iterable, such as a @c bytearray, an @c array.array or a list, and
+        are converted to the queue's type as by @c put().
+        @code
+        |   sent = my_queue.put_many (record)
+        |   if sent < len (record):
+        |       pass                    # The queue was too full for all of it
+        @endcode
+        @param items A buffer or other iterable holding the items to be put
+               into the queue
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return The number of items accepted. This is less than the number
+                given only if the queue doesn't overwrite and was too full;
+                items which are dropped or overwritten are counted in the
+                queue's diagnostic printout
+        """
+        if self._thread_protect and not in_ISR:
+            irq_state = pyb.disable_irq ()
+        try:
+            size = self._size
+            buf = self._buffer
+            overwrite = self._overwrite
+            wr_idx = self._wr_idx
+            num_items = self._num_items
+            count = 0
+            dropped = 0
+            for item in items:
+                if num_items >= size:
+                    dropped += 1
+                    if not overwrite:
+                        continue
+                    num_items -= 1          # The oldest item is overwritten
+                buf[wr_idx] = item
+                wr_idx += 1
+                if wr_idx >= size:
+                    wr_idx = 0
+                num_items += 1
+                count += 1
+
+            # If anything was overwritten, the queue is full and its oldest
+            # item is the one after the newest
+            self._wr_idx = wr_idx
+            if dropped > 0:
+                self._num_dropped += dropped
+                if overwrite:
+                    self._rd_idx = wr_idx
+            self._num_items = num_items
+            if num_items > self._max_full:
+                self._max_full = num_items
+        finally:
+            if self._thread_protect and not in_ISR:
+                pyb.enable_irq (irq_state)
+
+        if count > 0 and self._subscribers:
+            self._notify ()
+        return count
+
+
+    @micropython.native
+    def get_into (self, buf, in_ISR = False):
+        """!
+        Read as many items as are available, up to the size of a buffer, into
+        that buffer.
+
+        This method doesn't wait for data; if the queue is empty, it returns
+        zero. The buffer may be a @c bytearray, an @c array.array or a
+        @c memoryview of part of one, and should hold items of a type which
+        can take the queue's values. The items are copied one at a time by
+        index while interrupts are disabled once, so nothing is allocated and
+        a task can drain a queue into a buffer which it made once at startup:
+        @code
+        |   chunk = bytearray (64)
+        |   while True:
+        |       got = my_queue.get_into (chunk)
+        |       do_something_with (chunk, got)
+        |       yield 0
+        @endcode
+        @param buf The buffer into which items are copied
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return The number of items which were copied into the buffer
+        """
+        if self._thread_protect and not in_ISR:
+            irq_state = pyb.disable_irq ()
+        try:
+            size = self._size
+            src = self._buffer
+            count = self._num_items
+            if count > len (buf):
+                count = len (buf)
+            rd_idx = self._rd_idx
+            for idx in range (count):
+                buf[idx] = src[rd_idx]
+                rd_idx += 1
+                if rd_idx >= size:
+                    rd_idx = 0
+            self._rd_idx = rd_idx
+            self._num_items -= count
+        finally:
+            if self._thread_protect and not in_ISR:
+                pyb.enable_irq (irq_state)
+
+        return count
+
+
+    def get_many (self, num, in_ISR = False):
+        """!
+        Read up to the given number of items from the queue into a new array.
+
+        This method doesn't wait for data. It allocates the array which it
+        returns, so tasks which run often should use @c get_into() instead.
+        @param num The largest number of items to be read
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return An @c array.array holding the items read, which is empty if
+                the queue was empty
+        """
+        if num > self._num_items:
+            num = self._num_items
+        items = array.array (self._type_code, bytes (num * self._item_size))
+        got = self.get_into (items, in_ISR)
+        if got < num:
+            items = items[:got]
+        return items
+
+
     @micropython.native
     def any (self):
         """!
@@ -305,6 +516,7 @@ class Queue (BaseShare):
         self._wr_idx = 0
         self._num_items = 0
         self._max_full = 0
+        self._num_dropped = 0
 
 
     def __repr__ (self):
@@ -312,10 +524,293 @@ class Queue (BaseShare):
         This method puts diagnostic information about the queue into a string.
 
         It shows the queue's name and type as well as the maximum number of
-        items and queue size. 
+        items and queue size. If items have been dropped or overwritten
+        because the queue was full, the number of them is shown too.
         """
-        return ('{:<12s} Queue<{:s}> Max Full {:d}/{:d}'.format (self._name,
-                type_code_strings[self._type_code], self._max_full, self._size))
+        rst = '{:<12s} Queue<{:s}> Max Full {:d}/{:d}'.format (self._name,
+                type_code_strings[self._type_code], self._max_full, self._size)
+        if self._num_dropped > 0:
+            rst += ' Dropped {:d}'.format (self._num_dropped)
+        return rst
+
+
+# ============================================================================
+
+class SPSCQueue (BaseShare):
+    """!
+    A queue for exactly one producer and one consumer which needs no locks.
+
+    This queue can be used in the same way as a @c Queue, but it never
+    disables interrupts. It is safe when only one task or interrupt service
+    routine puts data in and only one other takes data out, such as an
+    encoder interrupt feeding a control task. The producer only ever changes
+    the write index and the consumer only ever changes the read index, and
+    each index is stored only after the data it covers has been copied, so
+    neither side can see a half-finished transfer. There's no shared count
+    of items; the count is found from the difference between the indices.
+
+    The size must be a power of two so that indices can be wrapped with a
+    mask. The indices count up to twice the size before wrapping, which lets
+    a full queue be told apart from an empty one. Because the producer may
+    not move the read index, data can't be overwritten when the queue is
+    full; items put into a full queue from an ISR are dropped and counted.
+
+    @code
+    import task_share
+
+    # Filled by an encoder ISR, emptied by a control task
+    enc_queue = task_share.SPSCQueue ('l', 64, name = "Enc Queue")
+
+    def encoder_isr (tim):
+        enc_queue.put (tim.counter (), in_ISR = True)
+    @endcode
+    """
+    ## A counter used to give serial numbers to queues for diagnostic use.
+    ser_num = 0
+
+    def __init__ (self, type_code, size, thread_protect = False, 
+                  overwrite = False, name = None):
+        """!
+        Initialize a single-producer, single-consumer queue.
+
+        The parameters are the same as those for @c Queue so that one kind of
+        queue can be swapped for the other.
+        @param type_code The type of data items which the queue can hold
+        @param size The maximum number of items which the queue can hold,
+               which must be a power of two
+        @param thread_protect Ignored, as this queue never needs protection
+        @param overwrite Must be @c False, as this queue can't overwrite
+        @param name A short name for the queue, default @c SPSCQueueN where
+               @c N is a serial number for the queue
+        """
+        if size < 1 or size & (size - 1):
+            raise ValueError ('SPSCQueue size must be a power of two')
+        if overwrite:
+            raise ValueError ('SPSCQueue cannot overwrite old data')
+
+        # First call the parent class initializer
+        super ().__init__ (type_code, False, name)
+
+        self._size = size
+        self._overwrite = False
+        self._name = str (name) if name != None \
+            else 'SPSCQueue' + str (SPSCQueue.ser_num)
+        SPSCQueue.ser_num += 1
+
+        ## Mask which turns an index into a position in the buffer
+        self._mask = size - 1
+
+        ## Mask which wraps indices, which count to twice the size
+        self._wrap = 2 * size - 1
+
+        # Allocate memory in which the queue's data will be stored
+        self._buffer = array.array (type_code, [0] * size)
+
+        ## The size of one item in bytes
+        self._item_size = len (bytes (array.array (type_code, [0])))
+
+        # Initialize pointers to be used for reading and writing data
+        self.clear ()
+
+        # Since we may have allocated a bunch of memory, call the garbage
+        # collector to neaten up what memory is left for future use
+        gc.collect ()
+
+
+    @micropython.native
+    def put (self, item, in_ISR = False):
+        """!
+        Put an item into the queue.
+
+        If the queue is full, a call from an ISR drops the item; a call from
+        a task waits until the consumer has made room, as @c Queue.put()
+        does. This method must only be called by the one producer.
+        @param item The item to be placed into the queue
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return @c True if the item was put into the queue, @c False if it
+                was dropped
+        """
+        wr_idx = self._wr_idx
+        if ((wr_idx - self._rd_idx) & self._wrap) >= self._size:
+            if in_ISR:
+                self._num_dropped += 1
+                return False
+            while ((wr_idx - self._rd_idx) & self._wrap) >= self._size:
+                pass
+
+        # Store the data first, then publish it by moving the write index
+        self._buffer[wr_idx & self._mask] = item
+        wr_idx = (wr_idx + 1) & self._wrap
+        self._wr_idx = wr_idx
+
+        num = (wr_idx - self._rd_idx) & self._wrap
+        if num > self._max_full:
+            self._max_full = num
+        if self._subscribers:
+            self._notify ()
+        return True
+
+
+    @micropython.native
+    def get (self, in_ISR = False):
+        """!
+        Read an item from the queue, waiting until one is available if the
+        queue is empty; a call from an ISR doesn't wait. This method must
+        only be called by the one consumer.
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return The item read from the queue, or @c None if called from an
+                ISR while the queue is empty
+        """
+        rd_idx = self._rd_idx
+        if in_ISR and self._wr_idx == rd_idx:
+            return None
+        while self._wr_idx == rd_idx:
+            pass
+
+        # Read the data first, then free its slot by moving the read index
+        to_return = self._buffer[rd_idx & self._mask]
+        self._rd_idx = (rd_idx + 1) & self._wrap
+        return (to_return)
+
+
+    @micropython.native
+    def put_many (self, items, in_ISR = False):
+        """!
+        Put a block of items into the queue at once, without waiting.
+
+        As many items as there's room for are copied, one at a time by index
+        so that nothing is allocated; the rest are dropped. This method must
+        only be called by the one producer.
+        @param items A buffer or other iterable holding the items
+        @param in_ISR Ignored; kept so that this queue can replace a @c Queue
+        @return The number of items which were put into the queue
+        """
+        mask = self._mask
+        buf = self._buffer
+        wr_idx = self._wr_idx
+        free = self._size - ((wr_idx - self._rd_idx) & self._wrap)
+        count = 0
+        num = 0
+        for item in items:
+            num += 1
+            if count < free:
+                buf[(wr_idx + count) & mask] = item
+                count += 1
+
+        # Publish the new items all at once
+        wr_idx = (wr_idx + count) & self._wrap
+        self._wr_idx = wr_idx
+        self._num_dropped += num - count
+        num = (wr_idx - self._rd_idx) & self._wrap
+        if num > self._max_full:
+            self._max_full = num
+        if count > 0 and self._subscribers:
+            self._notify ()
+        return count
+
+
+    @micropython.native
+    def get_into (self, buf, in_ISR = False):
+        """!
+        Read as many items as are available, up to the size of a buffer, into
+        that buffer without waiting. The items are copied one at a time by
+        index, as by @c Queue.get_into(), so nothing is allocated. This method
+        must only be called by the one consumer.
+        @param buf The buffer into which items are copied
+        @param in_ISR Ignored; kept so that this queue can replace a @c Queue
+        @return The number of items which were copied into the buffer
+        """
+        mask = self._mask
+        src = self._buffer
+        rd_idx = self._rd_idx
+        count = (self._wr_idx - rd_idx) & self._wrap
+        if count > len (buf):
+            count = len (buf)
+        for idx in range (count):
+            buf[idx] = src[(rd_idx + idx) & mask]
+
+        # Free the slots which were read
+        self._rd_idx = (rd_idx + count) & self._wrap
+        return count
+
+
+    def get_many (self, num, in_ISR = False):
+        """!
+        Read up to the given number of items from the queue into a new array,
+        without waiting. This method allocates the array which it returns.
+        @param num The largest number of items to be read
+        @param in_ISR Ignored; kept so that this queue can replace a @c Queue
+        @return An @c array.array holding the items read
+        """
+        avail = self.num_in ()
+        if num > avail:
+            num = avail
+        items = array.array (self._type_code, bytes (num * self._item_size))
+        got = self.get_into (items)
+        if got < num:
+            items = items[:got]
+        return items
+
+
+    @micropython.native
+    def any (self):
+        """!
+        Check if there are any items in the queue.
+        @return @c True if items are in the queue, @c False if not
+        """
+        return (self._wr_idx != self._rd_idx)
+
+
+    @micropython.native
+    def empty (self):
+        """!
+        Check if the queue is empty.
+        @return @c True if queue is empty, @c False if it's not empty
+        """
+        return (self._wr_idx == self._rd_idx)
+
+
+    @micropython.native
+    def full (self):
+        """!
+        Check if the queue is full.
+        @return @c True if the queue is full
+        """
+        return (((self._wr_idx - self._rd_idx) & self._wrap) >= self._size)
+
+
+    @micropython.native
+    def num_in (self):
+        """!
+        Check how many items are in the queue.
+        @return The number of items in the queue
+        """
+        return ((self._wr_idx - self._rd_idx) & self._wrap)
+
+
+    def clear (self):
+        """!
+        Remove all contents from the queue. This must not be called while
+        the producer or consumer might be using the queue.
+        """
+        self._rd_idx = 0
+        self._wr_idx = 0
+        self._max_full = 0
+        self._num_dropped = 0
+
+
+    def __repr__ (self):
+        """!
+        This method puts diagnostic information about the queue into a string.
+
+        It shows the queue's name and type as well as the maximum number of
+        items and queue size, and how many items have been dropped, if any.
+        """
+        rst = '{:<12s} SPSCQueue<{:s}> Max Full {:d}/{:d}'.format (self._name,
+                type_code_strings[self._type_code], self._max_full, self._size)
+        if self._num_dropped > 0:
+            rst += ' Dropped {:d}'.format (self._num_dropped)
+        return rst
 
 
 # ============================================================================
@@ -404,6 +899,10 @@ class Share (BaseShare):
         if self._thread_protect and not in_ISR:
             pyb.enable_irq (irq_state)
 
+        # Wake up the tasks which use the data
+        if self._subscribers:
+            self._notify ()
+
 
     @micropython.native
     def get (self, in_ISR = False):
@@ -438,3 +937,211 @@ class Share (BaseShare):
                 type_code_strings[self._type_code]))
 
 
+# ============================================================================
+
+class Record (BaseShare):
+    """!
+    A group of data items which are shared between tasks and interrupt
+    service routines as one consistent set.
+
+    Several related values, such as an encoder's position, velocity and the
+    time at which they were measured, can be published together in a record
+    so that a reader never sees new values for some of them and old values
+    for the others. Interrupts are never disabled. Instead the record holds
+    two copies of the values in one array and a sequence counter; a writer
+    bumps the counter, which sends readers to the other copy, before and
+    after changing each copy. A reader copies out the copy which the counter
+    points to, then checks that the counter hasn't changed, trying again if
+    it has. An interrupt service routine which reads the record while a
+    task is writing it gets the complete copy which the task isn't writing,
+    so nobody ever waits for anybody.
+
+    There must be only one writer at a time. All the values have the same
+    type, given by a type code as for a @c Share.
+    @code
+    import task_share
+
+    # This record holds three 32-bit integers
+    enc_state = task_share.Record ('l', ('time', 'position', 'velocity'),
+                                   name = 'Enc State')
+
+    # In the writer, which may be an ISR, either put in all the values...
+    enc_state.put (values)
+
+    # ...or change some of them and then publish the change
+    enc_state.begin ()
+    enc_state[1] = position
+    enc_state[2] = velocity
+    enc_state.commit ()
+
+    # In a reader, copy a consistent snapshot into an array made at startup
+    snapshot = array.array ('l', [0, 0, 0])
+    enc_state.get_into (snapshot)
+    @endcode
+    """
+    ## A counter used to give serial numbers to records for diagnostic use.
+    ser_num = 0
+
+
+    def __init__ (self, type_code, fields, thread_protect = False,
+                  name = None):
+        """!
+        Create a record which holds a fixed number of data items.
+        @param type_code The type of the data items, as for a @c Share
+        @param fields Either the number of items in the record or a tuple
+               of names for the items, which can be turned into indices
+               with @c index()
+        @param thread_protect Ignored, as a record needs no protection; kept
+               so that a record is created like the other shares
+        @param name A short name for the record, default @c RecordN where
+               @c N is a serial number for the record
+        """
+        super ().__init__ (type_code, thread_protect, name)
+
+        if isinstance (fields, int):
+            self._names = None
+            self._size = fields
+        else:
+            self._names = tuple (fields)
+            self._size = len (self._names)
+
+        # Two copies of the items; readers use the second copy while the
+        # sequence counter is odd and the first while it's even
+        self._buffer = array.array (type_code, [0] * (2 * self._size))
+        self._seq = 0
+        self._retries = 0
+
+        self._name = str (name) if name != None \
+            else 'Record' + str (Record.ser_num)
+        Record.ser_num += 1
+
+
+    def index (self, field):
+        """!
+        Find the index of a named item. This should be done once at startup
+        rather than each time an item is used.
+        @param field The name of the item, as given to the constructor
+        @return The index of the item
+        """
+        return self._names.index (field)
+
+
+    @micropython.native
+    def put (self, values, in_ISR = False):
+        """!
+        Write a new value for every item in the record. Readers see either
+        all the old values or all the new ones.
+        @param values An array, list or tuple holding one value for each
+               item, in order
+        @param in_ISR Ignored; kept so that a record is used like a share
+        """
+        size = self._size
+        buf = self._buffer
+        self._seq = (self._seq + 1) & 0x3FFFFFFF    # Readers use second copy
+        for idx in range (size):
+            buf[idx] = values[idx]
+        self._seq = (self._seq + 1) & 0x3FFFFFFF    # Readers use first copy
+        for idx in range (size):
+            buf[size + idx] = values[idx]
+
+        if self._subscribers:
+            self._notify ()
+
+
+    @micropython.native
+    def begin (self):
+        """!
+        Start changing some of the items in the record. Items are changed
+        by assigning to them by index, and the changes are published all at
+        once by @c commit(); until then, readers see the old values.
+        """
+        self._seq = (self._seq + 1) & 0x3FFFFFFF
+
+
+    @micropython.native
+    def __setitem__ (self, idx, value):
+        """!
+        Change one item in the record between @c begin() and @c commit().
+        @param idx The index of the item
+        @param value The new value of the item
+        """
+        self._buffer[idx] = value
+
+
+    @micropython.native
+    def commit (self):
+        """!
+        Publish the changes made since @c begin(), so that readers see all
+        of them, then bring the second copy of the items up to date.
+        """
+        size = self._size
+        buf = self._buffer
+        self._seq = (self._seq + 1) & 0x3FFFFFFF
+        for idx in range (size):
+            buf[size + idx] = buf[idx]
+
+        if self._subscribers:
+            self._notify ()
+
+
+    @micropython.native
+    def get_into (self, buf, in_ISR = False):
+        """!
+        Copy a consistent snapshot of all the items into a buffer. If a
+        writer changes the record while it's being copied, the copy is made
+        again; this can only happen when an interrupt service routine writes
+        the record while a task is reading it. Nothing is allocated.
+        @param buf An array or list with room for every item
+        @param in_ISR Ignored; kept so that a record is used like a share
+        """
+        size = self._size
+        src = self._buffer
+        while True:
+            seq = self._seq
+            offset = size if seq & 1 else 0
+            for idx in range (size):
+                buf[idx] = src[offset + idx]
+            if self._seq == seq:
+                return
+            self._retries += 1
+
+
+    def get (self, in_ISR = False):
+        """!
+        Read a consistent snapshot of all the items. This allocates a new
+        array each time; @c get_into() doesn't.
+        @param in_ISR Ignored; kept so that a record is used like a share
+        @return An @c array.array holding the items
+        """
+        snapshot = array.array (self._type_code, [0] * self._size)
+        self.get_into (snapshot)
+        return snapshot
+
+
+    @micropython.native
+    def __getitem__ (self, idx):
+        """!
+        Read one item of the record from the copy which readers are using.
+        @param idx The index of the item
+        @return The item's most recently published value
+        """
+        return self._buffer[idx + (self._size if self._seq & 1 else 0)]
+
+
+    def __len__ (self):
+        """!
+        Find the number of items in the record.
+        @return The number of items
+        """
+        return self._size
+
+
+    def __repr__ (self):
+        """!
+        Puts diagnostic information about the record into a string, showing
+        how many times readers had to copy the record again because it was
+        written while they were reading it.
+        """
+        return ('{:<12s} Record<{:s}>[{:d}] Retries {:d}'.format (self._name,
+                type_code_strings[self._type_code], self._size,
+                self._retries))
@@ -0,0 +1,233 @@
+"""!
+@file telemetry.py
+This file contains the binary telemetry frame format sent from the motor
+tasks to the PC, with a writer for the board and a decoder for the PC.
+
+@details Each frame is a fixed-size little-endian record packed with
+         @c struct:
+         | Field     | Type   | Meaning                                    |
+         |:----------|:-------|:-------------------------------------------|
+         | sync      | uint16 | Always @c SYNC, used to find frame starts  |
+         | task_id   | uint8  | Which task or axis sent the frame          |
+         | timestamp | uint32 | @c utime.ticks_us() when the sample was taken |
+         | position  | int32  | Encoder position in ticks                  |
+         | velocity  | int32  | Encoder velocity in ticks per second       |
+         | duty      | int8   | Motor duty cycle in percent                |
+         | seq       | uint16 | Per-task sequence number, used to find lost frames |
+
+         On the board, a @c TelemetryWriter packs each sample into a buffer
+         which it made once, so sending a sample doesn't allocate memory:
+         @code
+         writer = telemetry.TelemetryWriter (1)
+         print_task.put_bytes (writer.pack (utime.ticks_us (), pos, vel, duty))
+         @endcode
+         On the PC, a @c FrameDecoder turns bytes from the serial port into
+         frames, however the bytes are split up into reads:
+         @code
+         decoder = telemetry.FrameDecoder ()
+         for frame in decoder.feed (s_port.read (s_port.in_waiting)):
+             print (frame.task_id, frame.timestamp, frame.position)
+         @endcode
+
+@author Nishka Chawla
+@author Ronan Shaffer
+@date   18-Oct-2026
+@copyright (c) Released under GNU Public License
+"""
+
+import struct
+
+## The @c struct format of one frame.
+FRAME_FORMAT = '<HBIiibH'
+
+## The number of bytes in one frame.
+FRAME_SIZE = struct.calcsize(FRAME_FORMAT)
+
+## The value of the sync word at the start of every frame.
+SYNC = 0xA55A
+
+## The sync word as it appears in the byte stream.
+SYNC_BYTES = struct.pack('<H', SYNC)
+
+## The names of the fields in a decoded frame, in order.
+FIELDS = ('task_id', 'timestamp', 'position', 'velocity', 'duty', 'seq')
+
+## The number of microseconds after which @c utime.ticks_us() wraps around.
+TICKS_PERIOD = 1 << 30
+
+
+class TelemetryWriter:
+    """!
+    This class packs telemetry samples from one task into frames. It is used
+    on the board.
+    """
+
+    def __init__(self, task_id):
+        """!
+        Creates a telemetry writer with its own frame buffer.
+        @param task_id      The number which identifies the sending task in
+                            each frame, from 0 to 255.
+        """
+        ## The number which identifies the sending task.
+        self.task_id = task_id
+
+        ## The buffer into which each frame is packed.
+        self.buf = bytearray(FRAME_SIZE)
+
+        ## The sequence number of the next frame.
+        self.seq = 0
+
+    def pack(self, timestamp, position, velocity, duty):
+        """!
+        This method packs one sample into the frame buffer. The buffer is
+        reused for the next sample, so it must be sent or copied first.
+        @param timestamp    The time of the sample from @c utime.ticks_us().
+        @param position     The encoder position in ticks.
+        @param velocity     The encoder velocity in ticks per second.
+        @param duty         The motor duty cycle in percent. Levels beyond 100
+                            percent either way are sent as 100 percent, as
+                            the motor driver limits them, so that the int8
+                            field holds whatever saturation limits are set.
+        @returns            The frame buffer.
+        """
+        if duty > 100:
+            duty = 100
+        elif duty < -100:
+            duty = -100
+        struct.pack_into(FRAME_FORMAT, self.buf, 0, SYNC, self.task_id,
+                         timestamp, position, velocity, duty, self.seq)
+        self.seq = (self.seq + 1) & 0xFFFF
+        return self.buf
+
+
+class Frame(tuple):
+    """!
+    This class holds one decoded frame. It is a tuple of the values named in
+    @c FIELDS, whose values can also be read by name.
+    """
+    __slots__ = ()
+
+    task_id = property(lambda self: self[0])
+    timestamp = property(lambda self: self[1])
+    position = property(lambda self: self[2])
+    velocity = property(lambda self: self[3])
+    duty = property(lambda self: self[4])
+    seq = property(lambda self: self[5])
+
+
+class FrameDecoder:
+    """!
+    This class finds and decodes frames in a stream of bytes. It is used on
+    the PC. Frame timestamps are unwrapped into microseconds which keep
+    counting up past the board's tick period, and gaps in each task's
+    sequence numbers are counted as lost frames.
+    """
+
+    def __init__(self):
+        """!
+        Creates a decoder with nothing buffered.
+        """
+        ## Bytes received which haven't been decoded yet.
+        self._pending = bytearray()
+
+        ## The number of bytes skipped while looking for a sync word.
+        self.skipped_bytes = 0
+
+        ## The number of frames which the sequence numbers show were lost.
+        self.lost_frames = 0
+
+        ## The number of frames decoded.
+        self.frames = 0
+
+        ## The last sequence number seen from each task.
+        self._last_seq = {}
+
+        ## The last raw timestamp and its unwrapped offset, for each task.
+        self._last_ts = {}
+
+    def feed(self, data):
+        """!
+        This method decodes the frames completed by some more bytes. Since
+        frames have no checksum, a frame is only accepted once the sync word
+        of the frame after it has arrived; this keeps a frame which was cut
+        short from being read together with the start of the next one. The
+        newest frame therefore waits for more bytes or for @c flush().
+        @param data     Bytes from the serial port, in any amount.
+        @returns        A list of @c Frame objects.
+        """
+        self._pending.extend(data)
+        return self._decode(False)
+
+    def flush(self):
+        """!
+        This method decodes the frames left at the end of the stream, which
+        aren't followed by another frame's sync word.
+        @returns        A list of @c Frame objects.
+        """
+        return self._decode(True)
+
+    def _decode(self, final):
+        """!
+        This method decodes the frames in the pending bytes and removes them.
+        @param final    @c True if no more bytes will follow.
+        @returns        A list of @c Frame objects.
+        """
+        pending = self._pending
+        frames = []
+        pos = 0
+        end = len(pending) - FRAME_SIZE - (0 if final else 2)
+        while pos <= end:
+            after = pos + FRAME_SIZE
+            if (pending[pos:pos + 2] != SYNC_BYTES
+                    or (after < len(pending) or not final)
+                    and pending[after:after + 2] != SYNC_BYTES):
+                found = pending.find(SYNC_BYTES, pos + 1)
+                if found < 0:
+                    found = len(pending) - 1
+                self.skipped_bytes += found - pos
+                pos = found
+                continue
+            values = struct.unpack_from(FRAME_FORMAT, pending, pos)
+            frames.append(self._finish(values))
+            pos = after
+        if final:
+            self.skipped_bytes += len(pending) - pos
+            pos = len(pending)
+        del pending[:pos]
+        return frames
+
+    def _finish(self, values):
+        """!
+        This method unwraps a frame's timestamp and checks its sequence number.
+        @param values   The values unpacked from the frame, starting with the
+                        sync word.
+        @returns        The @c Frame.
+        """
+        task_id, stamp, position, velocity, duty, seq = values[1:]
+
+        last_seq = self._last_seq.get(task_id)
+        if last_seq is not None:
+            self.lost_frames += (seq - last_seq - 1) & 0xFFFF
+        self._last_seq[task_id] = seq
+
+        last = self._last_ts.get(task_id)
+        offset = 0
+        if last is not None:
+            last_stamp, offset = last
+            if stamp < last_stamp:
+                offset += TICKS_PERIOD
+        self._last_ts[task_id] = (stamp, offset)
+
+        self.frames += 1
+        return Frame((task_id, stamp + offset, position, velocity, duty, seq))
+
+
+def decode(data):
+    """!
+    This function decodes all the whole frames in a block of bytes, such as
+    a file of recorded telemetry.
+    @param data     The bytes to be decoded.
+    @returns        A list of @c Frame objects.
+    """
+    decoder = FrameDecoder()
+    return decoder.feed(data) + decoder.flush()
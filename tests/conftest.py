@@ -0,0 +1,32 @@
+"""!
+@file conftest.py
+This file sets up the host tests. It puts @c src on the module path and
+installs the simulated @c pyb, @c utime and @c micropython modules before
+any test imports the board code, so the tests run under CPython with
+@c python -m pytest from the top of the repository.
+"""
+
+import os
+import sys
+
+import pytest
+
+## The directory holding the board and PC code.
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))), 'src')
+
+sys.path.insert(0, SRC)
+
+import sim                              # noqa: E402
+
+sim.install()
+
+
+@pytest.fixture
+def clock():
+    """!
+    This fixture gives each test a fresh virtual clock, starting at zero,
+    and throws away the simulated timers made by earlier tests.
+    @returns    The new @c sim.clock.VirtualClock.
+    """
+    return sim.install()
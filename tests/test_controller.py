@@ -0,0 +1,56 @@
+"""!
+@file test_controller.py
+This file tests that @c MultiAxisController.run_fixed() drives the axes as
+@c MultiAxisController.run() does, using integers only.
+"""
+
+import random
+
+import pytest
+
+from closedloopcontrol import MultiAxisController
+
+
+@pytest.mark.parametrize('Ki, period', [(0.0, None), (5.0, 0.01),
+                                        (-2.0, 0.04)])
+def test_run_fixed_matches_run(Ki, period):
+    """!
+    Over a random walk of positions, with errors far beyond saturation and
+    close to the setpoint, the fixed-point actuation levels stay within two
+    of the floating point ones, and every value is an integer below
+    2 ** 30.
+    """
+    floats = MultiAxisController(3, 0.3, Ki, 100, -80, period)
+    fixed = MultiAxisController(3, 0.3, Ki, 100, -80, period)
+    for ctrl in (floats, fixed):
+        ctrl.set_Kp(2, 2.5)
+        ctrl.set_limits(1, 60, -60)
+        for axis in range(3):
+            ctrl.set_setpoint(axis, 16384 * axis)
+    rng = random.Random(4)
+    msr = [0, 16000, 33000]
+    for n in range(2000):
+        for axis in range(3):
+            msr[axis] += rng.randint(-300, 300) if n < 1000 else \
+                (16384 * axis - msr[axis]) // 4
+        want = floats.run(msr)
+        got = fixed.run_fixed(msr)
+        for axis in range(3):
+            assert isinstance(got[axis], int)
+            assert abs(got[axis] - want[axis]) <= 2
+            assert abs(fixed._integral_q[axis]) < 1 << 30
+    assert list(fixed.error) == list(floats.error)
+
+
+def test_reset_clears_fixed_integral():
+    """!
+    @c reset() clears the fixed-point integrators as well as the others.
+    """
+    ctrl = MultiAxisController(2, 0.0, 10.0, 100, -100, 0.01)
+    ctrl.set_setpoint(0, 1000)
+    for n in range(10):
+        ctrl.run_fixed([0, 0])
+    assert ctrl.act[0] > 0
+    assert list(ctrl.run_fixed([1000, 0])) == [100, 0]
+    ctrl.reset()
+    assert list(ctrl.run_fixed([1000, 0])) == [0, 0]
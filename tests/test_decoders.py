@@ -0,0 +1,177 @@
+"""!
+@file test_decoders.py
+This file tests that @c telemetry.FrameDecoder and
+@c stream_ingest.BlockDecoder decode the same frames from a stream however
+it is split into reads, and find their way back to the frames after
+damage.
+"""
+
+import random
+
+import pytest
+
+import telemetry
+from stream_ingest import BlockDecoder
+
+## The first raw timestamp, close enough to the wrap that the stream
+#  crosses it.
+START_US = telemetry.TICKS_PERIOD - 50000
+
+## Bytes which don't belong to any frame, including a false sync word.
+GARBAGE = b'\x01' + telemetry.SYNC_BYTES + b'\x02\x03'
+
+
+def _samples(num):
+    """!
+    This function makes samples from two tasks, interleaved, and the frames
+    which the board would send for them.
+    @param num      The number of samples from each task.
+    @returns        A list of (task ID, unwrapped time, position, velocity,
+                    duty) tuples, and a list of the frames, one per sample.
+    """
+    writers = [telemetry.TelemetryWriter(1), telemetry.TelemetryWriter(2)]
+    samples = []
+    frames = []
+    for n in range(num):
+        for writer in writers:
+            time = START_US + 1000 * n + writer.task_id
+            sample = (writer.task_id, time, 37 * n - 500, -n, n % 200 - 100)
+            samples.append(sample)
+            frames.append(bytes(writer.pack(
+                time % telemetry.TICKS_PERIOD, *sample[2:])))
+    return samples, frames
+
+
+def _chunks(data, seed):
+    """!
+    This function splits bytes into reads of random sizes.
+    @param data     The bytes.
+    @param seed     The seed for the random sizes.
+    @returns        A list of the reads.
+    """
+    rng = random.Random(seed)
+    chunks = []
+    pos = 0
+    while pos < len(data):
+        size = rng.randint(0, 3 * telemetry.FRAME_SIZE)
+        chunks.append(data[pos:pos + size])
+        pos += size
+    return chunks
+
+
+def _frame_decode(chunks):
+    """!
+    This function runs reads through a @c FrameDecoder.
+    @param chunks   The reads.
+    @returns        The decoded samples, as made by @c _samples(), and the
+                    decoder.
+    """
+    decoder = telemetry.FrameDecoder()
+    frames = []
+    for chunk in chunks:
+        frames += decoder.feed(chunk)
+    frames += decoder.flush()
+    return [(frame.task_id, frame.timestamp, frame.position, frame.velocity,
+             frame.duty) for frame in frames], decoder
+
+
+def _block_decode(chunks):
+    """!
+    This function runs reads through a @c BlockDecoder.
+    @param chunks   The reads.
+    @returns        A dictionary of each task's decoded samples, as made by
+                    @c _samples(), and the decoder.
+    """
+    decoder = BlockDecoder()
+    tasks = {}
+    for chunk in list(chunks) + [None]:
+        got = decoder.flush() if chunk is None else decoder.feed(chunk)
+        for task_id, samples in got.items():
+            tasks.setdefault(task_id, []).extend(
+                (task_id, int(s['time']), int(s['position']),
+                 int(s['velocity']), int(s['duty'])) for s in samples)
+    return tasks, decoder
+
+
+def _by_task(samples):
+    """!
+    This function sorts samples out by task.
+    @param samples  Samples as made by @c _samples().
+    @returns        A dictionary of each task's samples, in order.
+    """
+    tasks = {}
+    for sample in samples:
+        tasks.setdefault(sample[0], []).append(sample)
+    return tasks
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_clean_stream(seed):
+    """!
+    An undamaged stream decodes to every sample, with the timestamps
+    unwrapped, however it is split up.
+    """
+    samples, frames = _samples(200)
+    chunks = _chunks(b''.join(frames), seed)
+
+    decoded, decoder = _frame_decode(chunks)
+    assert decoded == samples
+    assert (decoder.skipped_bytes, decoder.lost_frames) == (0, 0)
+
+    tasks, decoder = _block_decode(chunks)
+    assert tasks == _by_task(samples)
+    assert (decoder.skipped_bytes, decoder.lost_frames) == (0, 0)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_resync(seed):
+    """!
+    After garbage, a frame cut short and a frame lost altogether, both
+    decoders find the following frames again, skip the bad bytes and count
+    the lost frames. The frame just before the garbage in the middle isn't
+    followed by a sync word, so it can't be told from a frame which was cut
+    short and is skipped too.
+    """
+    samples, frames = _samples(100)
+    cut = frames[41][:7]
+    stream = (GARBAGE + b''.join(frames[:41]) + cut
+              + b''.join(frames[42:60]) + GARBAGE + b''.join(frames[61:]))
+    expected = samples[:41] + samples[42:59] + samples[61:]
+    skipped = 2 * len(GARBAGE) + len(cut) + telemetry.FRAME_SIZE
+    chunks = _chunks(stream, seed)
+
+    decoded, decoder = _frame_decode(chunks)
+    assert decoded == expected
+    assert decoder.skipped_bytes == skipped
+    assert decoder.lost_frames == 3
+
+    tasks, decoder = _block_decode(chunks)
+    assert tasks == _by_task(expected)
+    assert decoder.skipped_bytes == skipped
+    assert decoder.lost_frames == 3
+
+
+def test_cut_short_at_end():
+    """!
+    A frame cut short at the end of the stream is skipped, not decoded.
+    """
+    samples, frames = _samples(3)
+    stream = b''.join(frames) + frames[0][:10]
+
+    decoded, decoder = _frame_decode([stream])
+    assert decoded == samples
+    assert decoder.skipped_bytes == 10
+
+    tasks, decoder = _block_decode([stream])
+    assert tasks == _by_task(samples)
+    assert decoder.skipped_bytes == 10
+
+
+def test_duty_clamped():
+    """!
+    Duty cycles beyond the int8 field are sent as 100 percent either way.
+    """
+    writer = telemetry.TelemetryWriter(0)
+    frames = [bytes(writer.pack(0, 0, 0, duty)) for duty in (300, -300, 99)]
+    duties = [frame.duty for frame in telemetry.decode(b''.join(frames))]
+    assert duties == [100, -100, 99]
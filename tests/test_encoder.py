@@ -0,0 +1,126 @@
+"""!
+@file test_encoder.py
+This file tests that @c EncoderDriver keeps an exact position while its
+timer counter wraps around, both when it is polled by @c update() and when
+it is sampled by @c capture(), and that its integer velocity estimates
+match its floating point ones.
+"""
+
+import random
+
+import pytest
+
+import pyb
+import encoder_chawla_shaffer
+from encoder_chawla_shaffer import EncoderDriver
+
+## Moves of the shaft in ticks: far enough forward and back to wrap the
+#  counter many times either way, with steps up to nearly half its range.
+MOVES = [30000] * 20 + [-32000] * 40 + [12345, -1, 1, 0, 32767, -32767]
+
+
+def _encoder(period):
+    """!
+    This function makes an encoder driver on timer 4 with the given counter
+    period.
+    @param period   The counter's largest value.
+    @returns        The @c EncoderDriver.
+    """
+    enc = EncoderDriver(pyb.Pin.cpu.B6, pyb.Pin.cpu.B7, 4)
+    enc.period = period
+    enc.tim.period(period)
+    return enc
+
+
+@pytest.mark.parametrize('period', [65535, 999])
+def test_update_wraps(clock, period):
+    """!
+    The position found by @c update() follows the shaft through many wraps.
+    """
+    enc = _encoder(period)
+    half = (period + 1) // 2 - 1
+    moves = [max(-half, min(half, move)) for move in MOVES]
+    rng = random.Random(1)
+    moves += [rng.randint(-half, half) for n in range(2000)]
+
+    position = 0
+    for move in moves:
+        enc.tim.advance_count(move)
+        enc.update()
+        position += move
+        assert enc.delta == move
+        assert enc.read() == position
+
+
+@pytest.mark.parametrize('period', [65535, 999])
+def test_capture_wraps(clock, period):
+    """!
+    The position found by @c capture() follows the shaft through many wraps.
+    """
+    enc = _encoder(period)
+    half = (period + 1) // 2 - 1
+    rng = random.Random(2)
+
+    position = 0
+    for n in range(2000):
+        move = rng.randint(-half, half)
+        enc.tim.advance_count(move)
+        enc.capture()
+        position += move
+        assert enc.read() == position
+
+
+def test_wrap_by_one(clock):
+    """!
+    Stepping one tick across the wrap in either direction moves one tick.
+    """
+    enc = _encoder(65535)
+    enc.tim.advance_count(-1)
+    enc.update()
+    assert enc.read() == -1
+    enc.tim.advance_count(1)
+    enc.update()
+    assert enc.read() == 0
+
+
+@pytest.mark.parametrize('estimator', [EncoderDriver.FINITE_DIFF,
+                                       EncoderDriver.REGRESSION,
+                                       EncoderDriver.PERIOD])
+def test_velocity_int(clock, estimator):
+    """!
+    @c read_velocity_int() gives the speed from @c read_velocity() rounded
+    toward zero, at high speeds, at low speeds where the position only
+    changes now and then, and with the motor stopped.
+    """
+    enc = _encoder(65535)
+    enc.set_estimator(estimator, 6)
+    rng = random.Random(3)
+    assert enc.read_velocity_int() == 0
+    for n in range(3000):
+        if n < 1000:
+            move = rng.randint(-3000, 3000)
+        elif n < 2000:
+            move = rng.choice([0, 0, 0, 1, -1])
+        else:
+            move = 0
+        enc.tim.advance_count(move)
+        clock.advance(rng.randint(200, 3000) * 1000)
+        enc.capture()
+        assert abs(enc.read_velocity_int() - enc.read_velocity()) < 1
+
+
+@pytest.mark.parametrize('ticks, us', [
+    (1, 1), (-1, 3), (0, 7), (1000000, 999), (-123456, 1000),
+    (7, (1 << 20) - 1), (5000, 3000000), (-1, 1 << 22),
+])
+def test_per_second(ticks, us):
+    """!
+    Speeds are rounded toward zero, and are exact for times below 2 ** 20
+    microseconds.
+    """
+    speed = encoder_chawla_shaffer._per_second(ticks, us)
+    exact = abs(ticks) * 1000000 // us * (1 if ticks >= 0 else -1)
+    if us < 1 << 20:
+        assert speed == exact
+    else:
+        assert abs(speed - exact) <= abs(exact) // 1000 + 1
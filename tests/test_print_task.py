@@ -0,0 +1,111 @@
+"""!
+@file test_print_task.py
+This file tests the drain mode of @c print_task against ports which take
+all, some or none of each chunk.
+"""
+
+import pytest
+
+import print_task
+
+
+class _Port:
+    """!
+    This class is a port which takes at most a given number of bytes from
+    each write and keeps what it took.
+    """
+
+    def __init__(self, take):
+        """!
+        Creates a port.
+        @param take     The most bytes which each write takes.
+        """
+        ## The most bytes which each write takes.
+        self.take = take
+
+        ## The bytes taken so far.
+        self.data = bytearray()
+
+    def write(self, buf):
+        """!
+        Takes bytes from the front of a buffer.
+        @param buf      The bytes to be written.
+        @returns        The number of bytes taken.
+        """
+        num = min(self.take, len(buf))
+        self.data += bytes(buf[:num])
+        return num
+
+
+@pytest.fixture
+def drain():
+    """!
+    This fixture empties the print queue and makes a new drain generator,
+    putting the USB port back afterwards.
+    @returns        The generator.
+    """
+    print_task.print_queue.clear()
+    print_task._held = 0
+    yield print_task.drain()
+    print_task.set_port(print_task._vcp)
+    print_task.print_queue.clear()
+    print_task._held = 0
+
+
+def _run(gen):
+    """!
+    This function runs the print task once, as the scheduler would, with
+    its go flag cleared first.
+    @param gen      The drain generator.
+    @returns        @c True if the task asked to run again at once.
+    """
+    print_task.print_task.go_flag = False
+    next(gen)
+    return print_task.print_task.go_flag
+
+
+def test_sends_everything(drain):
+    """!
+    Bytes put into the queue all reach a port which takes everything, in
+    order, and the task doesn't ask to run again once they're gone.
+    """
+    port = _Port(1000)
+    print_task.set_port(port)
+    data = bytes(range(200))
+    print_task.put_bytes(data)
+    assert not _run(drain)
+    assert port.data == data
+
+
+def test_short_writes(drain):
+    """!
+    A port which takes part of each chunk gets every byte in order, with
+    the task running again at once while bytes are left.
+    """
+    port = _Port(10)
+    print_task.set_port(port)
+    data = bytes(range(100))
+    print_task.put_bytes(data)
+    runs = 1
+    while _run(drain):
+        runs += 1
+    assert port.data == data
+    assert runs > 1
+
+
+def test_busy_port_backs_off(drain):
+    """!
+    When the port takes nothing, the task doesn't ask to run again at once,
+    and when it takes bytes again, they are sent from where it stopped.
+    """
+    port = _Port(0)
+    print_task.set_port(port)
+    data = bytes(range(100))
+    print_task.put_bytes(data)
+    for n in range(3):
+        assert not _run(drain)
+    assert port.data == b''
+    port.take = 1000
+    while _run(drain):
+        pass
+    assert port.data == data
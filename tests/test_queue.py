@@ -0,0 +1,141 @@
+"""!
+@file test_queue.py
+This file tests the item and block transfers of @c task_share.Queue.
+"""
+
+import array
+
+import pytest
+
+import task_share
+
+
+def test_fifo_wraps():
+    """!
+    Items come out in the order they went in while the indices wrap.
+    """
+    queue = task_share.Queue('h', 5, name='Fifo')
+    out = []
+    for item in range(-20, 20):
+        assert queue.put(item)
+        if queue.num_in() == 3:
+            out.append(queue.get())
+    while queue.any():
+        out.append(queue.get())
+    assert out == list(range(-20, 20))
+    assert queue.empty()
+
+
+def test_isr_put_drops_when_full():
+    """!
+    An ISR's put into a full queue is dropped and counted, not waited on.
+    """
+    queue = task_share.Queue('B', 3)
+    for item in (1, 2, 3):
+        assert queue.put(item, in_ISR=True)
+    assert queue.full()
+    assert not queue.put(4, in_ISR=True)
+    assert queue._num_dropped == 1
+    assert [queue.get() for n in range(3)] == [1, 2, 3]
+
+
+def test_isr_get_empty():
+    """!
+    An ISR's get from an empty queue returns @c None instead of waiting.
+    """
+    queue = task_share.Queue('l', 4)
+    assert queue.get(in_ISR=True) is None
+    queue.put(7)
+    assert queue.get(in_ISR=True) == 7
+    assert queue.get(in_ISR=True) is None
+
+
+def test_overwrite_keeps_newest():
+    """!
+    A queue which overwrites keeps the newest items when it's full.
+    """
+    queue = task_share.Queue('h', 4, overwrite=True)
+    for item in range(10):
+        queue.put(item)
+    assert queue.num_in() == 4
+    assert [queue.get() for n in range(4)] == [6, 7, 8, 9]
+
+
+@pytest.mark.parametrize('items', [
+    lambda values: array.array('h', values),
+    lambda values: list(values),
+    lambda values: array.array('l', values),
+], ids=['array', 'list', 'wider-array'])
+def test_put_many_get_into_wrap(items):
+    """!
+    Blocks go in and come out whole across the end of the buffer, whether
+    they're copied as a block or one item at a time.
+    """
+    queue = task_share.Queue('h', 8)
+    buf = array.array('h', [0] * 8)
+    expected = []
+    got = []
+    for start in range(0, 60, 5):
+        values = range(start - 30, start - 25)
+        assert queue.put_many(items(values)) == 5
+        expected.extend(values)
+        count = queue.get_into(buf)
+        got.extend(buf[:count])
+    assert got == expected
+    assert queue.empty()
+
+
+def test_put_many_partial():
+    """!
+    A block which doesn't fit fills the queue, and the rest is dropped.
+    """
+    queue = task_share.Queue('B', 6)
+    queue.put_many(bytearray(b'abcd'))
+    assert queue.put_many(bytearray(b'efgh')) == 2
+    assert queue._num_dropped == 2
+    buf = bytearray(10)
+    assert queue.get_into(buf) == 6
+    assert bytes(buf[:6]) == b'abcdef'
+
+
+def test_put_many_overwrite():
+    """!
+    A block put into a queue which overwrites pushes out the oldest items,
+    even when the block is bigger than the queue.
+    """
+    queue = task_share.Queue('B', 6, overwrite=True)
+    queue.put_many(bytearray(b'abcd'))
+    queue.put_many(bytearray(b'efgh'))
+    assert bytes(queue.get_many(10)) == b'cdefgh'
+    queue.put_many(bytearray(b'0123456789'))
+    assert bytes(queue.get_many(10)) == b'456789'
+
+
+def test_get_into_short_buffer():
+    """!
+    @c get_into() copies no more items than the buffer holds.
+    """
+    queue = task_share.Queue('B', 8)
+    queue.put_many(b'abcdef')
+    buf = bytearray(4)
+    assert queue.get_into(memoryview(buf)[:2]) == 2
+    assert queue.get_into(buf) == 4
+    assert bytes(buf) == b'cdef'
+    assert queue.get_into(buf) == 0
+
+
+def test_get_into_other_buffer_type():
+    """!
+    Items read into a buffer of another type are copied by value rather
+    than as reinterpreted bytes.
+    """
+    queue = task_share.Queue('h', 8)
+    queue.put_many([1, 2, 3])
+    buf = bytearray(8)
+    assert queue.get_into(buf) == 3
+    assert list(buf[:3]) == [1, 2, 3]
+    queue.put_many(bytearray([4, 5]))
+    buf = array.array('H', [0] * 8)
+    assert queue.get_into(memoryview(buf)[1:]) == 2
+    assert list(buf[:3]) == [0, 4, 5]
+    assert queue.num_in() == 0
@@ -0,0 +1,126 @@
+"""!
+@file test_record.py
+This file tests @c task_share.Record, including readers and writers which
+are interrupted part way through by a simulated timer interrupt.
+"""
+
+import array
+
+import utime
+import task_share
+
+
+class _SlowBuffer(list):
+    """!
+    This class is a list which reads the clock each time an item is set,
+    so that timer events can interrupt a copy into it.
+    """
+
+    def __setitem__(self, idx, value):
+        """!
+        Reads the clock, then sets an item.
+        @param idx      The index of the item.
+        @param value    The new value.
+        """
+        utime.ticks_us()
+        super().__setitem__(idx, value)
+
+
+class _SlowValues(list):
+    """!
+    This class is a list which reads the clock each time an item is read,
+    so that timer events can interrupt a copy out of it.
+    """
+
+    def __getitem__(self, idx):
+        """!
+        Reads the clock, then gets an item.
+        @param idx      The index of the item.
+        @returns        The item.
+        """
+        utime.ticks_us()
+        return super().__getitem__(idx)
+
+
+def test_put_and_get():
+    """!
+    Values put in come out together, and items can be found by name.
+    """
+    record = task_share.Record('l', ('time', 'position', 'velocity'))
+    assert len(record) == 3
+    assert record.index('velocity') == 2
+    record.put([1, -2, 3])
+    buf = array.array('l', [0, 0, 0])
+    record.get_into(buf)
+    assert list(buf) == [1, -2, 3]
+    assert list(record.get()) == [1, -2, 3]
+    assert record[1] == -2
+
+
+def test_commit_publishes():
+    """!
+    Items changed after @c begin() aren't seen until @c commit(), and then
+    are all seen at once.
+    """
+    record = task_share.Record('h', 3)
+    record.put((1, 2, 3))
+    record.begin()
+    record[0] = 10
+    record[2] = 30
+    assert list(record.get()) == [1, 2, 3]
+    assert record[0] == 1
+    record.commit()
+    assert list(record.get()) == [10, 2, 30]
+    record.begin()
+    record[1] = 20
+    record.commit()
+    assert list(record.get()) == [10, 20, 30]
+
+
+def test_reader_interrupted(clock):
+    """!
+    A task reading the record while an interrupt writes it gets consistent
+    snapshots, trying again when a write lands part way through.
+    """
+    record = task_share.Record('l', 4)
+    value = [0]
+
+    def writer():
+        value[0] += 1
+        record.put((value[0],) * 4)
+
+    clock.add_event(170000, writer, 170000)
+    buf = _SlowBuffer([0] * 4)
+    seen = set()
+    for n in range(500):
+        record.get_into(buf)
+        assert len(set(buf)) == 1
+        seen.add(buf[0])
+    assert record._retries > 0
+    assert len(seen) > 100
+
+
+def test_writer_interrupted(clock):
+    """!
+    An interrupt reading the record while a task writes it gets the whole
+    of the old values or the whole of the new ones, never a mixture.
+    """
+    record = task_share.Record('l', 4)
+    buf = array.array('l', [0] * 4)
+    snapshots = []
+
+    def reader():
+        record.get_into(buf, in_ISR=True)
+        snapshots.append(tuple(buf))
+
+    clock.add_event(15000, reader, 15000)
+    for value in range(1, 300):
+        record.put(_SlowValues([value] * 4))
+        record.begin()
+        for idx in range(4):
+            utime.ticks_us()
+            record[idx] = -value
+        record.commit()
+    assert len(snapshots) > 100
+    assert all(len(set(snap)) == 1 for snap in snapshots)
+    assert len(set(snap[0] > 0 for snap in snapshots)) == 2
@@ -0,0 +1,142 @@
+"""!
+@file test_runfile.py
+This file tests that run files written by @c runfile.RunWriter read back
+the same through @c runfile.RunFile.
+"""
+
+import numpy as np
+import pytest
+
+import runfile
+import telemetry
+from stream_ingest import SAMPLE_DTYPE
+
+
+def _samples(num, seed):
+    """!
+    This function makes a structured array of random samples, as captured
+    by @c stream_ingest.
+    @param num      The number of samples.
+    @param seed     The seed for the random values.
+    @returns        A @c SAMPLE_DTYPE array.
+    """
+    rng = np.random.default_rng(seed)
+    samples = np.empty(num, SAMPLE_DTYPE)
+    samples['time'] = np.cumsum(rng.integers(1, 50000, num)) + (1 << 31)
+    samples['position'] = rng.integers(-(1 << 31), 1 << 31, num)
+    samples['velocity'] = rng.integers(-(1 << 20), 1 << 20, num)
+    samples['duty'] = rng.integers(-100, 101, num)
+    return samples
+
+
+def test_round_trip(tmp_path):
+    """!
+    Settings and columns written in several blocks per task come back
+    unchanged, with the standard columns' types.
+    """
+    path = str(tmp_path / 'step.run')
+    first = _samples(1000, 1)
+    second = _samples(333, 2)
+    with runfile.RunWriter(path) as writer:
+        writer.add_axis(1, period=20, Kp=0.1, sat_max=100, sat_min=-100)
+        writer.add_axis(2, period=40, Kp=0.25, sat_max=60, sat_min=-30)
+        for block in np.array_split(first, 4):
+            writer.append(1, block, setpoint=16384)
+        writer.append(2, second[:100], setpoint=-5, extra=np.arange(100.0))
+        writer.append(2, second[100:], setpoint=-5,
+                      extra=np.arange(100.0, 333.0))
+
+    run = runfile.RunFile(path)
+    assert [axis.task_id for axis in run.axes] == [1, 2]
+    axis = run.axis(2)
+    assert (axis.period, axis.sat_max, axis.sat_min) == (40, 60, -30)
+    assert axis.Kp == pytest.approx(0.25)
+    assert axis.num_samples == 333
+    assert run.axis(1).Kp == pytest.approx(0.1)
+
+    for task_id, samples in ((1, first), (2, second)):
+        columns = run.samples(task_id)
+        for name in SAMPLE_DTYPE.names:
+            assert np.array_equal(columns[name], samples[name])
+            assert columns[name].dtype == np.dtype(dict(runfile.COLUMNS)[name])
+    assert np.all(run.column(1, 'setpoint') == 16384)
+    assert np.all(run.column(2, 'setpoint') == -5)
+    assert np.array_equal(run.column(2, 'extra'), np.arange(333.0))
+    for axis in run.axes:
+        for dtype, offset in axis.columns.values():
+            assert offset % runfile.ALIGN == 0
+
+    with pytest.raises(KeyError):
+        run.axis(3)
+
+
+def test_empty_axis(tmp_path):
+    """!
+    A task with no samples is written and read back with empty columns.
+    """
+    path = str(tmp_path / 'empty.run')
+    with runfile.RunWriter(path) as writer:
+        writer.add_axis(1, 10, 1.0, 100, -100)
+        writer.append(1, position=np.zeros(0, np.int32))
+    run = runfile.RunFile(path)
+    assert run.axis(1).num_samples == 0
+    assert len(run.column(1, 'position')) == 0
+
+
+def test_not_written_after_exception(tmp_path):
+    """!
+    A run which raised an exception part way through isn't written.
+    """
+    path = tmp_path / 'broken.run'
+    with pytest.raises(RuntimeError):
+        with runfile.RunWriter(str(path)) as writer:
+            writer.add_axis(1, 10, 1.0, 100, -100)
+            writer.append(1, _samples(10, 3))
+            raise RuntimeError('capture failed')
+    assert not path.exists()
+
+
+def test_bad_input(tmp_path):
+    """!
+    Long column names, changed columns, mismatched lengths, repeated tasks
+    and files which aren't run files are refused.
+    """
+    writer = runfile.RunWriter(str(tmp_path / 'bad.run'))
+    writer.add_axis(1, 10, 1.0, 100, -100)
+    with pytest.raises(ValueError):
+        writer.add_axis(1, 10, 1.0, 100, -100)
+    with pytest.raises(ValueError):
+        writer.append(1, x=[1, 2], a_long_column=[1, 2])
+    with pytest.raises(ValueError):
+        writer.append(1, position=[1, 2, 3], velocity=[1, 2])
+    writer.append(1, position=[1, 2])
+    with pytest.raises(ValueError):
+        writer.append(1, velocity=[1, 2])
+
+    other = tmp_path / 'other.bin'
+    other.write_bytes(bytes(64))
+    with pytest.raises(ValueError):
+        runfile.RunFile(str(other))
+
+
+def test_convert(tmp_path):
+    """!
+    A raw telemetry capture converts into a run file whose times start at
+    zero and whose setpoints are the ones given.
+    """
+    writers = [telemetry.TelemetryWriter(1), telemetry.TelemetryWriter(2)]
+    capture = tmp_path / 'capture.bin'
+    capture.write_bytes(b''.join(
+        bytes(writer.pack(5000 + 1000 * n, 10 * n, n, 50))
+        for n in range(100) for writer in writers))
+
+    run = runfile.convert(str(capture), str(tmp_path / 'capture.run'),
+                          [20, 40], [0.1, 0.2], setpoints=[1000, 2000])
+    assert [axis.period for axis in run.axes] == [20, 40]
+    for axis, setpoint in zip(run.axes, (1000, 2000)):
+        assert axis.num_samples == 100
+        assert np.array_equal(run.column(axis.task_id, 'time'),
+                              np.arange(0, 100000, 1000))
+        assert np.array_equal(run.column(axis.task_id, 'position'),
+                              np.arange(0, 1000, 10))
+        assert np.all(run.column(axis.task_id, 'setpoint') == setpoint)
@@ -0,0 +1,215 @@
+"""!
+@file test_scheduler.py
+This file tests the overrun policies of timed tasks under
+@c cotask.TaskList.heap_sched() and @c cotask.TaskList.edf_sched(), on the
+simulated clock.
+"""
+
+import pytest
+
+import sim
+import utime
+import cotask
+
+## The task period in milliseconds.
+PERIOD_MS = 10
+
+## The task period in microseconds.
+PERIOD = PERIOD_MS * 1000
+
+## The overrun policies.
+POLICIES = [cotask.CATCH_UP, cotask.SKIP, cotask.REALIGN]
+
+## The schedulers which find ready tasks with a heap.
+SCHEDULERS = ['heap_sched', 'edf_sched']
+
+
+def _counter(runs, work=None):
+    """!
+    This function makes a task function which counts its runs.
+    @param runs     A list whose first item is incremented on each run.
+    @param work     A function called on each run, or @c None.
+    @returns        A function which makes the task's generator.
+    """
+    def task_fun():
+        while True:
+            runs[0] += 1
+            if work:
+                work()
+            yield 0
+    return task_fun
+
+
+@pytest.mark.parametrize('policy, step, skipped', [
+    (cotask.CATCH_UP, PERIOD, 0),
+    (cotask.SKIP, 3 * PERIOD, 2),
+    (cotask.REALIGN, 25000 + PERIOD, 2),
+])
+def test_release(clock, policy, step, skipped):
+    """!
+    A task released 2.5 periods late is next due one period on under
+    @c CATCH_UP, on the next slot of its schedule under @c SKIP and one
+    period after now under @c REALIGN.
+    """
+    task = cotask.Task(_counter([0]), period=PERIOD_MS, overrun=policy)
+    due = task._next_run
+    task._release(25000)
+    assert task._next_run == due + step
+    assert task.get_skipped() == skipped
+
+
+def test_release_less_than_a_period(clock):
+    """!
+    A task less than a period late keeps its schedule under every policy.
+    """
+    for policy in POLICIES:
+        task = cotask.Task(_counter([0]), period=PERIOD_MS, overrun=policy)
+        due = task._next_run
+        task._release(PERIOD - 1)
+        assert task._next_run == due + PERIOD
+        assert task.get_skipped() == 0
+
+
+@pytest.mark.parametrize('sched', SCHEDULERS)
+@pytest.mark.parametrize('policy', POLICIES)
+def test_late_task(clock, sched, policy):
+    """!
+    A task whose scheduler isn't called for 3.5 periods makes up every
+    missed run under @c CATCH_UP, and otherwise runs once and skips the
+    missed slots.
+    """
+    runs = [0]
+    task = cotask.Task(_counter(runs), period=PERIOD_MS, overrun=policy)
+    first_due = task._next_run
+    task_list = cotask.TaskList()
+    task_list.append(task)
+    run = getattr(task_list, sched)
+
+    clock.advance(PERIOD * 1000 + 50000)
+    run()
+    assert runs[0] == 1
+
+    clock.advance(35000000)
+    now = utime.ticks_us()
+    for n in range(20):
+        run()
+    if policy == cotask.CATCH_UP:
+        assert runs[0] == 4
+        assert task.get_skipped() == 0
+        assert task._next_run == first_due + 4 * PERIOD
+    else:
+        assert runs[0] == 2
+        assert task.get_skipped() == 2
+    if policy == cotask.SKIP:
+        assert task._next_run == first_due + 4 * PERIOD
+    elif policy == cotask.REALIGN:
+        assert now + PERIOD < task._next_run < now + PERIOD + 1000
+
+
+@pytest.mark.parametrize('sched', SCHEDULERS)
+@pytest.mark.parametrize('policy', [cotask.CATCH_UP, cotask.SKIP])
+def test_starved_task(clock, sched, policy):
+    """!
+    A task which is kept waiting by a more urgent task's long runs until
+    it is due again owes one run for every slot under @c CATCH_UP, all of
+    which it makes up, and under @c SKIP either runs or skips every slot.
+    """
+    hogs = [3]
+
+    def hog():
+        if hogs[0]:
+            hogs[0] -= 1
+            clock.advance(35000000)
+
+    urgent = cotask.Task(_counter([0], hog), name='Urgent', priority=2,
+                         period=PERIOD_MS, deadline=1, overrun=cotask.SKIP)
+    runs = [0]
+    task = cotask.Task(_counter(runs), name='Starved', priority=1,
+                       period=PERIOD_MS, overrun=policy)
+    first_due = task._next_run
+    task_list = cotask.TaskList()
+    task_list.append(urgent)
+    task_list.append(task)
+    run = getattr(task_list, sched)
+
+    owed = 0
+    for n in range(2000):
+        run()
+        owed = max(owed, task._backlog)
+        clock.advance(100000)
+    for n in range(10):
+        run()
+
+    slots = (task._next_run - first_due) // PERIOD
+    assert hogs[0] == 0
+    assert not task._queued and task._backlog == 0
+    if policy == cotask.CATCH_UP:
+        assert owed > 0
+        assert task.get_skipped() == 0
+        assert runs[0] == slots
+    else:
+        assert task.get_skipped() > 0
+        assert runs[0] + task.get_skipped() == slots
+
+
+def _stalled_pair(clock):
+    """!
+    This function makes a high priority task which skips missed slots and
+    a low priority one which catches up and takes 3 ms per run, and puts
+    them in a task list.
+    @param clock    The simulated clock.
+    @returns        The task list, the high priority task and a list of the
+                    times at which it ran.
+    """
+    lo = cotask.Task(_counter([0], lambda: clock.advance(3000000)),
+                     name='Lo', priority=1, period=PERIOD_MS,
+                     overrun=cotask.CATCH_UP)
+    hi_times = []
+    hi = cotask.Task(_counter([0], lambda: hi_times.append(utime.ticks_us())),
+                     name='Hi', priority=5, period=PERIOD_MS,
+                     overrun=cotask.SKIP)
+    task_list = cotask.TaskList()
+    task_list.append(lo)
+    task_list.append(hi)
+    return task_list, hi, hi_times
+
+
+def test_catch_up_doesnt_block_higher_priority():
+    """!
+    While a low priority task works off a backlog after the scheduler was
+    stalled for 200 ms, a higher priority task keeps running every period
+    under @c heap_sched(), as it does under @c pri_sched().
+    """
+    for sched in ('pri_sched', 'heap_sched'):
+        clock = sim.install()
+        task_list, hi, hi_times = _stalled_pair(clock)
+        run = getattr(task_list, sched)
+        while utime.ticks_us() < 50000:
+            run()
+        clock.advance(200000000)
+        while utime.ticks_us() < 300000:
+            run()
+        late = [time for time in hi_times if time > 250000]
+        assert len(late) >= 4, sched
+        gaps = [b - a for a, b in zip(hi_times, hi_times[1:])
+                if a > 250000]
+        assert max(gaps) < PERIOD + 4000, sched
+
+
+@pytest.mark.parametrize('sched', SCHEDULERS)
+def test_catch_up_releases_other_tasks(clock, sched):
+    """!
+    While a task works off a backlog after a stall, other tasks are still
+    released when they come due, however far behind the catching-up task's
+    next run time is.
+    """
+    task_list, hi, hi_times = _stalled_pair(clock)
+    run = getattr(task_list, sched)
+    while utime.ticks_us() < 50000:
+        run()
+    clock.advance(200000000)
+    run()
+    due = hi._next_run
+    while utime.ticks_us() < due + 5000:
+        run()
+    assert hi._next_run > due
@@ -0,0 +1,131 @@
+"""!
+@file test_spsc_queue.py
+This file tests @c task_share.SPSCQueue, including a producer run as a
+simulated timer interrupt.
+"""
+
+import array
+
+import pytest
+
+import utime
+import task_share
+
+
+@pytest.mark.parametrize('size', [0, 3, 6, 100])
+def test_size_power_of_two(size):
+    """!
+    A size which isn't a power of two is refused.
+    """
+    with pytest.raises(ValueError):
+        task_share.SPSCQueue('l', size)
+
+
+def test_no_overwrite():
+    """!
+    A queue which would overwrite is refused.
+    """
+    with pytest.raises(ValueError):
+        task_share.SPSCQueue('l', 8, overwrite=True)
+
+
+def test_full_and_empty():
+    """!
+    A full queue is told apart from an empty one, an ISR's put into a full
+    queue is dropped and an ISR's get from an empty one returns @c None.
+    """
+    queue = task_share.SPSCQueue('h', 4)
+    assert queue.empty() and not queue.full()
+    assert queue.get(in_ISR=True) is None
+    for item in range(4):
+        assert queue.put(item, in_ISR=True)
+    assert queue.full() and not queue.empty()
+    assert queue.num_in() == 4
+    assert not queue.put(4, in_ISR=True)
+    assert queue._num_dropped == 1
+    assert [queue.get() for n in range(4)] == [0, 1, 2, 3]
+    assert queue.get(in_ISR=True) is None
+
+
+def test_indices_wrap():
+    """!
+    Items come out in order through many wraps of the indices, which count
+    to twice the size.
+    """
+    queue = task_share.SPSCQueue('l', 8)
+    out = []
+    for item in range(1000):
+        queue.put(item)
+        if queue.num_in() == 7:
+            out.extend(queue.get() for n in range(5))
+    while queue.any():
+        out.append(queue.get())
+    assert out == list(range(1000))
+
+
+@pytest.mark.parametrize('items', [
+    lambda values: array.array('l', values),
+    lambda values: list(values),
+    lambda values: array.array('h', values),
+], ids=['array', 'list', 'narrower-array'])
+def test_put_many_get_into(items):
+    """!
+    Blocks go in and come out whole across the end of the buffer, and the
+    part of a block which doesn't fit is dropped.
+    """
+    queue = task_share.SPSCQueue('l', 16)
+    buf = array.array('l', [0] * 8)
+    expected = []
+    got = []
+    for start in range(0, 200, 7):
+        values = range(start - 100, start - 93)
+        assert queue.put_many(items(values)) == 7
+        expected.extend(values)
+        count = queue.get_into(buf)
+        got.extend(buf[:count])
+    while queue.any():
+        got.extend(buf[:queue.get_into(buf)])
+    assert got == expected
+
+    assert queue.put_many(items(range(20))) == 16
+    assert queue._num_dropped == 4
+    assert list(queue.get_many(20)) == list(range(16))
+
+
+def test_get_into_other_buffer_type():
+    """!
+    Items read into a buffer of another type are copied by value.
+    """
+    queue = task_share.SPSCQueue('l', 8)
+    queue.put_many(bytearray([7, 8]))
+    buf = bytearray(8)
+    assert queue.get_into(buf) == 2
+    assert list(buf[:2]) == [7, 8]
+    assert queue.num_in() == 0
+
+
+def test_isr_producer(clock):
+    """!
+    Items put by a timer interrupt are all read by a task, in order, when
+    the task keeps up; when it falls behind, the ones which didn't fit are
+    counted as dropped.
+    """
+    queue = task_share.SPSCQueue('l', 16)
+    count = [0]
+
+    def producer():
+        queue.put(count[0], in_ISR=True)
+        count[0] += 1
+
+    clock.add_event(100000, producer, 100000)
+    got = []
+    buf = array.array('l', [0] * 4)
+    while count[0] < 500:
+        utime.ticks_us()
+        got.extend(buf[:queue.get_into(buf)])
+    got.extend(buf[:queue.get_into(buf)])
+    assert got == list(range(count[0]))
+
+    clock.advance(100000 * 40)
+    assert queue.full()
+    assert queue._num_dropped == count[0] - len(got) - 16